@@ -12,7 +12,8 @@ from HARK.interpolation import LinearInterp, LinearInterpOnInterp1D, ConstantFun
 from HARK.utilities import CRRAutility, CRRAutilityP, CRRAutilityPP, CRRAutilityP_inv,\
                            CRRAutility_invP, CRRAutility_inv, combineIndepDstns,\
                            approxMeanOneLognormal
-from HARK.simulation import drawDiscrete, drawUniform
+from HARK.simulation import drawDiscrete, drawUniform, drawStratifiedUniform, lookupCutoffTable, makeIncShkTable,\
+                            makeMarkovPath
 from ConsIndShockModel import ConsumerSolution, IndShockConsumerType
 from HARK import HARKobject, Market, AgentType
 from copy import deepcopy
@@ -411,13 +412,36 @@ class AggShockMarkovConsumerType(AggShockConsumerType):
         self.solution_terminal.vPfunc  = StateCount*[self.solution_terminal.vPfunc]
         self.solution_terminal.mNrmMin = StateCount*[self.solution_terminal.mNrmMin]
 
+    def updateIncShkTable(self):
+        '''
+        Packs the income shock distributions for each period of the cycle and
+        each macroeconomic state into ragged tables with a row for each (t_cycle,
+        state) pair, so that getShocks can draw shocks for all agents at once.
+        Row t*StateCount + j holds the distribution faced by agents whose t_cycle
+        is t when the state is j (IncomeDstn[t-1][j], with PermGroFac[t-1] folded
+        into the permanent shocks); the last StateCount rows hold the ones used
+        for newborns.  The tables are only rebuilt if IncomeDstn or PermGroFac
+        has changed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        IncomeDstns = [self.IncomeDstn[t-1] for t in range(self.T_cycle)] + [self.IncomeDstn[0]]
+        PermGroFacs = [self.PermGroFac[t-1] for t in range(self.T_cycle)] + [self.PermGroFac[0]]
+        self.IncShkTable = makeIncShkTable(IncomeDstns,PermGroFacs,flat=True,table=getattr(self,'IncShkTable',None))
+
     def getShocks(self):
         '''
         Gets permanent and transitory income shocks for this period.  Samples from IncomeDstn for
-        each period in the cycle.  This is a copy-paste from IndShockConsumerType, with the
-        addition of the Markov macroeconomic state.  Unfortunately, the getShocks method for
-        MarkovConsumerType cannot be used, as that method assumes that MrkvNow is a vector
-        with a value for each agent, not just a single int.
+        each period in the cycle, given the Markov macroeconomic state, using the tables made by
+        updateIncShkTable.
+        Unfortunately, the getShocks method for MarkovConsumerType cannot be used, as that method
+        assumes that MrkvNow is a vector with a value for each agent, not just a single int.
 
         Parameters
         ----------
@@ -427,33 +451,20 @@ class AggShockMarkovConsumerType(AggShockConsumerType):
         -------
         None
         '''
-        PermShkNow = np.zeros(self.AgentCount) # Initialize shock arrays
-        TranShkNow = np.zeros(self.AgentCount)
+        self.updateIncShkTable()
+        IncShkTable = self.IncShkTable
+
+        # Newborns use the *first* period in the sequence.  Approximation.
         newborn = self.t_age == 0
-        for t in range(self.T_cycle):
-            these = t == self.t_cycle
-            N = np.sum(these)
-            if N > 0:
-                IncomeDstnNow    = self.IncomeDstn[t-1][self.MrkvNow] # set current income distribution
-                PermGroFacNow    = self.PermGroFac[t-1]               # and permanent growth factor
-                Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-                # Get random draws of income shocks from the discrete distribution
-                EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=True,seed=self.RNG.randint(0,2**31-1))
-                PermShkNow[these] = IncomeDstnNow[1][EventDraws]*PermGroFacNow # permanent "shock" includes expected growth
-                TranShkNow[these] = IncomeDstnNow[2][EventDraws]
-
-        # That procedure used the *last* period in the sequence for newborns, but that's not right
-        # Redraw shocks for newborns, using the *first* period in the sequence.  Approximation.
-        N = np.sum(newborn)
-        if N > 0:
-            these = newborn
-            IncomeDstnNow    = self.IncomeDstn[0][self.MrkvNow]  # set current income distribution
-            PermGroFacNow    = self.PermGroFac[0]                # and permanent growth factor
-            Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-            # Get random draws of income shocks from the discrete distribution
-            EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=False,seed=self.RNG.randint(0,2**31-1))
-            PermShkNow[these] = IncomeDstnNow[1][EventDraws]*PermGroFacNow # permanent "shock" includes expected growth
-            TranShkNow[these] = IncomeDstnNow[2][EventDraws]
+        rows = np.where(newborn,self.T_cycle,self.t_cycle)*IncShkTable['StateCount'] + self.MrkvNow
+
+        # Events match the shock distribution exactly within each period, except for newborns
+        base_draws = np.zeros(self.AgentCount)
+        base_draws[np.logical_not(newborn)] = drawStratifiedUniform(rows[np.logical_not(newborn)],seed=self.RNG)
+        base_draws[newborn] = drawUniform(np.sum(newborn),seed=self.RNG)
+        EventDraws = IncShkTable['cutoffs'][1][rows] + lookupCutoffTable(IncShkTable['cutoffs'],rows,base_draws)
+        PermShkNow = IncShkTable['PermShk'][EventDraws] # permanent "shock" includes expected growth
+        TranShkNow = IncShkTable['TranShk'][EventDraws]
 #        PermShkNow[newborn] = 1.0
 #        TranShkNow[newborn] = 1.0
 
@@ -1485,9 +1496,8 @@ class CobbDouglasMarkovEconomy(CobbDouglasEconomy):
         x = v[:,idx].astype(float)
         LR_dstn = (x/np.sum(x))
 
-        # Initialize the Markov history and set up transitions
+        # Initialize the Markov history
         MrkvNow_hist = np.zeros(self.act_T_orig,dtype=int)
-        cutoffs = np.cumsum(self.MrkvArray,axis=1)
         loops = 0
         go = True
         MrkvNow = self.MrkvNow_init
@@ -1497,15 +1507,13 @@ class CobbDouglasMarkovEconomy(CobbDouglasEconomy):
         # Add histories until each state has been visited at least state_T_min times
         while go:
             draws = drawUniform(N=self.act_T_orig,seed=loops)
-            for s in range(draws.size): # Add act_T_orig more periods
-                MrkvNow_hist[t] = MrkvNow
-                MrkvNow = np.searchsorted(cutoffs[MrkvNow,:],draws[s])
-                t += 1
+            path = makeMarkovPath(self.MrkvArray,MrkvNow,draws) # Add act_T_orig more periods
+            MrkvNow_hist[t:(t+draws.size)] = path[:-1]
+            MrkvNow = path[-1]
+            t += draws.size
 
             # Calculate the empirical distribution
-            state_T = np.zeros(StateCount)
-            for i in range(StateCount):
-                state_T[i] = np.sum(MrkvNow_hist==i)
+            state_T = np.bincount(MrkvNow_hist,minlength=StateCount).astype(float)
 
             # Check whether each state has been visited state_T_min times
             if np.all(state_T >= state_T_min):
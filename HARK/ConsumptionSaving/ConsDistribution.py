@@ -0,0 +1,654 @@
+'''
+Tools for finding the cross-sectional distribution of a solved consumer type
+without simulating it.  Mass on a grid of end-of-period normalized assets (for
+each discrete state) is pushed forward through the income shocks and the
+consumption function, and each point where mass lands is split between its two
+neighboring gridpoints by the "lottery" method of Young (2010), so that the mass
+and (inside the grid) the mean are preserved.  The result is a sparse transition
+matrix, whose fixed point (with newborns replacing those who die) gives the
+stationary distribution of the type.  The same matrix, over gridpoints of every
+period of the cycle and every discrete state, moves any distribution forward
+one period at the cost of a sparse matrix-vector product.
+
+Unlike the statistics of a Monte Carlo simulation, those of the histogram are
+deterministic and continuous in the parameters of the model, which makes them
+much better behaved inside of a root finder or optimizer.
+
+Handles IndShockConsumerType, KinkedRconsumerType, and MarkovConsumerType
+instances, with any number of periods in their cycle.  If agents die of old age
+after more periods (T_age) than there are in the cycle, as in the lifecycle
+parameters where T_age = T_cycle + 1 and agents make one more decision in period
+0 of the cycle before dying, the distribution is tracked separately at each age.
+'''
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+from HARK import HARKobject
+from HARK.utilities import approxLognormal, makeGridExpMult, getLorenzShares, getPercentiles
+
+def makeLotteryWeights(x,grid):
+    '''
+    Splits point masses at x between the two gridpoints that bracket each of
+    them, with weights chosen so that the mean of each point is preserved.  Mass
+    outside of the grid is put on the nearest endpoint.
+
+    Parameters
+    ----------
+    x : np.array
+        Locations of the point masses.
+    grid : np.array
+        Increasing array of gridpoints, with at least two elements.
+
+    Returns
+    -------
+    idx : np.array
+        Index of the lower of the two gridpoints for each point, same shape as x;
+        the other gridpoint is idx+1.
+    weight : np.array
+        Share of each point mass that goes to the lower gridpoint.
+    '''
+    idx = np.searchsorted(grid,x,side='right') - 1
+    idx = np.clip(idx,0,grid.size-2)
+    weight = (grid[idx+1] - x)/(grid[idx+1] - grid[idx])
+    weight = np.clip(weight,0.0,1.0)
+    return idx, weight
+
+
+def getPeriodPrimitives(agent,t):
+    '''
+    Collects what is needed to push end-of-period mass from period t to period
+    t+1 of the agent's cycle, arranged as if the agent had discrete states (one
+    state for types without a Markov process).
+
+    Parameters
+    ----------
+    agent : IndShockConsumerType or MarkovConsumerType
+        A solved agent.
+    t : int
+        Period of the cycle in which the mass starts; mass moves into period
+        (t+1) % T_cycle, using the solution and shocks of that period.
+
+    Returns
+    -------
+    primitives : dict
+        Has entries 'cFunc', 'IncomeDstn', 'PermGroFac', 'Rfree' (lists with one
+        entry per state in period t+1), 'LivPrb' (array with survival probability
+        for each state in period t), 'MrkvArray' (transition matrix between the
+        states of t and t+1), and 'mNrmMin' (array of lower bounds of m in t+1).
+        Each element of 'Rfree' is a function that maps end-of-period assets to
+        the interest factor.
+    '''
+    t_next = (t+1) % agent.T_cycle
+    solution = agent.solution[t_next]
+    if hasattr(agent,'MrkvArray'):
+        MrkvArray = np.asarray(agent.MrkvArray[t])
+        StateCount = MrkvArray.shape[1]
+        cFunc = list(solution.cFunc)
+        IncomeDstn = list(agent.IncomeDstn[t])
+        PermGroFac = list(agent.PermGroFac[t])
+        LivPrb = np.asarray(agent.LivPrb[t],dtype=float)*np.ones(MrkvArray.shape[0])
+        Rfree = [lambda a, R=R : R*np.ones_like(a) for R in np.asarray(agent.Rfree)*np.ones(StateCount)]
+        mNrmMin = np.asarray(solution.mNrmMin)*np.ones(StateCount)
+    else:
+        MrkvArray = np.ones((1,1))
+        cFunc = [solution.cFunc]
+        IncomeDstn = [agent.IncomeDstn[t]]
+        PermGroFac = [agent.PermGroFac[t]]
+        LivPrb = np.array([agent.LivPrb[t]],dtype=float)
+        if hasattr(agent,'Rboro'):
+            Rfree = [lambda a, Rboro=agent.Rboro, Rsave=agent.Rsave : np.where(a > 0.0,Rsave,Rboro)]
+        else:
+            Rfree = [lambda a, R=agent.Rfree : R*np.ones_like(a)]
+        mNrmMin = np.array([solution.mNrmMin])
+    primitives = {'cFunc' : cFunc,
+                  'IncomeDstn' : IncomeDstn,
+                  'PermGroFac' : PermGroFac,
+                  'Rfree' : Rfree,
+                  'LivPrb' : LivPrb,
+                  'MrkvArray' : MrkvArray,
+                  'mNrmMin' : mNrmMin}
+    return primitives
+
+
+def getNewbornPoints(agent,aNrmInitCount=15):
+    '''
+    Finds the states in which newborns make their first decision, as a set of
+    weighted points, following the conventions of simBirth and getShocks: initial
+    normalized assets are lognormal, newborns have no transitory shock, draw a
+    permanent shock from IncomeDstn[0] (no permanent shock and a Markov state
+    drawn from MrkvPrbsInit for Markov types), and face the interest factor of
+    their state.
+
+    Parameters
+    ----------
+    agent : IndShockConsumerType or MarkovConsumerType
+        A solved agent.
+    aNrmInitCount : int
+        Number of points in the discrete approximation to initial assets.
+
+    Returns
+    -------
+    points : dict
+        Has entries 'prob', 'Mrkv', 'PermShk', 'TranShk', and 'mNrm', all arrays
+        with one element per point.
+    '''
+    if agent.aNrmInitStd > 0.0:
+        aProb, aInit = approxLognormal(aNrmInitCount,mu=agent.aNrmInitMean,sigma=agent.aNrmInitStd)
+    else:
+        aProb, aInit = np.ones(1), np.array([np.exp(agent.aNrmInitMean)])
+    if hasattr(agent,'MrkvArray'):
+        MrkvProb = np.asarray(agent.MrkvPrbsInit,dtype=float)
+        Rfree = np.asarray(agent.Rfree)*np.ones(MrkvProb.size)
+        Mrkv = np.repeat(np.arange(MrkvProb.size),aInit.size)
+        prob = (MrkvProb[:,np.newaxis]*aProb[np.newaxis,:]).flatten()
+        aNrm = np.tile(aInit,MrkvProb.size)
+        PermShk = np.ones(prob.size)
+        RfreeNow = Rfree[Mrkv]
+    else:
+        ShkProb, PermShkDraw = agent.IncomeDstn[0][0], agent.IncomeDstn[0][1]*agent.PermGroFac[0]
+        Mrkv = np.zeros(aInit.size*ShkProb.size,dtype=int)
+        prob = (aProb[:,np.newaxis]*ShkProb[np.newaxis,:]).flatten()
+        aNrm = np.repeat(aInit,ShkProb.size)
+        PermShk = np.tile(PermShkDraw,aInit.size)
+        if hasattr(agent,'Rboro'):
+            RfreeNow = np.where(aNrm > 0.0,agent.Rsave,agent.Rboro)
+        else:
+            RfreeNow = agent.Rfree*np.ones(prob.size)
+    TranShk = np.ones(prob.size)
+    points = {'prob' : prob,
+              'Mrkv' : Mrkv,
+              'PermShk' : PermShk,
+              'TranShk' : TranShk,
+              'mNrm' : aNrm*RfreeNow/PermShk + TranShk}
+    return points
+
+
+class DistributionOperator(HARKobject):
+    '''
+    A sparse linear operator that moves the distribution of a solved consumer
+    type over (t_cycle, discrete state, end-of-period normalized assets) forward
+    one period, built from its consumption functions, income shocks, Markov
+    transition matrices, and survival probabilities.  Agents who die are
+    replaced by newborns in period 0, as in simulation.  When T_age > T_cycle,
+    the first index is age rather than t_cycle (with t_cycle = age % T_cycle),
+    so that agents who die of old age can be told apart from younger agents in
+    the same period of the cycle.
+
+    Along with the mass of agents in each gridpoint, the operator moves forward
+    the mass of permanent income (pLvl) of those agents.  Aggregates are found
+    by weighting normalized variables by this permanent income mass, so levels
+    never need to be tracked explicitly.
+
+    The current distribution is held in the attributes pmf and pmf_p (flat arrays
+    over all gridpoints of all periods and states), and statistics describe the
+    decisions made next period by the agents in that distribution.  For a
+    transition experiment, make a new operator (with the same aNrmGrid) whenever
+    the agent's solution or primitives change, pass it the current distribution
+    with setDistribution, and call advance once per period.
+    '''
+    distance_criteria = ['pmf']
+
+    def __init__(self,agent,aNrmGrid=None,aNrmCount=200,aNrmMax=None,aNrmInitCount=15):
+        '''
+        Make a new operator for a solved agent, starting from the distribution
+        of a cohort of newborns at the end of their first period.
+
+        Parameters
+        ----------
+        agent : IndShockConsumerType or MarkovConsumerType
+            An agent that has been solved; it may have any T_cycle.
+        aNrmGrid : np.array or None
+            Increasing grid of end-of-period normalized assets, used in every
+            period and state.  If None, one is made from the lowest natural
+            borrowing limit among all periods and states up to aNrmMax above
+            it, with triple exponential spacing.
+        aNrmCount : int
+            Number of gridpoints when aNrmGrid is not given.
+        aNrmMax : float or None
+            Top of the grid (relative to its bottom) when aNrmGrid is not given;
+            defaults to the agent's aXtraMax.
+        aNrmInitCount : int
+            Number of points in the approximation to newborns' initial assets.
+
+        Returns
+        -------
+        None
+        '''
+        if getattr(agent,'global_markov',False):
+            raise ValueError('The Markov state must be idiosyncratic to find the distribution over it.')
+        self.T_cycle = agent.T_cycle
+        cycle_primitives = [getPeriodPrimitives(agent,t) for t in range(self.T_cycle)]
+        if aNrmGrid is None:
+            if aNrmMax is None:
+                aNrmMax = agent.aXtraMax
+            aNrmMin = np.min(np.concatenate([cycle_primitives[t]['mNrmMin'] for t in range(self.T_cycle)]))
+            aNrmGrid = aNrmMin + makeGridExpMult(0.0,aNrmMax,aNrmCount,timestonest=3)
+        self.aNrmGrid = np.asarray(aNrmGrid,dtype=float)
+        K = self.aNrmGrid.size
+
+        # The distribution is over periods of the cycle, or over ages if agents
+        # can live for more periods than there are in the cycle
+        if agent.T_age is not None and agent.T_age > self.T_cycle:
+            self.PeriodCount = agent.T_age
+        else:
+            self.PeriodCount = self.T_cycle
+        self.t_cycleOf = np.arange(self.PeriodCount) % self.T_cycle
+        primitives = [dict(cycle_primitives[t]) for t in self.t_cycleOf]
+
+        # Number of discrete states in each period, and where each period's
+        # gridpoints start in the flat distribution arrays
+        self.StateCount = np.array([len(cycle_primitives[t-1]['cFunc']) for t in self.t_cycleOf])
+        self.offsets = np.concatenate(([0],np.cumsum(self.StateCount*K)))
+        self.pLvlInit = np.exp(agent.pLvlInitMean + 0.5*agent.pLvlInitStd**2)
+
+        # Agents who reach T_age at the end of period t don't survive it
+        if agent.T_age is not None:
+            for t in range(agent.T_age-1,self.PeriodCount):
+                primitives[t]['LivPrb'] = 0.0*primitives[t]['LivPrb']
+
+        self.makeTransitionMatrix(primitives,getNewbornPoints(agent,aNrmInitCount),
+                                  cycle_primitives[-1]['cFunc'])
+        self.resetDstn()
+
+    def evalPoints(self,cFunc,Mrkv,mNrm):
+        '''
+        Evaluates consumption and the MPC at a set of decision points.
+
+        Parameters
+        ----------
+        cFunc : [function]
+            Consumption function for each discrete state.
+        Mrkv : np.array
+            Discrete state of each point.
+        mNrm : np.array
+            Normalized market resources of each point.
+
+        Returns
+        -------
+        cNrm : np.array
+            Consumption at each point.
+        MPC : np.array
+            Marginal propensity to consume at each point.
+        '''
+        cNrm = np.zeros(mNrm.size)
+        MPC = np.zeros(mNrm.size)
+        for j in range(len(cFunc)):
+            these = Mrkv == j
+            if np.any(these):
+                cNrm[these], MPC[these] = cFunc[j].eval_with_derivative(mNrm[these])
+        return cNrm, MPC
+
+    def makeTransitionMatrix(self,primitives,newborns,cFuncNewborn):
+        '''
+        Builds the sparse matrices that move surviving end-of-period mass (and
+        permanent income mass) forward one period, the vectors where newborns'
+        mass lands, and the decision points of next period that are used to
+        compute statistics.
+
+        Parameters
+        ----------
+        primitives : [dict]
+            Output of getPeriodPrimitives for each period (or age) tracked.
+        newborns : dict
+            Output of getNewbornPoints.
+        cFuncNewborn : [function]
+            Consumption function in each discrete state of period 0 of the cycle.
+
+        Returns
+        -------
+        None
+        '''
+        grid = self.aNrmGrid
+        K = grid.size
+        cols, period, Mrkv, base, PermShk, TranShk, mNrm, cNrm, MPC = [], [], [], [], [], [], [], [], []
+        DiePrb = []
+        for t in range(self.PeriodCount):
+            t_next = (t+1) % self.PeriodCount
+            MrkvArray = primitives[t]['MrkvArray']
+            LivPrb = primitives[t]['LivPrb']
+            DiePrb.append(np.repeat(1.0 - LivPrb,K))
+
+            # Each point is a (gridpoint in state i, shock in state j) pair; m
+            # doesn't depend on i, so compute it and the policy once per state j
+            for j in range(MrkvArray.shape[1]):
+                ShkProb, PermShkNow, TranShkNow = primitives[t]['IncomeDstn'][j]
+                PermShkNow = PermShkNow*primitives[t]['PermGroFac'][j]
+                R = primitives[t]['Rfree'][j](grid)
+                mNow = ((grid*R)[:,np.newaxis]/PermShkNow[np.newaxis,:] + TranShkNow[np.newaxis,:]).flatten()
+                cNow, MPCnow = primitives[t]['cFunc'][j].eval_with_derivative(mNow)
+                for i in range(MrkvArray.shape[0]):
+                    if MrkvArray[i,j] <= 0.0:
+                        continue
+                    cols.append(self.offsets[t] + np.repeat(i*K + np.arange(K),ShkProb.size))
+                    period.append(t_next*np.ones(mNow.size,dtype=int))
+                    Mrkv.append(j*np.ones(mNow.size,dtype=int))
+                    base.append(np.tile(LivPrb[i]*MrkvArray[i,j]*ShkProb,K))
+                    PermShk.append(np.tile(PermShkNow,K))
+                    TranShk.append(np.tile(TranShkNow,K))
+                    mNrm.append(mNow)
+                    cNrm.append(cNow)
+                    MPC.append(MPCnow)
+
+        # Newborns make their first decision in period 0
+        cNew, MPCnew = self.evalPoints(cFuncNewborn,newborns['Mrkv'],newborns['mNrm'])
+        self.cols = np.concatenate(cols)
+        self.SurvivorCount = self.cols.size
+        self.periodNow = np.concatenate(period + [np.zeros(newborns['Mrkv'].size,dtype=int)])
+        self.t_cycleNow = self.t_cycleOf[self.periodNow]
+        self.MrkvNow = np.concatenate(Mrkv + [newborns['Mrkv']])
+        self.PermShkNow = np.concatenate(PermShk + [newborns['PermShk']])
+        self.TranShkNow = np.concatenate(TranShk + [newborns['TranShk']])
+        self.mNrmNow = np.concatenate(mNrm + [newborns['mNrm']])
+        self.cNrmNow = np.concatenate(cNrm + [cNew])
+        self.MPCnow = np.concatenate(MPC + [MPCnew])
+        self.aNrmNow = self.mNrmNow - self.cNrmNow
+        self.base = np.concatenate(base)
+        self.base_newborn = newborns['prob']
+        self.DiePrb = np.concatenate(DiePrb)
+
+        # Allocate the mass at each point to the grid and build the matrices
+        idx, weight = makeLotteryWeights(self.aNrmNow,grid)
+        rows = self.offsets[self.periodNow] + self.MrkvNow*K + idx
+        N = self.SurvivorCount
+        shape = (self.offsets[-1],self.offsets[-1])
+        both_rows = np.concatenate((rows[:N],rows[:N]+1))
+        both_cols = np.concatenate((self.cols,self.cols))
+        vals = np.concatenate((weight[:N],1.0-weight[:N]))*np.tile(self.base,2)
+        self.TranMatrix = sparse.coo_matrix((vals,(both_rows,both_cols)),shape=shape).tocsr()
+        vals_p = vals*np.tile(self.PermShkNow[:N],2)
+        self.TranMatrix_p = sparse.coo_matrix((vals_p,(both_rows,both_cols)),shape=shape).tocsr()
+
+        newborn_vals = np.concatenate((weight[N:],1.0-weight[N:]))*np.tile(self.base_newborn,2)
+        newborn_rows = np.concatenate((rows[N:],rows[N:]+1))
+        self.NewbornVec = np.bincount(newborn_rows,weights=newborn_vals,minlength=shape[0])
+        newborn_vals_p = newborn_vals*np.tile(self.PermShkNow[N:],2)
+        self.NewbornVec_p = np.bincount(newborn_rows,weights=newborn_vals_p,minlength=shape[0])*self.pLvlInit
+
+    def resetDstn(self):
+        '''
+        Sets the distribution to that of a cohort of newborns at the end of
+        their first period, like the population after one period of simulation.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        self.setDistribution(self.NewbornVec.copy(),self.NewbornVec_p.copy())
+
+    def setDistribution(self,pmf,pmf_p=None):
+        '''
+        Sets the end-of-period distribution and finds the weights on next
+        period's decision points that it implies.
+
+        Parameters
+        ----------
+        pmf : np.array
+            Mass of agents at each gridpoint of each period and state, as a flat
+            array ordered like this operator's pmf; should sum to one.
+        pmf_p : np.array or None
+            Permanent income mass at each gridpoint; None if not tracked.
+
+        Returns
+        -------
+        None
+        '''
+        self.pmf = pmf
+        self.pmf_p = pmf_p
+        NewbornMass = np.dot(self.DiePrb,pmf)
+        self.weights = np.concatenate((self.base*pmf[self.cols],self.base_newborn*NewbornMass))
+        if pmf_p is None:
+            self.weights_p = None
+        else:
+            self.weights_p = np.concatenate((self.base*pmf_p[self.cols],self.base_newborn*self.pLvlInit*NewbornMass))*self.PermShkNow
+
+    def advance(self,periods=1):
+        '''
+        Moves the distribution forward by some number of periods, replacing the
+        agents who die with newborns.  Each period is two sparse matrix-vector
+        products.
+
+        Parameters
+        ----------
+        periods : int
+            Number of periods to move forward.
+
+        Returns
+        -------
+        None
+        '''
+        pmf = self.pmf
+        pmf_p = self.pmf_p
+        for n in xrange(periods):
+            NewbornMass = np.dot(self.DiePrb,pmf)
+            pmf = self.TranMatrix.dot(pmf) + self.NewbornVec*NewbornMass
+            if pmf_p is not None:
+                pmf_p = self.TranMatrix_p.dot(pmf_p) + self.NewbornVec_p*NewbornMass
+        self.setDistribution(pmf,pmf_p)
+
+    def getPeriodPmf(self,t,income_weighted=False):
+        '''
+        Returns the end-of-period distribution over states and assets in one
+        period of the cycle (or at one age, if the operator tracks age).
+
+        Parameters
+        ----------
+        t : int
+            Period of the cycle, or age; between 0 and PeriodCount-1.
+        income_weighted : bool
+            Whether to return permanent income mass rather than agent mass.
+
+        Returns
+        -------
+        pmf : np.array
+            Array of shape (StateCount[t],aNrmGrid.size).
+        '''
+        pmf = self.pmf_p if income_weighted else self.pmf
+        return np.reshape(pmf[self.offsets[t]:self.offsets[t+1]],(self.StateCount[t],self.aNrmGrid.size))
+
+    def calcAggregate(self,var_name):
+        '''
+        Calculates the aggregate (per capita) level of a normalized variable at
+        next period's decision points, by weighting it with permanent income.
+
+        Parameters
+        ----------
+        var_name : str
+            Name of a decision point attribute, like 'cNrmNow' or 'aNrmNow'.
+            'TranShkNow' gives labor income.
+
+        Returns
+        -------
+        aggregate : float
+            Sum of the variable times permanent income; np.nan if permanent
+            income mass is not tracked.
+        '''
+        if self.weights_p is None:
+            return np.nan
+        return np.dot(self.weights_p,getattr(self,var_name))
+
+    def calcKYratio(self):
+        '''
+        Calculates the ratio of aggregate end-of-period assets to aggregate income
+        (permanent income times the transitory shock), as in cstwMPC.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        KYratio : float
+            Capital to income ratio; np.nan if permanent income mass is not
+            tracked.
+        '''
+        return self.calcAggregate('aNrmNow')/self.calcAggregate('TranShkNow')
+
+    def calcMeanMPC(self,income_weighted=False):
+        '''
+        Calculates the average marginal propensity to consume.
+
+        Parameters
+        ----------
+        income_weighted : bool
+            Whether to weight each agent by permanent income times the transitory
+            shock (i.e. by income) rather than equally.
+
+        Returns
+        -------
+        MPCmean : float
+            Average MPC out of normalized market resources.
+        '''
+        if income_weighted:
+            if self.weights_p is None:
+                return np.nan
+            weights = self.weights_p*self.TranShkNow
+        else:
+            weights = self.weights
+        return np.dot(weights,self.MPCnow)/np.sum(weights)
+
+    def calcLorenzShares(self,percentiles=[0.2,0.4,0.6,0.8]):
+        '''
+        Calculates points on the Lorenz curve of end-of-period normalized assets.
+        This is exact for the distribution rather than subject to sampling noise.
+        The Lorenz curve of asset levels also depends on the dispersion of
+        permanent income, which is not tracked.
+
+        Parameters
+        ----------
+        percentiles : [float]
+            Percentiles of the distribution at which to evaluate the Lorenz curve.
+
+        Returns
+        -------
+        LorenzShares : np.array
+            Share of total normalized assets held by those below each percentile.
+        '''
+        return getLorenzShares(self.aNrmNow,weights=self.weights,percentiles=percentiles)
+
+    def calcMPCbyWealthQuantile(self,quantiles=[0.2,0.4,0.6,0.8]):
+        '''
+        Calculates the average MPC of agents between consecutive quantiles of
+        end-of-period normalized assets, like the MPC by wealth quintile in cstwMPC.
+
+        Parameters
+        ----------
+        quantiles : [float]
+            Cutoffs between groups, each in (0,1).
+
+        Returns
+        -------
+        MPCbyQuantile : np.array
+            Average MPC in each of the len(quantiles)+1 groups, from poorest to richest.
+        '''
+        cutoffs = getPercentiles(self.aNrmNow,weights=self.weights,percentiles=quantiles)
+        group = np.searchsorted(cutoffs,self.aNrmNow)
+        GroupCount = len(quantiles)+1
+        mass = np.bincount(group,weights=self.weights,minlength=GroupCount)
+        total = np.bincount(group,weights=self.weights*self.MPCnow,minlength=GroupCount)
+        return total/mass
+
+
+class StationaryDistribution(DistributionOperator):
+    '''
+    The stationary distribution of a solved consumer type, found with the
+    histogram method rather than by simulation.  With mortality, the mass
+    satisfies pmf = T*pmf + b*D, where D = sum((1-LivPrb)*pmf) is the mass of
+    newborns and b is where they land, so pmf is proportional to (I-T)^-1*b
+    and is found with one sparse solve.  Without mortality it is the dominant
+    eigenvector of T, found by power iteration.  The permanent income mass is
+    found the same way when it exists (i.e. doesn't grow without bound).
+    '''
+    def __init__(self,agent,aNrmGrid=None,aNrmCount=200,aNrmMax=None,aNrmInitCount=15,
+                 tolerance=1e-12,max_iter=10000):
+        '''
+        Find the stationary distribution of a solved agent.
+
+        Parameters
+        ----------
+        agent : IndShockConsumerType or MarkovConsumerType
+            An agent that has been solved; for a lifecycle agent this is the
+            stationary distribution across ages.
+        aNrmGrid : np.array or None
+            Increasing grid of end-of-period normalized assets; see DistributionOperator.
+        aNrmCount : int
+            Number of gridpoints when aNrmGrid is not given.
+        aNrmMax : float or None
+            Top of the grid (relative to its bottom) when aNrmGrid is not given;
+            defaults to the agent's aXtraMax.
+        aNrmInitCount : int
+            Number of points in the approximation to newborns' initial assets.
+        tolerance : float
+            Convergence criterion for power iteration, used only when no agents die.
+        max_iter : int
+            Maximum number of power iterations.
+
+        Returns
+        -------
+        None
+        '''
+        self.tolerance = tolerance
+        self.max_iter = max_iter
+        DistributionOperator.__init__(self,agent,aNrmGrid=aNrmGrid,aNrmCount=aNrmCount,
+                                      aNrmMax=aNrmMax,aNrmInitCount=aNrmInitCount)
+        self.solve()
+
+    def powerIterate(self,Matrix,vec):
+        '''
+        Finds the dominant eigenvector of a nonnegative matrix by repeatedly
+        applying it to an initial vector and rescaling to sum to one.
+
+        Parameters
+        ----------
+        Matrix : scipy.sparse.csr_matrix
+            Matrix to iterate with.
+        vec : np.array
+            Initial guess.
+
+        Returns
+        -------
+        vec : np.array
+            Dominant eigenvector, scaled to sum to one.
+        '''
+        vec = vec/np.sum(vec)
+        for it in xrange(self.max_iter):
+            vec_new = Matrix.dot(vec)
+            vec_new = vec_new/np.sum(vec_new)
+            if np.max(np.abs(vec_new - vec)) < self.tolerance:
+                return vec_new
+            vec = vec_new
+        return vec
+
+    def solve(self):
+        '''
+        Finds the stationary distribution and sets it as the current one.  The
+        permanent income mass is per capita (its sum is mean pLvl) when agents
+        die, and scaled to sum to one otherwise; it is None if it doesn't exist.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        Identity = sparse.identity(self.offsets[-1],format='csr')
+        if np.any(self.DiePrb > 0.0):
+            pmf = spsolve((Identity - self.TranMatrix).tocsc(),self.NewbornVec)
+            pmf = np.maximum(pmf,0.0)
+            pmf = pmf/np.sum(pmf)
+            NewbornMass = np.dot(self.DiePrb,pmf)
+            pmf_p = spsolve((Identity - self.TranMatrix_p).tocsc(),self.NewbornVec_p*NewbornMass)
+            if np.all(np.isfinite(pmf_p)) and np.all(pmf_p >= -self.tolerance*np.max(np.abs(pmf_p))):
+                pmf_p = np.maximum(pmf_p,0.0)
+            else:
+                pmf_p = None
+        else:
+            pmf = self.powerIterate(self.TranMatrix,np.ones(self.offsets[-1]))
+            pmf_p = self.powerIterate(self.TranMatrix_p,pmf)
+        self.setDistribution(pmf,pmf_p)
@@ -145,8 +145,7 @@ class MargValueFunc2D(HARKobject):
             with market resources m and persistent income p; has same size as inputs
             m and p.
         '''
-        c = self.cFunc(m,p)
-        MPC = self.cFunc.derivativeX(m,p)
+        c,MPC,dcdp = self.cFunc.eval_with_gradient(m,p)
         return MPC*utilityPP(c,gam=self.CRRA)
 
 
@@ -197,8 +196,7 @@ class MargMargValueFunc2D(HARKobject):
             Marginal marginal value of beginning this period with market
             resources m and persistent income p; has same size as inputs.
         '''
-        c = self.cFunc(m,p)
-        MPC = self.cFunc.derivativeX(m,p)
+        c,MPC,dcdp = self.cFunc.eval_with_gradient(m,p)
         return MPC*utilityPP(c,gam=self.CRRA)
 
 
@@ -1120,8 +1118,8 @@ class GenIncProcessConsumerType(IndShockConsumerType):
         '''
         # Get and store states for newly born agents
         N = np.sum(which_agents) # Number of new consumers to make
-        aNrmNow_new = drawLognormal(N,mu=self.aNrmInitMean,sigma=self.aNrmInitStd,seed=self.RNG.randint(0,2**31-1))
-        self.pLvlNow[which_agents] = drawLognormal(N,mu=self.pLvlInitMean,sigma=self.pLvlInitStd,seed=self.RNG.randint(0,2**31-1))
+        aNrmNow_new = drawLognormal(N,mu=self.aNrmInitMean,sigma=self.aNrmInitStd,seed=self.RNG)
+        self.pLvlNow[which_agents] = drawLognormal(N,mu=self.pLvlInitMean,sigma=self.pLvlInitStd,seed=self.RNG)
         self.aLvlNow[which_agents] = aNrmNow_new*self.pLvlNow[which_agents]
         self.t_age[which_agents]   = 0 # How many periods since each agent was born
         self.t_cycle[which_agents] = 0 # Which period of the cycle each agent is currently in
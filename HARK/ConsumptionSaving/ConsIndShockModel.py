@@ -16,10 +16,11 @@ See HARK documentation for mathematical descriptions of the models being solved.
 from copy import copy, deepcopy
 import numpy as np
 from scipy.optimize import newton
-from HARK import AgentType, Solution, NullFunc, HARKobject
+from HARK import AgentType, Solution, NullFunc, HARKobject, distanceMetric, solveAgent, calcCycleDistance
 from HARK.utilities import warnings  # Because of "patch" to warnings modules
-from HARK.interpolation import CubicInterp, LowerEnvelope, LinearInterp
-from HARK.simulation import drawDiscrete, drawBernoulli, drawLognormal, drawUniform
+from HARK.interpolation import CubicInterp, LowerEnvelope, LinearInterp, KinkedLinearInterp, makeLowerEnvelope, \
+                               HARKinterpolator1D, InterpolatorBank
+from HARK.simulation import drawDiscrete, drawBernoulli, drawLognormal, drawUniform, drawAlias, makeIncShkTable
 from HARK.utilities import approxMeanOneLognormal, addDiscreteOutcomeConstantMean,\
                            combineIndepDstns, makeGridExpMult, CRRAutility, CRRAutilityP, \
                            CRRAutilityPP, CRRAutilityP_inv, CRRAutility_invP, CRRAutility_inv, \
@@ -880,7 +881,7 @@ class ConsIndShockSolverBasic(ConsIndShockSetup):
         cFuncNowUnc = interpolator(mNrm,cNrm)
 
         # Combine the constrained and unconstrained functions into the true consumption function
-        cFuncNow = LowerEnvelope(cFuncNowUnc,self.cFuncNowCnst)
+        cFuncNow = makeLowerEnvelope(cFuncNowUnc,self.cFuncNowCnst)
 
         # Make the marginal value function and the marginal marginal value function
         vPfuncNow = MargValueFunc(cFuncNow,self.CRRA)
@@ -1225,6 +1226,576 @@ def solveConsIndShock(solution_next,IncomeDstn,LivPrb,DiscFac,CRRA,Rfree,PermGro
     return solution_now
 
 
+####################################################################################################
+####################################################################################################
+
+class ConsIndShockBatchSolver(object):
+    '''
+    A class for solving a single period of the consumption-saving problem with
+    risky income for K consumer types at once.  The types must face the same
+    income distribution, survival probability, interest factor, growth factor,
+    borrowing constraint and assets grid, but may have different discount factors
+    and coefficients of relative risk aversion.  Each array used in the solution
+    has a leading axis of size K; the results are exactly what K instances of
+    ConsIndShockSolverBasic would produce.
+    '''
+    def __init__(self,solution_next,IncomeDstn,LivPrb,DiscFac,CRRA,Rfree,PermGroFac,
+                      BoroCnstArt,aXtraGrid):
+        '''
+        Constructor for a new solver for one period of K consumer types.
+
+        Parameters
+        ----------
+        solution_next : [ConsumerSolution]
+            The solutions to next period's one period problem for each type, as
+            made by ConsIndShockSolverBasic (see canUse).
+        IncomeDstn : [np.array]
+            A list containing three arrays of floats, representing a discrete
+            approximation to the income process between the period being solved
+            and the one immediately following (in solution_next). Order: event
+            probabilities, permanent shocks, transitory shocks.
+        LivPrb : float
+            Survival probability; likelihood of being alive at the beginning of
+            the succeeding period.
+        DiscFac : np.array
+            Intertemporal discount factor for future utility for each type.
+        CRRA : np.array
+            Coefficient of relative risk aversion for each type.
+        Rfree : float
+            Risk free interest factor on end-of-period assets.
+        PermGroFac : float
+            Expected permanent income growth factor at the end of this period.
+        BoroCnstArt: float or None
+            Borrowing constraint for the minimum allowable assets to end the
+            period with.  BoroCnstArt=None indicates no artificial borrowing
+            constraint.
+        aXtraGrid: np.array
+            Array of "extra" end-of-period asset values-- assets above the
+            absolute minimum acceptable level.
+
+        Returns
+        -------
+        None
+        '''
+        self.solution_next  = solution_next
+        self.IncomeDstn     = IncomeDstn
+        self.LivPrb         = LivPrb
+        self.DiscFac        = np.asarray(DiscFac,dtype=float)
+        self.CRRA           = np.asarray(CRRA,dtype=float)
+        self.Rfree          = Rfree
+        self.PermGroFac     = PermGroFac
+        self.BoroCnstArt    = BoroCnstArt
+        self.aXtraGrid      = aXtraGrid
+
+    @staticmethod
+    def canUse(solution_next):
+        '''
+        Checks whether a list of next period solutions has the form made by
+        ConsIndShockSolverBasic: a KinkedLinearInterp combining a linear spline with
+        decay extrapolation and a linear borrowing constraint, where the splines
+        all have the same number of gridpoints.  Other solutions (like the terminal period) must be handled
+        by the usual one period solver.
+
+        Parameters
+        ----------
+        solution_next : [ConsumerSolution]
+            The solutions to next period's one period problem for each type.
+
+        Returns
+        -------
+        (unnamed) : boolean
+            True if the batched solver can be used for this period.
+        '''
+        sizes = set()
+        for solution in solution_next:
+            cFunc = getattr(solution,'cFunc',None)
+            if type(cFunc) is not KinkedLinearInterp:
+                return False
+            cFuncUnc = cFunc.functions[0]
+            if not cFuncUnc.decay_extrap:
+                return False
+            sizes.add(cFuncUnc.x_n)
+        return len(sizes) == 1
+
+    def setAndUpdateValues(self):
+        '''
+        Unpacks the income distribution and next period's solutions, and calculates
+        the bounding MPCs and human wealth for each type; see the method of the same
+        name in ConsIndShockSetup.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        none
+        '''
+        solution_next         = self.solution_next
+        self.DiscFacEff       = self.DiscFac*self.LivPrb # "effective" discount factor
+        self.ShkPrbsNext      = self.IncomeDstn[0]
+        self.PermShkValsNext  = self.IncomeDstn[1]
+        self.TranShkValsNext  = self.IncomeDstn[2]
+        self.PermShkMinNext   = np.min(self.PermShkValsNext)
+        self.TranShkMinNext   = np.min(self.TranShkValsNext)
+        self.WorstIncPrb      = np.sum(self.ShkPrbsNext[
+                                (self.PermShkValsNext*self.TranShkValsNext)==
+                                (self.PermShkMinNext*self.TranShkMinNext)])
+
+        # Stack next period's consumption functions into arrays; the kinked functions
+        # can have different numbers of gridpoints, so pad them with their last one
+        cFuncNext             = [solution.cFunc for solution in solution_next]
+        cFuncUncNext          = [cFunc.functions[0] for cFunc in cFuncNext]
+        cFuncCnstNext         = [cFunc.functions[1] for cFunc in cFuncNext]
+        KinkCount             = max([cFunc.x_n for cFunc in cFuncNext])
+        pad                   = lambda a : np.concatenate((a,np.repeat(a[-1:],KinkCount-a.size)))
+        self.mKinkNext        = np.vstack([pad(cFunc.x_list) for cFunc in cFuncNext])
+        self.cKinkNext        = np.vstack([pad(cFunc.y_list) for cFunc in cFuncNext])
+        self.cKinkSlopeNext   = np.vstack([pad(cFunc.slopes) for cFunc in cFuncNext])
+        self.mKinkMaxNext     = np.array([cFunc.x_list[-1] for cFunc in cFuncNext])
+        self.cFuncBelowNext   = np.array([cFunc.func_below for cFunc in cFuncNext])
+        self.mGridNext        = np.vstack([f.x_list for f in cFuncUncNext])
+        self.cGridNext        = np.vstack([f.y_list for f in cFuncUncNext])
+        self.cSegSlopeNext    = np.vstack([f.slopes for f in cFuncUncNext])
+        self.cInterceptNext   = np.array([f.intercept_limit for f in cFuncUncNext])
+        self.cSlopeNext       = np.array([f.slope_limit for f in cFuncUncNext])
+        self.cDecayANext      = np.array([f.decay_extrap_A for f in cFuncUncNext])
+        self.cDecayBNext      = np.array([f.decay_extrap_B for f in cFuncUncNext])
+        self.mCnstNext        = np.vstack([f.x_list for f in cFuncCnstNext])
+        self.cCnstNext        = np.vstack([f.y_list for f in cFuncCnstNext])
+        self.cCnstSlopeNext   = np.vstack([f.slopes for f in cFuncCnstNext])
+        mNrmMinNext           = np.array([solution.mNrmMin for solution in solution_next])
+        hNrmNext              = np.array([solution.hNrm for solution in solution_next])
+        MPCminNext            = np.array([solution.MPCmin for solution in solution_next])
+        MPCmaxNext            = np.array([solution.MPCmax for solution in solution_next])
+
+        # Update the bounding MPCs and PDV of human wealth:
+        self.PatFac       = ((self.Rfree*self.DiscFacEff)**(1.0/self.CRRA))/self.Rfree
+        self.MPCminNow    = 1.0/(1.0 + self.PatFac/MPCminNext)
+        self.ExIncNext    = np.dot(self.ShkPrbsNext,self.TranShkValsNext*self.PermShkValsNext)
+        self.hNrmNow      = self.PermGroFac/self.Rfree*(self.ExIncNext + hNrmNext)
+        self.MPCmaxNow    = 1.0/(1.0 + (self.WorstIncPrb**(1.0/self.CRRA))*
+                                        self.PatFac/MPCmaxNext)
+
+        # Calculate the minimum allowable value of money resources in this period
+        self.BoroCnstNat = (mNrmMinNext - self.TranShkMinNext)*\
+                           (self.PermGroFac*self.PermShkMinNext)/self.Rfree
+        if self.BoroCnstArt is None:
+            self.mNrmMinNow = self.BoroCnstNat
+        else:
+            self.mNrmMinNow = np.maximum(self.BoroCnstNat,self.BoroCnstArt)
+        self.MPCmaxEff = np.where(self.BoroCnstNat < self.mNrmMinNow,1.0,self.MPCmaxNow)
+
+    def cFuncNext(self,mNrm):
+        '''
+        Evaluates next period's consumption function for each type, replicating
+        KinkedLinearInterp for all K types at once.
+
+        Parameters
+        ----------
+        mNrm : np.array
+            Array of market resources with leading axis of size K.
+
+        Returns
+        -------
+        cNrm : np.array
+            Consumption at each value of mNrm, same shape as mNrm.
+        '''
+        K     = mNrm.shape[0]
+        m     = np.reshape(mNrm,(K,-1))
+        rows  = np.arange(K)[:,None]
+
+        # Kinked piece: linear spline from the start of the borrowing constraint
+        x     = self.mKinkNext
+        y     = self.cKinkNext
+        i     = np.maximum(np.vstack([np.searchsorted(x[k,:-1],m[k]) for k in range(K)]),1)
+        cNrm  = y[rows,i-1] + self.cKinkSlopeNext[rows,i-1]*(m-x[rows,i-1])
+        below = m < x[:,0:1]
+        cNrm[below] = np.nan
+
+        # Below the constraint, only the unconstrained spline is defined
+        below &= self.cFuncBelowNext[:,None]
+        for k in np.nonzero(np.any(below,axis=1))[0]:
+            xu      = self.mGridNext[k]
+            m_below = m[k,below[k]]
+            j       = np.maximum(np.searchsorted(xu[:-1],m_below),1)-1
+            c_below = self.cGridNext[k,j] + self.cSegSlopeNext[k,j]*(m_below-xu[j])
+            c_below[m_below < xu[0]] = np.nan
+            cNrm[k,below[k]] = c_below
+
+        # Above the top gridpoint, the lower of the decay extrapolation and constraint
+        above = m > self.mKinkMaxNext[:,None]
+        if np.any(above):
+            k_above = np.nonzero(above)[0]
+            m_above = m[above]
+            m_temp  = m_above - self.mGridNext[k_above,-1]
+            cUnc    = self.cInterceptNext[k_above] + self.cSlopeNext[k_above]*m_above - \
+                      self.cDecayANext[k_above]*np.exp(-self.cDecayBNext[k_above]*m_temp)
+            cCnst   = self.cCnstNext[k_above,0] + \
+                      self.cCnstSlopeNext[k_above,0]*(m_above-self.mCnstNext[k_above,0])
+            cNrm[above] = np.where(cCnst < cUnc,cCnst,cUnc)
+
+        return np.reshape(cNrm,mNrm.shape)
+
+    def prepareToCalcEndOfPrdvP(self):
+        '''
+        Makes the arrays of end-of-period assets for each type and of market
+        resources next period for each type, income shock, and asset gridpoint.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        aNrmNow : np.array
+            A K x aXtraCount array of end-of-period assets; also stored as attribute of self.
+        '''
+        aNrmNow       = np.asarray(self.aXtraGrid)[None,:] + self.BoroCnstNat[:,None]
+        self.mNrmNext = self.Rfree/(self.PermGroFac*self.PermShkValsNext[None,:,None])*\
+                        aNrmNow[:,None,:] + self.TranShkValsNext[None,:,None]
+        self.aNrmNow  = aNrmNow
+        return aNrmNow
+
+    def calcEndOfPrdvP(self):
+        '''
+        Calculate end-of-period marginal value of assets at each point in aNrmNow
+        for each type, taking a weighted sum of next period marginal values across
+        income shocks.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        EndOfPrdvP : np.array
+            A K x aXtraCount array of end-of-period marginal value of assets.
+        '''
+        CRRA       = self.CRRA[:,None,None]
+        vPnext     = utilityP(self.cFuncNext(self.mNrmNext),gam=CRRA)
+        EndOfPrdvP = (self.DiscFacEff*self.Rfree*self.PermGroFac**(-self.CRRA))[:,None]*np.sum(
+                     self.PermShkValsNext[None,:,None]**(-CRRA)*
+                     vPnext*self.ShkPrbsNext[None,:,None],axis=1)
+        return EndOfPrdvP
+
+    def makeSolutions(self,EndOfPrdvP):
+        '''
+        Finds the endogenous gridpoints for each type and splits them into one
+        ConsumerSolution per type, just as ConsIndShockSolverBasic would make.
+
+        Parameters
+        ----------
+        EndOfPrdvP : np.array
+            A K x aXtraCount array of end-of-period marginal value of assets.
+
+        Returns
+        -------
+        solution_now : [ConsumerSolution]
+            The solution to this period's problem for each type.
+        '''
+        cNrmNow = utilityP_inv(EndOfPrdvP,gam=self.CRRA[:,None])
+        mNrmNow = cNrmNow + self.aNrmNow
+
+        # Limiting consumption is zero as m approaches mNrmMin
+        cNrm = np.insert(cNrmNow,0,0.,axis=-1)
+        mNrm = np.hstack((self.BoroCnstNat[:,None],mNrmNow))
+
+        solution_now = []
+        for k in range(self.CRRA.size):
+            cFuncNowUnc  = LinearInterp(mNrm[k],cNrm[k],self.MPCminNow[k]*self.hNrmNow[k],self.MPCminNow[k])
+            cFuncNowCnst = LinearInterp(np.array([self.mNrmMinNow[k], self.mNrmMinNow[k]+1]),
+                                        np.array([0.0, 1.0]))
+            cFuncNow     = makeLowerEnvelope(cFuncNowUnc,cFuncNowCnst)
+            vPfuncNow    = MargValueFunc(cFuncNow,self.CRRA[k])
+            solution     = ConsumerSolution(cFunc=cFuncNow, vPfunc=vPfuncNow, mNrmMin=self.mNrmMinNow[k])
+            solution.hNrm   = self.hNrmNow[k]
+            solution.MPCmin = self.MPCminNow[k]
+            solution.MPCmax = self.MPCmaxEff[k]
+            solution_now.append(solution)
+        return solution_now
+
+    def solve(self):
+        '''
+        Solves this period's consumption-saving problem for all K types.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        solution_now : [ConsumerSolution]
+            The solution to this period's problem for each type.
+        '''
+        self.setAndUpdateValues()
+        self.prepareToCalcEndOfPrdvP()
+        EndOfPrdvP = self.calcEndOfPrdvP()
+        return self.makeSolutions(EndOfPrdvP)
+
+
+def solveIndShockBatch(agents,verbose=False):
+    '''
+    Solves a list of consumer types by backward induction, solving together (with
+    ConsIndShockBatchSolver) all types that use solveConsIndShock with linear
+    splines and no value function and that differ only in DiscFac and/or CRRA.
+    This is much faster than solving each type separately when, e.g., a population
+    has a distribution of discount factors.  Types that cannot be batched are
+    solved one at a time.  Each type ends up in the same state as after its own
+    solve() method, including loading from and storing in its solution_cache
+    and using and filling its warm_start_cache.
+
+    Parameters
+    ----------
+    agents : [AgentType]
+        The consumer types to be solved.
+    verbose : boolean
+        If True, solution progress is printed to screen.
+
+    Returns
+    -------
+    None
+    '''
+    # Do pre-solution stuff, look for each type's solution in its caches, and
+    # resolve the one period solver inputs of the types that must be solved
+    original_time_flow = [agent.time_flow for agent in agents]
+    solutions = []
+    solution_inits = []
+    solve_infos = []
+    plans = []
+    for agent in agents:
+        solution, solution_init, solve_info = agent.startSolve()
+        solutions.append(solution)
+        solution_inits.append(solution_init)
+        solve_infos.append(solve_info)
+        agent.timeRev()
+        plans.append(agent.updateSolverPlan() if solution is None else None)
+
+    # Sort the types that must be solved into groups that can be solved together
+    batches = []
+    for k in range(len(agents)):
+        if solutions[k] is not None:
+            continue
+        if not isBatchableIndShock(agents[k],plans[k]):
+            batches.append([k])
+            continue
+        for batch in batches:
+            j = batch[0]
+            if isBatchableIndShock(agents[j],plans[j]) and \
+                    haveSameIndShockProblem(agents[j],plans[j],agents[k],plans[k]):
+                batch.append(k)
+                break
+        else:
+            batches.append([k])
+
+    # Solve each group of types
+    for batch in batches:
+        if len(batch) == 1 and not isBatchableIndShock(agents[batch[0]],plans[batch[0]]):
+            batch_solutions = [solveAgent(agents[batch[0]],verbose,solution_inits[batch[0]])]
+        else:
+            batch_solutions = solveBatchOfAgents([agents[k] for k in batch],[plans[k] for k in batch],
+                                                 verbose,[solution_inits[k] for k in batch])
+        for k, solution in zip(batch,batch_solutions):
+            solutions[k] = solution
+
+    # Do post-solution stuff just like AgentType.solve
+    for k in range(len(agents)):
+        agent = agents[k]
+        if original_time_flow[k]:
+            agent.timeFwd()
+        agent.finishSolve(solutions[k],solve_infos[k])
+
+
+def canSolveIndShockBatch(agents):
+    '''
+    Checks whether every consumer type in a list can be solved by
+    ConsIndShockBatchSolver (see isBatchableIndShock).
+
+    Parameters
+    ----------
+    agents : [AgentType]
+        The consumer types to be checked.
+
+    Returns
+    -------
+    (unnamed) : boolean
+        True if all of the types can be solved in batches.
+    '''
+    for agent in agents:
+        original_time_flow = agent.time_flow
+        agent.timeRev()
+        plan = agent.updateSolverPlan()
+        if original_time_flow:
+            agent.timeFwd()
+        if not isBatchableIndShock(agent,plan):
+            return False
+    return True
+
+
+def isBatchableIndShock(agent,plan):
+    '''
+    Checks whether a consumer type can be solved by ConsIndShockBatchSolver: its
+    one period solver must be solveConsIndShock in every period, with linear
+    splines and no value function.
+
+    Parameters
+    ----------
+    agent : AgentType
+        The consumer type to be checked (with time flowing backward).
+    plan : SolverPlan
+        The agent's resolved one period solver inputs.
+
+    Returns
+    -------
+    (unnamed) : boolean
+        True if the type can be solved in a batch.
+    '''
+    for solveOnePeriod, period_args, uses_next in plan.periods:
+        if solveOnePeriod is not solveConsIndShock:
+            return False
+        if period_args['CubicBool'] or period_args['vFuncBool']:
+            return False
+    return True
+
+
+def haveSameIndShockProblem(agent_A,plan_A,agent_B,plan_B):
+    '''
+    Checks whether two batchable consumer types face the same problem in every
+    period apart from DiscFac and CRRA, and iterate the same way.
+
+    Parameters
+    ----------
+    agent_A : AgentType
+        A consumer type.
+    plan_A : SolverPlan
+        The resolved one period solver inputs of agent_A.
+    agent_B : AgentType
+        Another consumer type.
+    plan_B : SolverPlan
+        The resolved one period solver inputs of agent_B.
+
+    Returns
+    -------
+    (unnamed) : boolean
+        True if the two types can be solved in the same batch.
+    '''
+    if plan_A.T != plan_B.T or agent_A.cycles != agent_B.cycles or \
+            agent_A.pseudo_terminal != agent_B.pseudo_terminal:
+        return False
+    for t in range(plan_A.T):
+        args_A = plan_A.periods[t][1]
+        args_B = plan_B.periods[t][1]
+        for name in args_A:
+            if name in ('DiscFac','CRRA'):
+                continue
+            thing_A = args_A[name]
+            thing_B = args_B[name]
+            if thing_A is thing_B:
+                continue
+            try:
+                if distanceMetric(thing_A,thing_B) != 0.0:
+                    return False
+            except:
+                if thing_A != thing_B:
+                    return False
+    return True
+
+
+def solveBatchOfAgents(agents,plans,verbose,solution_inits=None):
+    '''
+    Solves a group of consumer types that have the same problem except for DiscFac
+    and CRRA by backward induction, iterating cycles just like solveAgent.  Each
+    type stops iterating once its own solution has converged.
+
+    Parameters
+    ----------
+    agents : [AgentType]
+        The consumer types to be solved, with time flowing backward.
+    plans : [SolverPlan]
+        The resolved one period solver inputs for each type.
+    verbose : boolean
+        If True, solution progress is printed to screen.
+    solution_inits : [Solution or None] or None
+        For infinite horizon types, a solution to start from instead of
+        solution_terminal for each type (see solveAgent); None for none.
+
+    Returns
+    -------
+    solutions : [[ConsumerSolution]]
+        For each type, a list of solutions to the one period problems that the
+        agent will encounter in his "lifetime", in reverse chronological order.
+    '''
+    K                = len(agents)
+    T                = plans[0].T
+    cycles_left      = agents[0].cycles
+    infinite_horizon = cycles_left == 0
+    max_cycles       = 5000 # escape clause
+
+    solutions = [[] for k in range(K)]
+    if not agents[0].pseudo_terminal:
+        for k in range(K):
+            solutions[k].append(deepcopy(agents[k].solution_terminal))
+
+    if solution_inits is None:
+        solution_inits = K*[None]
+    solution_last    = [agents[k].solution_terminal if solution_inits[k] is None else solution_inits[k]
+                        for k in range(K)]
+    check_all        = [infinite_horizon and (solution_inits[k] is not None or agents[k].warm_start)
+                        for k in range(K)]
+    criteria_last    = [{} for k in range(K)]
+    active           = range(K) # types still being iterated
+    completed_cycles = 0
+    while len(active) > 0:
+        # Solve a cycle of the model for every type that has not yet converged
+        solution_cycle = [[] for k in active]
+        solution_next  = [solution_last[k] for k in active]
+        for t in range(T):
+            shared_args = plans[active[0]].periods[t][1]
+            if ConsIndShockBatchSolver.canUse(solution_next):
+                solver = ConsIndShockBatchSolver(solution_next,shared_args['IncomeDstn'],
+                            shared_args['LivPrb'],
+                            [plans[k].periods[t][1]['DiscFac'] for k in active],
+                            [plans[k].periods[t][1]['CRRA'] for k in active],
+                            shared_args['Rfree'],shared_args['PermGroFac'],
+                            shared_args['BoroCnstArt'],shared_args['aXtraGrid'])
+                solution_now = solver.solve()
+            else: # e.g. the terminal period, which isn't a lower envelope
+                solution_now = []
+                for j in range(len(active)):
+                    solveOnePeriod, period_args, uses_next = plans[active[j]].periods[t]
+                    solution_now.append(solveOnePeriod(solution_next=solution_next[j],**period_args))
+            for j in range(len(active)):
+                solution_cycle[j].append(solution_now[j])
+            solution_next = solution_now
+
+        # Check for termination of each type, and update the "last period solution"
+        still_active = []
+        for j in range(len(active)):
+            k = active[j]
+            solution_now = solution_cycle[j][-1]
+            if infinite_horizon:
+                solution_distance = calcCycleDistance(agents[k],solution_now,solution_last[k],completed_cycles,
+                                                      check_all[k],criteria_last[k])
+                go = solution_distance > agents[k].tolerance and completed_cycles < max_cycles
+                if not go: # Record the last cycle if horizon is infinite
+                    solutions[k] = solution_cycle[j]
+            else:
+                solutions[k] += solution_cycle[j]
+                go = cycles_left > 1
+            if go:
+                still_active.append(k)
+            solution_last[k] = solution_now
+        active = still_active
+        cycles_left += -1
+        completed_cycles += 1
+
+        if verbose:
+            print('Finished cycle #' + str(completed_cycles) + ' for a batch of ' + str(K) +
+                  ' types, ' + str(len(active)) + ' still iterating.')
+
+    return solutions
+
+
 ####################################################################################################
 ####################################################################################################
 
@@ -1475,6 +2046,7 @@ class PerfForesightConsumerType(AgentType):
         self.poststate_vars = deepcopy(self.poststate_vars_)
         self.shock_vars     = deepcopy(self.shock_vars_)
         self.solveOnePeriod = solvePerfForesight # solver for perfect foresight model
+        self.warm_start_criteria = ['hNrm','MPCmin','MPCmax'] # recursive parts of the solution
 
     def updateSolutionTerminal(self):
         '''
@@ -1514,6 +2086,30 @@ class PerfForesightConsumerType(AgentType):
             self.cFunc.append(solution_t.cFunc)
         self.addToTimeVary('cFunc')
 
+    def postSolve(self):
+        '''
+        Stacks the consumption functions for every period of the cycle into one
+        InterpolatorBank in the attribute cFuncStacked, so that getControls can
+        find consumption for all agents with one search keyed by t_cycle rather
+        than one pass over the agents per period.  If the consumption functions
+        aren't all 1D interpolators, cFuncStacked is None.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        none
+        '''
+        self.cFuncStacked = None
+        if len(self.solution) < self.T_cycle:
+            return None
+        cFuncs = [self.solution[t].cFunc for t in range(self.T_cycle)]
+        if all(isinstance(cFunc,HARKinterpolator1D) for cFunc in cFuncs):
+            self.cFuncStacked = InterpolatorBank(cFuncs)
+        return None
+
     def initializeSim(self):
         self.PlvlAggNow = 1.0
         self.PermShkAggNow = self.PermGroFacAgg # This never changes during simulation
@@ -1538,9 +2134,9 @@ class PerfForesightConsumerType(AgentType):
         '''
         # Get and store states for newly born agents
         N = np.sum(which_agents) # Number of new consumers to make
-        self.aNrmNow[which_agents] = drawLognormal(N,mu=self.aNrmInitMean,sigma=self.aNrmInitStd,seed=self.RNG.randint(0,2**31-1))
+        self.aNrmNow[which_agents] = drawLognormal(N,mu=self.aNrmInitMean,sigma=self.aNrmInitStd,seed=self.getRNGstream('Birth'))
         pLvlInitMeanNow = self.pLvlInitMean + np.log(self.PlvlAggNow) # Account for newer cohorts having higher permanent income
-        self.pLvlNow[which_agents] = drawLognormal(N,mu=pLvlInitMeanNow,sigma=self.pLvlInitStd,seed=self.RNG.randint(0,2**31-1))
+        self.pLvlNow[which_agents] = drawLognormal(N,mu=pLvlInitMeanNow,sigma=self.pLvlInitStd,seed=self.getRNGstream('Birth'))
         self.t_age[which_agents]   = 0 # How many periods since each agent was born
         self.t_cycle[which_agents] = 0 # Which period of the cycle each agent is currently in
         return None
@@ -1562,7 +2158,7 @@ class PerfForesightConsumerType(AgentType):
         # Determine who dies
         DiePrb_by_t_cycle = 1.0 - np.asarray(self.LivPrb)
         DiePrb = DiePrb_by_t_cycle[self.t_cycle-1] # Time has already advanced, so look back one
-        DeathShks = drawUniform(N=self.AgentCount,seed=self.RNG.randint(0,2**31-1))
+        DeathShks = drawUniform(N=self.AgentCount,seed=self.getRNGstream('Death'))
         which_agents = DeathShks < DiePrb
         if self.T_age is not None: # Kill agents that have lived for too many periods
             too_old = self.t_age >= self.T_age
@@ -1640,6 +2236,16 @@ class PerfForesightConsumerType(AgentType):
         -------
         None
         '''
+        # Use the stacked consumption functions from postSolve if the solution
+        # hasn't been replaced since then
+        cFuncStacked = getattr(self,'cFuncStacked',None)
+        if cFuncStacked is not None and cFuncStacked.N == self.T_cycle and \
+                all(cFuncStacked.functions[t] is self.solution[t].cFunc for t in range(self.T_cycle)):
+            cNrmNow, MPCnow = cFuncStacked.evalByIndex(self.t_cycle,self.mNrmNow,with_der=True)
+            self.cNrmNow = cNrmNow
+            self.MPCnow = MPCnow
+            return None
+
         cNrmNow = np.zeros(self.AgentCount) + np.nan
         MPCnow  = np.zeros(self.AgentCount) + np.nan
         for t in range(self.T_cycle):
@@ -1810,10 +2416,31 @@ class IndShockConsumerType(PerfForesightConsumerType):
         self.updateAssetsGrid()
         self.updateSolutionTerminal()
 
+    def updateIncShkTable(self):
+        '''
+        Packs the income shock distributions for each period of the cycle into
+        padded tables indexed by t_cycle, so that getShocks can draw shocks for
+        all agents at once.  Row t holds the distribution faced by agents whose
+        t_cycle is t (IncomeDstn[t-1], with PermGroFac[t-1] folded into the per-
+        manent shocks); the extra last row holds the one used for newborns.  The
+        tables are only rebuilt if IncomeDstn or PermGroFac has changed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        IncomeDstns = [[self.IncomeDstn[t-1]] for t in range(self.T_cycle)] + [[self.IncomeDstn[0]]]
+        PermGroFacs = [self.PermGroFac[t-1] for t in range(self.T_cycle)] + [self.PermGroFac[0]]
+        self.IncShkTable = makeIncShkTable(IncomeDstns,PermGroFacs,table=getattr(self,'IncShkTable',None))
+
     def getShocks(self):
         '''
         Gets permanent and transitory income shocks for this period.  Samples from IncomeDstn for
-        each period in the cycle.
+        each period in the cycle, using the tables made by updateIncShkTable.
 
         Parameters
         ----------
@@ -1823,33 +2450,18 @@ class IndShockConsumerType(PerfForesightConsumerType):
         -------
         None
         '''
-        PermShkNow = np.zeros(self.AgentCount) # Initialize shock arrays
-        TranShkNow = np.zeros(self.AgentCount)
+        self.updateIncShkTable()
+        IncShkTable = self.IncShkTable
+
+        # Newborns use the *first* period in the sequence.  Approximation.
         newborn = self.t_age == 0
-        for t in range(self.T_cycle):
-            these = t == self.t_cycle
-            N = np.sum(these)
-            if N > 0:
-                IncomeDstnNow    = self.IncomeDstn[t-1] # set current income distribution
-                PermGroFacNow    = self.PermGroFac[t-1] # and permanent growth factor
-                Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-                # Get random draws of income shocks from the discrete distribution
-                EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=False,seed=self.RNG.randint(0,2**31-1))
-                PermShkNow[these] = IncomeDstnNow[1][EventDraws]*PermGroFacNow # permanent "shock" includes expected growth
-                TranShkNow[these] = IncomeDstnNow[2][EventDraws]
-
-        # That procedure used the *last* period in the sequence for newborns, but that's not right
-        # Redraw shocks for newborns, using the *first* period in the sequence.  Approximation.
-        N = np.sum(newborn)
-        if N > 0:
-            these = newborn
-            IncomeDstnNow    = self.IncomeDstn[0] # set current income distribution
-            PermGroFacNow    = self.PermGroFac[0] # and permanent growth factor
-            Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-            # Get random draws of income shocks from the discrete distribution
-            EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=False,seed=self.RNG.randint(0,2**31-1))
-            PermShkNow[these] = IncomeDstnNow[1][EventDraws]*PermGroFacNow # permanent "shock" includes expected growth
-            TranShkNow[these] = IncomeDstnNow[2][EventDraws]
+        rows = np.where(newborn,self.T_cycle,self.t_cycle)
+
+        # Draw an event for each agent from the agent's row of the tables
+        EventDraws = drawAlias(self.AgentCount,IncShkTable['prob'],IncShkTable['alias'],rows=rows,
+                               seed=self.getRNGstream('IncShk'))
+        PermShkNow = IncShkTable['PermShk'][rows,EventDraws] # permanent "shock" includes expected growth
+        TranShkNow = IncShkTable['TranShk'][rows,EventDraws]
 #        PermShkNow[newborn] = 1.0
         TranShkNow[newborn] = 1.0
 
@@ -11,8 +11,9 @@ from ConsIndShockModel import ConsIndShockSolver, ValueFunc, MargValueFunc, Cons
 from ConsAggShockModel import AggShockConsumerType
 from HARK.utilities import combineIndepDstns, warnings  # Because of "patch" to warnings modules
 from HARK import Market, HARKobject
-from HARK.simulation import drawDiscrete, drawUniform
-from HARK.interpolation import CubicInterp, LowerEnvelope, LinearInterp
+from HARK.simulation import drawDiscrete, drawUniform, drawAlias, makeCutoffTable, lookupCutoffTable,\
+                            makeMarkovPath, makeIncShkTable
+from HARK.interpolation import CubicInterp, LinearInterp, makeLowerEnvelope, InterpolatorBank
 from HARK.utilities import CRRAutility, CRRAutilityP, CRRAutilityPP, CRRAutilityP_inv, \
                            CRRAutility_invP, CRRAutility_inv, CRRAutilityP_invP
 
@@ -470,7 +471,7 @@ class ConsMarkovSolver(ConsIndShockSolver):
             self.cFuncNowCnst = LinearInterp([self.mNrmMin_list[i], self.mNrmMin_list[i]+1.0],
                                              [0.0,1.0])
             cFuncNowUnc       = interpfunc(mNrm[i,:],cNrm[i,:])
-            cFuncNow          = LowerEnvelope(cFuncNowUnc,self.cFuncNowCnst)
+            cFuncNow          = makeLowerEnvelope(cFuncNowUnc,self.cFuncNowCnst)
 
             # Make the marginal value function and pack up the current-state-conditional solution
             vPfuncNow     = MargValueFunc(cFuncNow,self.CRRA)
@@ -762,7 +763,7 @@ class MarkovConsumerType(IndShockConsumerType):
     def initializeSim(self):
         IndShockConsumerType.initializeSim(self)
         if self.global_markov:  #Need to initialize markov state to be the same for all agents
-            base_draw = drawUniform(1,seed=self.RNG.randint(0,2**31-1))
+            base_draw = drawUniform(1,seed=self.RNG)
             Cutoffs = np.cumsum(np.array(self.MrkvPrbsInit))
             self.MrkvNow = np.ones(self.AgentCount)*np.searchsorted(Cutoffs,base_draw).astype(int)
         self.MrkvNow = self.MrkvNow.astype(int)
@@ -784,7 +785,7 @@ class MarkovConsumerType(IndShockConsumerType):
         # Determine who dies
         LivPrb = np.array(self.LivPrb)[self.t_cycle-1,self.MrkvNow] # Time has already advanced, so look back one
         DiePrb = 1.0 - LivPrb
-        DeathShks = drawUniform(N=self.AgentCount,seed=self.RNG.randint(0,2**31-1))
+        DeathShks = drawUniform(N=self.AgentCount,seed=self.RNG)
         which_agents = DeathShks < DiePrb
         if self.T_age is not None: # Kill agents that have lived for too many periods
             too_old = self.t_age >= self.T_age
@@ -808,14 +809,92 @@ class MarkovConsumerType(IndShockConsumerType):
         IndShockConsumerType.simBirth(self,which_agents) # Get initial assets and permanent income
         if not self.global_markov:  #Markov state is not changed if it is set at the global level
             N = np.sum(which_agents)
-            base_draws = drawUniform(N,seed=self.RNG.randint(0,2**31-1))
+            base_draws = drawUniform(N,seed=self.RNG)
             Cutoffs = np.cumsum(np.array(self.MrkvPrbsInit))
             self.MrkvNow[which_agents] = np.searchsorted(Cutoffs,base_draws).astype(int)
 
+    def updateMrkvTable(self):
+        '''
+        Packs the cumulative Markov transition probabilities for each period of
+        the cycle into one table with a row for each (t_cycle, previous state)
+        pair, so that getShocks can find every agent's new state with a single
+        search.  Row t*StateCount + i holds the transition probabilities out of
+        state i used by agents whose t_cycle is t.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        MrkvArrays = [np.array(self.MrkvArray[t]) for t in range(self.T_cycle)]
+        StateCount = max([MrkvArray.shape[0] for MrkvArray in MrkvArrays])
+        MrkvPrbs = []
+        for MrkvArray in MrkvArrays:
+            for i in range(StateCount):
+                MrkvPrbs.append(MrkvArray[i,:] if i < MrkvArray.shape[0] else np.ones(1))
+        self.MrkvTable = {'source' : MrkvArrays, 'StateCount' : StateCount,
+                          'cutoffs' : makeCutoffTable(MrkvPrbs)}
+
+    def updateIncShkTable(self):
+        '''
+        Packs the income shock distributions for each period of the cycle and
+        each discrete state into padded tables with a row for each (t_cycle,
+        state) pair, so that getShocks can draw shocks for all agents at once.
+        Row t*StateCount + j holds the distribution faced by agents whose t_cycle
+        is t and whose state is j (IncomeDstn[t-1][j], with PermGroFac[t-1][j]
+        folded into the permanent shocks).  The tables are only rebuilt if
+        IncomeDstn or PermGroFac has changed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        IncomeDstns = [self.IncomeDstn[t-1] for t in range(self.T_cycle)]
+        PermGroFacs = [self.PermGroFac[t-1] for t in range(self.T_cycle)]
+        self.IncShkTable = makeIncShkTable(IncomeDstns,PermGroFacs,table=getattr(self,'IncShkTable',None))
+
+    def drawIncShks(self,MrkvNow):
+        '''
+        Draws permanent (including expected growth) and transitory income shocks
+        for every agent given their discrete states this period, using the tables
+        made by updateIncShkTable.  Newborns are treated like everyone else.
+
+        Parameters
+        ----------
+        MrkvNow : np.array
+            Integer array of size AgentCount with each agent's current discrete state.
+
+        Returns
+        -------
+        PermShkNow : np.array
+            Permanent income shock for each agent, including expected growth.
+        TranShkNow : np.array
+            Transitory income shock for each agent.
+        '''
+        self.updateIncShkTable()
+        IncShkTable = self.IncShkTable
+
+        # Draw an event for each agent from the row for its period and state
+        rows = self.t_cycle*IncShkTable['StateCount'] + MrkvNow
+        EventDraws = drawAlias(self.AgentCount,IncShkTable['prob'],IncShkTable['alias'],rows=rows,
+                               seed=self.getRNGstream('IncShk'))
+        PermShkNow = IncShkTable['PermShk'][rows,EventDraws]
+        TranShkNow = IncShkTable['TranShk'][rows,EventDraws]
+        return PermShkNow, TranShkNow
+
     def getShocks(self):
         '''
         Gets new Markov states and permanent and transitory income shocks for this period.  Samples
-        from IncomeDstn for each period-state in the cycle.
+        from IncomeDstn for each period-state in the cycle.  New states for all agents are found
+        with one search of the table made by updateMrkvTable, and income shocks with one draw each
+        from the tables made by updateIncShkTable; both are rebuilt if their inputs have changed.
 
         Parameters
         ----------
@@ -825,39 +904,27 @@ class MarkovConsumerType(IndShockConsumerType):
         -------
         None
         '''
+        MrkvTable = getattr(self,'MrkvTable',None)
+        if MrkvTable is None or len(MrkvTable['source']) != self.T_cycle or \
+                any([not np.array_equal(MrkvTable['source'][t],self.MrkvArray[t]) for t in range(self.T_cycle)]):
+            self.updateMrkvTable()
+            MrkvTable = self.MrkvTable
+
         # Get new Markov states for each agent
         if self.global_markov:
-            base_draws = np.ones(self.AgentCount)*drawUniform(1,seed=self.RNG.randint(0,2**31-1))
+            base_draws = np.ones(self.AgentCount)*drawUniform(1,seed=self.RNG)
         else:
             base_draws = self.RNG.permutation(np.arange(self.AgentCount,dtype=float)/self.AgentCount + 1.0/(2*self.AgentCount))
         newborn = self.t_age == 0 # Don't change Markov state for those who were just born (unless global_markov)
         MrkvPrev = self.MrkvNow
-        MrkvNow = np.zeros(self.AgentCount,dtype=int)
-        for t in range(self.T_cycle):
-            Cutoffs = np.cumsum(self.MrkvArray[t],axis=1)
-            for j in range(self.MrkvArray[t].shape[0]):
-                these = np.logical_and(self.t_cycle == t,MrkvPrev == j)
-                MrkvNow[these] = np.searchsorted(Cutoffs[j,:],base_draws[these]).astype(int)
+        rows = self.t_cycle*MrkvTable['StateCount'] + MrkvPrev
+        MrkvNow = lookupCutoffTable(MrkvTable['cutoffs'],rows,base_draws)
         if not self.global_markov:
                 MrkvNow[newborn] = MrkvPrev[newborn]
         self.MrkvNow = MrkvNow.astype(int)
 
         # Now get income shocks for each consumer, by cycle-time and discrete state
-        PermShkNow = np.zeros(self.AgentCount) # Initialize shock arrays
-        TranShkNow = np.zeros(self.AgentCount)
-        for t in range(self.T_cycle):
-            for j in range(self.MrkvArray[t].shape[0]):
-                these = np.logical_and(t == self.t_cycle, j == MrkvNow)
-                N = np.sum(these)
-                if N > 0:
-                    IncomeDstnNow    = self.IncomeDstn[t-1][j] # set current income distribution
-                    PermGroFacNow    = self.PermGroFac[t-1][j] # and permanent growth factor
-                    Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-                    # Get random draws of income shocks from the discrete distribution
-                    EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=False,seed=self.RNG.randint(0,2**31-1))
-                    PermShkNow[these] = IncomeDstnNow[1][EventDraws]*PermGroFacNow # permanent "shock" includes expected growth
-                    TranShkNow[these] = IncomeDstnNow[2][EventDraws]
-        newborn = self.t_age == 0
+        PermShkNow, TranShkNow = self.drawIncShks(self.MrkvNow)
         PermShkNow[newborn] = 1.0
         TranShkNow[newborn] = 1.0
         self.PermShkNow = PermShkNow
@@ -908,9 +975,19 @@ class MarkovConsumerType(IndShockConsumerType):
         '''
         cNrmNow = np.zeros(self.AgentCount) + np.nan
         for t in range(self.T_cycle):
-            for j in range(self.MrkvArray[t].shape[0]):
-                these = np.logical_and(t == self.t_cycle, j == self.MrkvNow)
-                cNrmNow[these] = self.solution[t].cFunc[j](self.mNrmNow[these])
+            these = t == self.t_cycle
+            if not np.any(these):
+                continue
+            # Evaluate all of the state-conditional consumption functions at once,
+            # packing them into an InterpolatorBank the first time they're used
+            # (or again if the consumption functions have been replaced since)
+            cFunc = self.solution[t].cFunc
+            cFuncBank = getattr(self.solution[t],'cFuncBank',None)
+            if cFuncBank is None or cFuncBank.N != len(cFunc) or \
+                    not all(cFuncBank.functions[j] is cFunc[j] for j in range(len(cFunc))):
+                cFuncBank = InterpolatorBank(cFunc)
+                self.solution[t].cFuncBank = cFuncBank
+            cNrmNow[these] = cFuncBank.evalByIndex(self.MrkvNow[these],self.mNrmNow[these])
         self.cNrmNow = cNrmNow
         return None
 
@@ -1053,7 +1130,7 @@ class MarkovSOEType(MarkovConsumerType, AggShockConsumerType):
         # Determine who dies
         LivPrb = np.array(self.LivPrb)[self.t_cycle-1,self.MrkvNow] # Time has already advanced, so look back one
         DiePrb = 1.0 - LivPrb
-        DeathShks = drawUniform(N=self.AgentCount,seed=self.RNG.randint(0,2**31-1))
+        DeathShks = drawUniform(N=self.AgentCount,seed=self.RNG)
         which_agents = DeathShks < DiePrb
         if self.T_age is not None: # Kill agents that have lived for too many periods
             too_old = self.t_age >= self.T_age
@@ -1107,20 +1184,9 @@ class MarkovSOEType(MarkovConsumerType, AggShockConsumerType):
         MrkvNow = self.MktMrkvNow*np.ones(self.AgentCount)
         self.MrkvNow = MrkvNow.astype(int)
         # Now get income shocks for each consumer, by cycle-time and discrete state
-        PermShkNow = np.zeros(self.AgentCount) # Initialize shock arrays
-        TranShkNow = np.zeros(self.AgentCount)
-        for t in range(self.T_cycle):
-            for j in range(self.MrkvArray[t].shape[0]):
-                these = np.logical_and(t == self.t_cycle, j == MrkvNow)
-                N = np.sum(these)
-                if N > 0:
-                    IncomeDstnNow    = self.IncomeDstn[t-1][j] # set current income distribution
-                    PermGroFacNow    = self.PermGroFac[t-1][j] # and permanent growth factor
-                    Indices          = np.arange(IncomeDstnNow[0].size) # just a list of integers
-                    # Get random draws of income shocks from the discrete distribution
-                    EventDraws       = drawDiscrete(N,X=Indices,P=IncomeDstnNow[0],exact_match=False,seed=self.RNG.randint(0,2**31-1))
-                    PermShkNow[these] = IncomeDstnNow[1][EventDraws]*self.PermShkAggNow*PermGroFacNow # permanent "shock" includes expected growth
-                    TranShkNow[these] = IncomeDstnNow[2][EventDraws]*self.TranShkAggNow
+        PermShkNow, TranShkNow = self.drawIncShks(self.MrkvNow)
+        PermShkNow *= self.PermShkAggNow # permanent "shock" includes expected growth
+        TranShkNow *= self.TranShkAggNow
         newborn = self.t_age == 0
         PermShkNow[newborn] = 1.0
         TranShkNow[newborn] = 1.0*self.TranShkAggNow
@@ -1218,9 +1284,7 @@ class MarkovSmallOpenEconomy(Market):
         Cutoffs = np.cumsum(np.array(self.MrkvPrbsInit))
         MrkvShkHist[0] = np.searchsorted(Cutoffs,base_draws[0]).astype(int)
 
-        Cutoffs = np.cumsum(self.MrkvArray[0],axis=1)
-        for t in range(sim_periods-1):
-            MrkvShkHist[t+1] = np.searchsorted(Cutoffs[MrkvShkHist[t],:],base_draws[t+1]).astype(int)
+        MrkvShkHist[1:] = makeMarkovPath(np.array(self.MrkvArray[0]),MrkvShkHist[0],base_draws[1:])[1:]
         # Store the histories
         self.MrkvShkHist = MrkvShkHist
         #Also make history of aggregate transitory shocks
@@ -156,8 +156,7 @@ class MedShockPolicyFunc(HARKobject):
             Derivative of medical care with respect to market resources for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdm = self.xFunc.derivativeX(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dcdx = self.cFunc.derivativeX(xLvl,MedShk)
         dcdm = dxdm*dcdx
         dMeddm = (dxdm - dcdm)/self.MedPrice
@@ -187,8 +186,7 @@ class MedShockPolicyFunc(HARKobject):
             Derivative of medical care with respect to permanent income for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdp = self.xFunc.derivativeY(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dcdx = self.cFunc.derivativeX(xLvl,MedShk)
         dcdp = dxdp*dcdx
         dMeddp = (dxdp - dcdp)/self.MedPrice
@@ -218,10 +216,9 @@ class MedShockPolicyFunc(HARKobject):
             Derivative of medical care with respect to medical need for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdShk = self.xFunc.derivativeZ(mLvl,pLvl,MedShk)
-        dcdx = self.cFunc.derivativeX(xLvl,MedShk)
-        dcdShk = dxdShk*dcdx + self.cFunc.derivativeY(xLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
+        cLvl,dcdx,dcdShkAtX = self.cFunc.eval_with_gradient(xLvl,MedShk)
+        dcdShk = dxdShk*dcdx + dcdShkAtX
         dMeddShk = (dxdShk - dcdShk)/self.MedPrice
         return dcdShk,dMeddShk
 
@@ -297,8 +294,7 @@ class cThruXfunc(HARKobject):
             Derivative of consumption with respect to market resources for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdm = self.xFunc.derivativeX(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dcdx = self.cFunc.derivativeX(xLvl,MedShk)
         dcdm = dxdm*dcdx
         return dcdm
@@ -324,8 +320,7 @@ class cThruXfunc(HARKobject):
             Derivative of consumption with respect to permanent income for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdp = self.xFunc.derivativeY(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dcdx = self.cFunc.derivativeX(xLvl,MedShk)
         dcdp = dxdp*dcdx
         return dcdp
@@ -351,12 +346,41 @@ class cThruXfunc(HARKobject):
             Derivative of consumption with respect to medical need for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdShk = self.xFunc.derivativeZ(mLvl,pLvl,MedShk)
-        dcdx = self.cFunc.derivativeX(xLvl,MedShk)
-        dcdShk = dxdShk*dcdx + self.cFunc.derivativeY(xLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
+        cLvl,dcdx,dcdShkAtX = self.cFunc.eval_with_gradient(xLvl,MedShk)
+        dcdShk = dxdShk*dcdx + dcdShkAtX
         return dcdShk
 
+    def eval_with_gradient(self,mLvl,pLvl,MedShk):
+        '''
+        Evaluate optimal consumption and its derivatives with respect to market
+        resources, permanent income, and the medical need shock, evaluating the
+        expenditure and consumption functions only once each.
+
+        Parameters
+        ----------
+        mLvl : np.array
+            Market resource levels.
+        pLvl : np.array
+            Permanent income levels; should be same size as mLvl.
+        MedShk : np.array
+            Medical need shocks; should be same size as mLvl.
+
+        Returns
+        -------
+        cLvl : np.array
+            Optimal consumption for each point in (xLvl,MedShk).
+        dcdm : np.array
+            Derivative of consumption with respect to market resources.
+        dcdp : np.array
+            Derivative of consumption with respect to permanent income.
+        dcdShk : np.array
+            Derivative of consumption with respect to medical need.
+        '''
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
+        cLvl,dcdx,dcdShkAtX = self.cFunc.eval_with_gradient(xLvl,MedShk)
+        return cLvl, dxdm*dcdx, dxdp*dcdx, dxdShk*dcdx + dcdShkAtX
+
 class MedThruXfunc(HARKobject):
     '''
     Class for representing medical care function derived from total expenditure
@@ -434,8 +458,7 @@ class MedThruXfunc(HARKobject):
             Derivative of medical care with respect to market resources for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdm = self.xFunc.derivativeX(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dcdx = self.cFunc.derivativeX(xLvl,MedShk)
         dcdm = dxdm*dcdx
         dMeddm = (dxdm - dcdm)/self.MedPrice
@@ -462,8 +485,7 @@ class MedThruXfunc(HARKobject):
             Derivative of medical care with respect to permanent income for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdp = self.xFunc.derivativeY(mLvl,pLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
         dMeddp = (dxdp - dxdp*self.cFunc.derivativeX(xLvl,MedShk))/self.MedPrice
         return dMeddp
 
@@ -488,13 +510,46 @@ class MedThruXfunc(HARKobject):
             Derivative of medical care with respect to medical need for each
             point in (xLvl,MedShk).
         '''
-        xLvl = self.xFunc(mLvl,pLvl,MedShk)
-        dxdShk = self.xFunc.derivativeZ(mLvl,pLvl,MedShk)
-        dcdx = self.cFunc.derivativeX(xLvl,MedShk)
-        dcdShk = dxdShk*dcdx + self.cFunc.derivativeY(xLvl,MedShk)
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
+        cLvl,dcdx,dcdShkAtX = self.cFunc.eval_with_gradient(xLvl,MedShk)
+        dcdShk = dxdShk*dcdx + dcdShkAtX
         dMeddShk = (dxdShk - dcdShk)/self.MedPrice
         return dMeddShk
 
+    def eval_with_gradient(self,mLvl,pLvl,MedShk):
+        '''
+        Evaluate optimal medical care and its derivatives with respect to market
+        resources, permanent income, and the medical need shock, evaluating the
+        expenditure and consumption functions only once each.
+
+        Parameters
+        ----------
+        mLvl : np.array
+            Market resource levels.
+        pLvl : np.array
+            Permanent income levels; should be same size as mLvl.
+        MedShk : np.array
+            Medical need shocks; should be same size as mLvl.
+
+        Returns
+        -------
+        Med : np.array
+            Optimal medical care for each point in (xLvl,MedShk).
+        dMeddm : np.array
+            Derivative of medical care with respect to market resources.
+        dMeddp : np.array
+            Derivative of medical care with respect to permanent income.
+        dMeddShk : np.array
+            Derivative of medical care with respect to medical need.
+        '''
+        xLvl,dxdm,dxdp,dxdShk = self.xFunc.eval_with_gradient(mLvl,pLvl,MedShk)
+        cLvl,dcdx,dcdShkAtX = self.cFunc.eval_with_gradient(xLvl,MedShk)
+        Med = (xLvl-cLvl)/self.MedPrice
+        dMeddm = (dxdm - dxdm*dcdx)/self.MedPrice
+        dMeddp = (dxdp - dxdp*dcdx)/self.MedPrice
+        dMeddShk = (dxdShk - dxdShk*dcdx - dcdShkAtX)/self.MedPrice
+        return Med, dMeddm, dMeddp, dMeddShk
+
 
 ###############################################################################
 
@@ -13,6 +13,7 @@ from copy import deepcopy
 import subprocess
 from HARK.utilities import CRRAutility
 from HARK.interpolation import LinearInterp
+from HARK.history import iterHistoryBlocks, getHistoryBlock
 from StickyEparams import results_dir, tables_dir, figures_dir, UpdatePrb, PermShkAggVar
 UpdatePrbBase = UpdatePrb
 PermShkAggVarBase = PermShkAggVar
@@ -39,7 +40,7 @@ def mystr3(number):
     return out
 
 
-def makeStickyEdataFile(Economy,ignore_periods,description='',filename=None,save_data=False,calc_micro_stats=True,meas_err_base=None):
+def makeStickyEdataFile(Economy,ignore_periods,description='',filename=None,save_data=False,calc_micro_stats=True,meas_err_base=None,hist_block_size=1000):
     '''
     Makes descriptive statistics and macroeconomic data file. Behaves slightly
     differently for heterogeneous agents vs representative agent models.
@@ -64,6 +65,8 @@ def makeStickyEdataFile(Economy,ignore_periods,description='',filename=None,save
     meas_err_base : float or None
         Base value of measurement error standard deviation, which will be adjusted.
         When None (default), value is calculated as stdev(DeltaLogC).
+    hist_block_size : int
+        Number of periods of the agents' histories to read into memory at once.
 
     Returns
     -------
@@ -71,42 +74,49 @@ def makeStickyEdataFile(Economy,ignore_periods,description='',filename=None,save
     '''
     # Extract time series data from the economy
     if hasattr(Economy,'agents'): # If this is a heterogeneous agent specification...
-        if len(Economy.agents) > 1:
-            pLvlAll_hist = np.concatenate([this_type.pLvlTrue_hist for this_type in Economy.agents],axis=1)
-            aLvlAll_hist = np.concatenate([this_type.aLvlNow_hist for this_type in Economy.agents],axis=1)
-            cLvlAll_hist = np.concatenate([this_type.cLvlNow_hist for this_type in Economy.agents],axis=1)
-            yLvlAll_hist = np.concatenate([this_type.yLvlNow_hist for this_type in Economy.agents],axis=1)
-        else: # Don't duplicate the data unless necessary (with one type, concatenating is useless)
-            pLvlAll_hist = Economy.agents[0].pLvlTrue_hist
-            aLvlAll_hist = Economy.agents[0].aLvlNow_hist
-            cLvlAll_hist = Economy.agents[0].cLvlNow_hist
-            yLvlAll_hist = Economy.agents[0].yLvlNow_hist
+        # Histories are read a block of periods at a time, with all types side by side,
+        # so that they never have to be in memory at once (they may be on disk)
+        pLvlAll_hists = [this_type.pLvlTrue_hist for this_type in Economy.agents]
+        aLvlAll_hists = [this_type.aLvlNow_hist for this_type in Economy.agents]
+        cLvlAll_hists = [this_type.cLvlNow_hist for this_type in Economy.agents]
+        yLvlAll_hists = [this_type.yLvlNow_hist for this_type in Economy.agents]
+        T_hist = aLvlAll_hists[0].shape[0]
+        AlvlAgg_hist = np.zeros(T_hist) # Level of aggregate assets
+        ClvlAgg_hist = np.zeros(T_hist) # Level of aggregate consumption
+        YlvlAgg_hist = np.zeros(T_hist) # Level of aggregate income
+        for t, block in iterHistoryBlocks(aLvlAll_hists,hist_block_size):
+            AlvlAgg_hist[t:(t+block.shape[0])] = np.mean(block,axis=1)
+        for t, block in iterHistoryBlocks(cLvlAll_hists,hist_block_size):
+            ClvlAgg_hist[t:(t+block.shape[0])] = np.mean(block,axis=1)
+        for t, block in iterHistoryBlocks(yLvlAll_hists,hist_block_size):
+            YlvlAgg_hist[t:(t+block.shape[0])] = np.mean(block,axis=1)
         # PermShkAggHist needs to be shifted one period forward
         PlvlAgg_hist = np.cumprod(np.concatenate(([1.0],Economy.PermShkAggHist[:-1]),axis=0))
-        AlvlAgg_hist = np.mean(aLvlAll_hist,axis=1) # Level of aggregate assets
         AnrmAgg_hist = AlvlAgg_hist/PlvlAgg_hist # Normalized level of aggregate assets
-        ClvlAgg_hist = np.mean(cLvlAll_hist,axis=1) # Level of aggregate consumption
         CnrmAgg_hist = ClvlAgg_hist/PlvlAgg_hist # Normalized level of aggregate consumption
-        YlvlAgg_hist = np.mean(yLvlAll_hist,axis=1) # Level of aggregate income
         YnrmAgg_hist = YlvlAgg_hist/PlvlAgg_hist # Normalized level of aggregate income
 
-        if calc_micro_stats: # Only calculate stats if requested.  This is a memory hog with many simulated periods
+        if calc_micro_stats: # Only calculate stats if requested.  These only use a window of periods
             micro_stat_periods = int((Economy.agents[0].T_sim-ignore_periods)*0.1)
-            not_newborns = (np.concatenate([this_type.t_age_hist[(ignore_periods+1):(ignore_periods+micro_stat_periods),:] for this_type in Economy.agents],axis=1) > 1).flatten()
-            Logc = np.log(cLvlAll_hist[ignore_periods:(ignore_periods+micro_stat_periods),:])
+            t0 = ignore_periods
+            t1 = ignore_periods+micro_stat_periods
+            not_newborns = (getHistoryBlock([this_type.t_age_hist for this_type in Economy.agents],t0+1,t1) > 1).flatten()
+            Logc = np.log(getHistoryBlock(cLvlAll_hists,t0,t1))
             DeltaLogc = (Logc[1:] - Logc[0:-1]).flatten()
             DeltaLogc_trimmed = DeltaLogc[not_newborns]
-            Loga = np.log(aLvlAll_hist[ignore_periods:(ignore_periods+micro_stat_periods),:])
+            Loga = np.log(getHistoryBlock(aLvlAll_hists,t0,t1))
             DeltaLoga = (Loga[1:] - Loga[0:-1]).flatten()
             DeltaLoga_trimmed = DeltaLoga[not_newborns]
-            Logp = np.log(pLvlAll_hist[ignore_periods:(ignore_periods+micro_stat_periods),:])
+            Logp = np.log(getHistoryBlock(pLvlAll_hists,t0,t1))
             DeltaLogp = (Logp[1:] - Logp[0:-1]).flatten()
             DeltaLogp_trimmed = DeltaLogp[not_newborns]
-            Logy = np.log(yLvlAll_hist[ignore_periods:(ignore_periods+micro_stat_periods),:])
+            Logy = np.log(getHistoryBlock(yLvlAll_hists,t0,t1))
             Logy_trimmed = Logy
             Logy_trimmed[np.isinf(Logy)] = np.nan
-            birth_events = np.concatenate([this_type.t_age_hist == 1 for this_type in Economy.agents],axis=1)
-            vBirth = calcValueAtBirth(cLvlAll_hist[ignore_periods:,:],birth_events[ignore_periods:,:],PlvlAgg_hist[ignore_periods:],Economy.MrkvNow_hist[ignore_periods:],Economy.agents[0].DiscFac,Economy.agents[0].CRRA)
+            tAgeAll_hists = [this_type.t_age_hist[ignore_periods:] for this_type in Economy.agents]
+            vBirth = calcValueAtBirth([hist[ignore_periods:] for hist in cLvlAll_hists],tAgeAll_hists,PlvlAgg_hist[ignore_periods:],
+                                      Economy.MrkvNow_hist[ignore_periods:],Economy.agents[0].DiscFac,Economy.agents[0].CRRA,
+                                      birth_age=1,block_size=hist_block_size)
 
         BigTheta_hist = Economy.TranShkAggHist
         if hasattr(Economy,'MrkvNow'):
@@ -432,19 +442,23 @@ def runStickyEregressionsInStata(infile_name,interval_size,meas_err,sticky,all_s
     return panel_text
 
 
-def calcValueAtBirth(cLvlHist,BirthBool,PlvlHist,MrkvHist,DiscFac,CRRA):
+def calcValueAtBirth(cLvlHist,BirthBool,PlvlHist,MrkvHist,DiscFac,CRRA,birth_age=None,block_size=1000):
     '''
     Calculate expected value of being born in each Markov state using the realizations
     of consumption for a history of many consumers.  The histories should already be
-    trimmed of the "burn in" periods.
+    trimmed of the "burn in" periods.  They are read a block of periods at a time, so
+    they can be histories on disk (see HARK.history).
 
     Parameters
     ----------
-    cLvlHist : np.array
-        TxN array of consumption level history for many agents across many periods.
+    cLvlHist : np.array or [np.array]
+        TxN array of consumption level history for many agents across many periods,
+        or a list of such arrays (e.g. one for each type) to be put side by side.
         Agents who die are replaced by newborms.
-    BirthBool : np.array
-        TxN boolean array indicating when agents are born, replacing one who died.
+    BirthBool : np.array or [np.array]
+        TxN boolean array indicating when agents are born, replacing one who died,
+        or a list of such arrays matching cLvlHist.  If birth_age is not None, these
+        are instead histories of agents' ages (t_age).
     PlvlHist : np.array
         T length vector of aggregate permanent productivity levels.
     MrkvHist : np.array
@@ -453,6 +467,10 @@ def calcValueAtBirth(cLvlHist,BirthBool,PlvlHist,MrkvHist,DiscFac,CRRA):
         Intertemporal discount factor.
     CRRA : float
         Coefficient of relative risk aversion.
+    birth_age : int or None
+        If not None, agents are born when their age in BirthBool equals birth_age.
+    block_size : int
+        Number of periods of the histories to read into memory at once.
 
     Returns
     -------
@@ -461,39 +479,44 @@ def calcValueAtBirth(cLvlHist,BirthBool,PlvlHist,MrkvHist,DiscFac,CRRA):
     '''
     J = np.max(MrkvHist) + 1 # Number of Markov states
     T = MrkvHist.size        # Length of simulation
-    I = cLvlHist.shape[1]    # Number of agent indices in histories
     u = lambda c : CRRAutility(c,gam=CRRA)
 
-    # Initialize an array to hold each agent's lifetime utility
-    BirthsByPeriod = np.sum(BirthBool,axis=1)
-    BirthsByState = np.zeros(J,dtype=int)
-    for j in range(J):
-        these = MrkvHist == j
-        BirthsByState[j] = np.sum(BirthsByPeriod[these])
-    N = np.max(BirthsByState) # Array must hold this many agents per row at least
-    vArray = np.zeros((J,N)) + np.nan
-    n = np.zeros(J,dtype=int)
-
-    # Loop through each agent index
-    DiscVec = DiscFac**np.arange(T)
-    for i in range(I):
-        birth_t = np.where(BirthBool[:,i])[0]
-        # Loop through each agent who lived and died in this index
-        for k in range(birth_t.size-1): # Last birth event has no death, so ignore
-            # Get lifespan of this agent and circumstances at birth
-            t0 = birth_t[k]
-            t1 = birth_t[k+1]
-            span = t1-t0
-            j = MrkvHist[t0]
-            # Calculate discounted flow of utility for this agent and store it
-            cVec = cLvlHist[t0:t1,i]/PlvlHist[t0]
-            uVec = u(cVec)
-            v = np.dot(DiscVec[:span],uVec)
-            vArray[j,n[j]] = v
-            n[j] += 1
-
-    # Calculate expected value at birth by state and return it
-    vAtBirth = np.nanmean(vArray,axis=1)
+    # Track the agent currently living in each agent index: when and in which state
+    # they were born, and the discounted flow of utility they've had so far
+    born_t = None
+    vTotal = np.zeros(J)
+    vCount = np.zeros(J,dtype=int)
+
+    BirthBlocks = iterHistoryBlocks(BirthBool,block_size,t1=T)
+    for t_block, cLvlBlock in iterHistoryBlocks(cLvlHist,block_size,t1=T):
+        BirthBlock = next(BirthBlocks)[1]
+        if birth_age is not None:
+            BirthBlock = BirthBlock == birth_age
+        if born_t is None:
+            I = cLvlBlock.shape[1] # Number of agent indices in histories
+            born_t = np.zeros(I,dtype=int) - 1 # No agent has been born yet
+            born_j = np.zeros(I,dtype=int)
+            born_P = np.ones(I)
+            v = np.zeros(I)
+        for s in range(cLvlBlock.shape[0]):
+            t = t_block + s
+            # Agents who died are replaced: store the value of each agent who lived
+            # and died in this index, then start the newborn's
+            births = np.nonzero(BirthBlock[s])[0]
+            done = births[born_t[births] >= 0]
+            vTotal += np.bincount(born_j[done],weights=v[done],minlength=J)
+            vCount += np.bincount(born_j[done],minlength=J)
+            born_t[births] = t
+            born_j[births] = MrkvHist[t]
+            born_P[births] = PlvlHist[t]
+            v[births] = 0.0
+            # Add this period's discounted utility for each agent who is alive
+            alive = np.nonzero(born_t >= 0)[0]
+            v[alive] += DiscFac**(t - born_t[alive])*u(cLvlBlock[s,alive]/born_P[alive])
+
+    # Calculate expected value at birth by state and return it (the last agent born
+    # in each index has no death, so is ignored)
+    vAtBirth = vTotal/vCount
     return vAtBirth
 
 
@@ -9,11 +9,15 @@ problem by finding a general equilibrium dynamic rule.
 
 from utilities import getArgNames, NullFunc
 from copy import copy, deepcopy
+import os
+import zlib
 import numpy as np
 from time import clock
-from parallel import multiThreadCommands
+from parallel import multiThreadCommands, AgentPool, runCommands, makeSharedArray, releaseSharedArray
+import multiprocessing
+from history import HistoryRecorder, makeDiskArray
 
-def distanceMetric(thing_A,thing_B):
+def distanceMetric(thing_A,thing_B,tol=None):
     '''
     A "universal distance" metric that can be used as a default in many settings.
 
@@ -23,6 +27,11 @@ def distanceMetric(thing_A,thing_B):
         A generic object.
     thing_B : object
         Another generic object.
+    tol : float or None
+        If not None, the comparison stops as soon as any component of thing_A
+        and thing_B is found to be more than tol apart.  The returned distance
+        is then only a lower bound on the full distance, but is still greater
+        than tol; this is all that convergence checks need to know.
 
     Returns:
     ------------
@@ -37,10 +46,11 @@ def distanceMetric(thing_A,thing_B):
         lenA = len(thing_A) # If both inputs are lists, then the distance between
         lenB = len(thing_B) # them is the maximum distance between corresponding
         if lenA == lenB:    # elements in the lists.  If they differ in length,
-            distance_temp = [] # the distance is the difference in lengths.
+            distance = 0.0  # the distance is the difference in lengths.
             for n in range(lenA):
-                distance_temp.append(distanceMetric(thing_A[n],thing_B[n]))
-            distance = max(distance_temp)
+                distance = max(distance,distanceMetric(thing_A[n],thing_B[n],tol))
+                if tol is not None and distance > tol:
+                    break
         else:
             distance = float(abs(lenA - lenB))
     # If both inputs are numbers, return their difference
@@ -51,14 +61,19 @@ def distanceMetric(thing_A,thing_B):
     # if shapes do not align.
     elif hasattr(thing_A,'shape') and hasattr(thing_B,'shape'):
         if thing_A.shape == thing_B.shape:
-            distance = np.max(abs(thing_A - thing_B))
+            if thing_A is thing_B:
+                distance = 0.0
+            else:
+                distance = np.max(np.abs(thing_A - thing_B))
         else:
             distance = np.max(abs(thing_A.shape - thing_B.shape))
     # If none of the above cases, but the objects are of the same class, call
     # the distance method of one on the other
-    elif thing_A.__class__.__name__ == thing_B.__class__.__name__:
+    elif typeA is typeB or thing_A.__class__.__name__ == thing_B.__class__.__name__:
         if thing_A.__class__.__name__ == 'function':
             distance = 0.0
+        elif tol is not None and isinstance(thing_A,HARKobject):
+            distance = thing_A.distance(thing_B,tol)
         else:
             distance = thing_A.distance(thing_B)
     else: # Failsafe: the inputs are very far apart
@@ -70,7 +85,7 @@ class HARKobject(object):
     A superclass for object classes in HARK.  Comes with two useful methods:
     a generic/universal distance method and an attribute assignment method.
     '''
-    def distance(self,other):
+    def distance(self,other,tol=None):
         '''
         A generic distance method, which requires the existence of an attribute
         called distance_criteria, giving a list of strings naming the attributes
@@ -80,6 +95,9 @@ class HARKobject(object):
         ----------
         other : object
             Another object to compare this instance to.
+        tol : float or None
+            If not None, stop comparing attributes as soon as one of them is more
+            than tol apart (see distanceMetric).
 
         Returns
         -------
@@ -87,15 +105,17 @@ class HARKobject(object):
             The distance between this object and another, using the "universal
             distance" metric.
         '''
-        distance_list = [0.0]
+        distance = 0.0
         for attr_name in self.distance_criteria:
             try:
                 obj_A = getattr(self,attr_name)
                 obj_B = getattr(other,attr_name)
-                distance_list.append(distanceMetric(obj_A,obj_B))
+                distance = max(distance,distanceMetric(obj_A,obj_B,tol))
             except:
-                distance_list.append(1000.0) # if either object lacks attribute, they are not the same
-        return max(distance_list)
+                distance = max(distance,1000.0) # if either object lacks attribute, they are not the same
+            if tol is not None and distance > tol:
+                break
+        return distance
 
     def assignParameters(self,**kwds):
         '''
@@ -213,6 +233,16 @@ class AgentType(HARKobject):
         self.track_vars         = []
         self.poststate_vars     = []
         self.read_shocks        = False
+        self.shared_memory      = False
+        self.hist_float_type    = None
+        self.hist_period_step   = 1
+        self.hist_agents        = None
+        self.track_stats        = {}
+        self.warm_start         = False
+        self.warm_start_cache   = []
+        self.warm_start_cache_size = 5
+        self.warm_start_criteria = []
+        self.solution_cache     = None
         self.assignParameters(**kwds)
         self.resetRNG()
 
@@ -348,29 +378,220 @@ class AgentType(HARKobject):
             if param in self.time_inv:
                 self.time_inv.remove(param)
 
-    def solve(self,verbose=False):
+    def solve(self,verbose=False,solution_init=None):
         '''
         Solve the model for this instance of an agent type by backward induction.
         Loops through the sequence of one period problems, passing the solution
         from period t+1 to the problem for period t.
 
+        An infinite horizon (cycles=0) model can be "warm started" from a solution
+        to nearby parameters, so that only a few cycles are needed to converge.
+        If warm_start is True, the solutions of previous calls are remembered in
+        warm_start_cache (up to warm_start_cache_size of them), and the one whose
+        solver inputs are closest to the current ones is used automatically.
+        Because a warm started solution can converge on its distance_criteria
+        before its other parts have, attributes of the solution named in
+        warm_start_criteria must converge as well whenever warm_start is True or
+        solution_init is given, whether or not a warm start is found, so that
+        the solution does not depend on the contents of the cache.
+
+        If solution_cache is a SolutionCache (see HARK.solutioncache), the
+        solution is looked up there by a hash of all of the solver's inputs, and
+        backward induction is skipped if it is found; otherwise the new solution
+        is stored there.
+
         Parameters
         ----------
         verbose : boolean
             If True, solution progress is printed to screen.
+        solution_init : Solution or None
+            For infinite horizon models, a solution to the first period of the
+            cycle to iterate from instead of solution_terminal.  If None, one is
+            taken from warm_start_cache when warm_start is True.  Ignored when
+            cycles > 0, and when the solution is loaded from solution_cache.
 
         Returns
         -------
         none
         '''
 
+        solution, solution_init, solve_info = self.startSolve(solution_init)
+        if solution is None:
+            solution = solveAgent(self,verbose,solution_init) # Solve the model by backward induction
+        self.finishSolve(solution,solve_info)
+
+    def startSolve(self,solution_init=None):
+        '''
+        Does the steps of solve that come before backward induction: preSolve,
+        looking up the solution in solution_cache, and (if warm_start is True)
+        finding a warm start in warm_start_cache.  Functions that solve several
+        AgentTypes together should call this and finishSolve for each of them.
+
+        Parameters
+        ----------
+        solution_init : Solution or None
+            A solution to start an infinite horizon model from; see solve.
+
+        Returns
+        -------
+        solution : [Solution] or None
+            The solution loaded from solution_cache (in reverse chronological
+            order), or None if it must be found by backward induction.
+        solution_init : Solution or None
+            Solution to start backward induction from instead of solution_terminal.
+        solve_info : dict
+            Information needed by finishSolve.
+        '''
         self.preSolve() # Do pre-solution stuff
-        self.solution = solveAgent(self,verbose) # Solve the model by backward induction
+        solution = None
+        cache_key = None
+        if self.solution_cache is not None:
+            cache_key = self.solution_cache.makeKey(self)
+            if cache_key is not None:
+                solution = self.solution_cache.load(cache_key)
+        solver_inputs = None
+        if self.cycles == 0 and self.warm_start:
+            solver_inputs = self.getSolverInputs()
+            if solution_init is None and solution is None:
+                solution_init = self.findWarmStart(solver_inputs)
+        if self.cycles != 0:
+            solution_init = None
+        solve_info = {'cache_key' : cache_key,
+                      'solver_inputs' : solver_inputs,
+                      'loaded' : solution is not None}
+        return solution, solution_init, solve_info
+
+    def finishSolve(self,solution,solve_info):
+        '''
+        Does the steps of solve that come after backward induction: storing the
+        solution in solution_cache and warm_start_cache, putting it in the
+        attribute solution (in the order of time_flow), and postSolve.
+
+        Parameters
+        ----------
+        solution : [Solution]
+            The solution, in reverse chronological order.
+        solve_info : dict
+            Information made by startSolve.
+
+        Returns
+        -------
+        none
+        '''
+        if not solve_info['loaded'] and solve_info['cache_key'] is not None:
+            self.solution_cache.store(solve_info['cache_key'],solution)
+        self.solution = solution
         if self.time_flow: # Put the solution in chronological order if this instance's time flow runs that way
             self.solution.reverse()
         self.addToTimeVary('solution') # Add solution to the list of time-varying attributes
+        if solve_info['solver_inputs'] is not None:
+            self.addWarmStart(solve_info['solver_inputs'],self.solution[0] if self.time_flow else self.solution[-1])
         self.postSolve() # Do post-solution stuff
 
+    def getSolverInputs(self):
+        '''
+        Describes the inputs to this instance's one period solver(s), i.e. every
+        attribute named in time_vary and time_inv except the solution itself.
+        Numeric values are collected into one vector; everything else (names,
+        shapes, solver functions, other objects) goes into a structure, which
+        must be identical for two sets of inputs to be comparable.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        structure : tuple
+            Description of the non-numeric parts of the inputs.
+        values : np.array
+            All numeric values in the inputs, in a fixed order.
+        '''
+        structure = [self.time_flow]
+        values = []
+        for name in self.time_vary + self.time_inv:
+            if name == 'solution':
+                continue
+            structure.append(name)
+            flattenSolverInput(getattr(self,name),structure,values)
+        values = np.concatenate(values) if len(values) > 0 else np.zeros(0)
+        return tuple(structure), values
+
+    def findWarmStart(self,solver_inputs):
+        '''
+        Finds the solution in warm_start_cache whose solver inputs have the same
+        structure as the given ones and the closest values (by the largest
+        difference relative to 1 + the size of each value).
+
+        Parameters
+        ----------
+        solver_inputs : (tuple,np.array)
+            Output of getSolverInputs.
+
+        Returns
+        -------
+        solution_init : Solution or None
+            The closest cached solution to the first period of the cycle, or None
+            if no cached solution has matching structure.
+        '''
+        structure, values = solver_inputs
+        solution_init = None
+        best_distance = np.inf
+        for cached_structure, cached_values, cached_solution in self.warm_start_cache:
+            if cached_structure != structure:
+                continue
+            if values.size > 0:
+                distance = np.max(np.abs(cached_values - values)/(1.0 + np.abs(values)))
+            else:
+                distance = 0.0
+            if distance < best_distance:
+                best_distance = distance
+                solution_init = cached_solution
+        return solution_init
+
+    def addWarmStart(self,solver_inputs,solution):
+        '''
+        Puts a solution to the first period of the cycle at the front of
+        warm_start_cache, replacing any entry with the very same solver inputs
+        and dropping the oldest entries beyond warm_start_cache_size.
+
+        Parameters
+        ----------
+        solver_inputs : (tuple,np.array)
+            Output of getSolverInputs for the parameters that were solved.
+        solution : Solution
+            The solution to the first period of the cycle.
+
+        Returns
+        -------
+        none
+        '''
+        structure, values = solver_inputs
+        cache = [entry for entry in self.warm_start_cache if not
+                 (entry[0] == structure and np.array_equal(entry[1],values))]
+        self.warm_start_cache = [(structure,values,solution)] + cache[:(self.warm_start_cache_size-1)]
+
+    def updateSolverPlan(self):
+        '''
+        Makes sure that this instance has an up-to-date SolverPlan in the attribute
+        solver_plan, rebuilding it if time_vary, time_inv, the flow of time, or any
+        named parameter has changed since it was made.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        solver_plan : SolverPlan
+            The resolved inputs to the one period solver(s) for each period of a cycle.
+        '''
+        plan = getattr(self,'solver_plan',None)
+        if plan is None or not plan.isValidFor(self):
+            plan = SolverPlan(self)
+            self.solver_plan = plan
+        return plan
+
     def resetRNG(self):
         '''
         Reset the random number generator for this type.
@@ -384,6 +605,35 @@ class AgentType(HARKobject):
         none
         '''
         self.RNG = np.random.RandomState(self.seed)
+        self.RNG_streams = {}
+
+    def getRNGstream(self,name):
+        '''
+        Returns this type's random number generator for the named stream of
+        draws, making it the first time it's asked for after resetRNG.  Each
+        stream is seeded from self.seed and its name, so its draws are repro-
+        ducible and don't depend on how many draws were taken from self.RNG or
+        from other streams.  Generators that have already been made can be passed
+        as the seed of the functions in HARK.simulation, avoiding the cost of
+        seeding a new one on every call.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stream, such as 'IncShk' or 'Mortality'.
+
+        Returns
+        -------
+        RNG : np.random.RandomState
+            The random number generator for this stream.
+        '''
+        streams = getattr(self,'RNG_streams',None)
+        if streams is None:
+            streams = {}
+            self.RNG_streams = streams
+        if name not in streams:
+            streams[name] = np.random.RandomState([self.seed,zlib.crc32(name) & 0xffffffff])
+        return streams[name]
 
     def checkElementsOfTimeVaryAreLists(self):
         """
@@ -501,16 +751,17 @@ class AgentType(HARKobject):
         self.timeFwd()
         self.initializeSim()
 
-        # Make blank history arrays for each shock variable
-        for var_name in self.shock_vars:
-            setattr(self,var_name+'_hist',np.zeros((self.T_sim,self.AgentCount))+np.nan)
+        # Make blank history arrays for each shock variable (always complete and full precision)
+        shock_recorder = HistoryRecorder(self.shock_vars,self.T_sim,self.AgentCount,
+                                         shared_memory=getattr(self,'shared_memory',False),
+                                         tag=self.getSharedMemoryTag())
+        shock_recorder.makeHistories(self)
 
         # Make and store the history of shocks for each period
         for t in range(self.T_sim):
             self.getMortality()
             self.getShocks()
-            for var_name in self.shock_vars:
-                exec('self.' + var_name + '_hist[self.t_sim,:] = self.' + var_name)
+            shock_recorder.record(self,self.t_sim)
             self.t_sim += 1
             self.t_age = self.t_age + 1 # Age all consumers by one period
             self.t_cycle = self.t_cycle + 1 # Age all consumers within their cycle
@@ -662,7 +913,8 @@ class AgentType(HARKobject):
     def simulate(self,sim_periods=None):
         '''
         Simulates this agent type for a given number of periods (defaults to self.T_sim if no input).
-        Records histories of attributes named in self.track_vars in attributes named varname_hist.
+        Records histories of attributes named in self.track_vars in attributes named varname_hist,
+        and updates the streaming statistics in self.track_stats.
 
         Parameters
         ----------
@@ -679,16 +931,160 @@ class AgentType(HARKobject):
 
         for t in range(sim_periods):
             self.simOnePeriod()
-            for var_name in self.track_vars:
-                exec('self.' + var_name + '_hist[self.t_sim,:] = self.' + var_name)
+            self.history_recorder.record(self,self.t_sim)
             self.t_sim += 1
 
         if not orig_time:
             self.timeRev()
 
+    def simulateSharded(self,shard_count,num_jobs=None,sim_periods=None):
+        '''
+        Simulates this agent type from the start (like initializeSim followed by
+        simulate), splitting its AgentCount agents into shard_count shards that
+        are simulated in parallel processes.  Each shard is a shallow copy of this
+        instance, sharing its solution, with a contiguous block of the agents and
+        its own seed made from self.seed and the shard's number.  Results are thus
+        reproducible for a given seed and shard_count, whatever num_jobs is, but
+        differ from those of an unsharded simulation.
+
+        Afterwards the histories of the variables in track_vars, the final values
+        of the simulated variables (poststate_vars, shock_vars, track_vars, t_age
+        and t_cycle) and t_sim are set on this instance as if it had simulated
+        every agent itself, and each statistic in track_stats is the merge of the
+        shards' statistics (by period percentiles of a QuantileSketch can't be
+        merged exactly and are NaN).  If read_shocks is True, each shard reads its
+        agents' columns of the shock histories.
+
+        Parameters
+        ----------
+        shard_count : int
+            Number of shards to split the agents into.
+        num_jobs : int or None
+            Number of worker processes; defaults to the smaller of shard_count and
+            the number of available cores.  With one job, the shards are simulated
+            one after another in this process.
+        sim_periods : int or None
+            Number of periods to simulate; defaults to self.T_sim.
+
+        Returns
+        -------
+        None
+        '''
+        if sim_periods is None:
+            sim_periods = self.T_sim
+        shard_count = max(min(int(shard_count),self.AgentCount),1)
+        bounds = (np.arange(shard_count+1)*self.AgentCount)//shard_count
+        recorder = self.makeHistoryRecorder()
+        agent_idx = recorder.agent_idx
+        track_stats = getattr(self,'track_stats',{})
+        SeedRNG = np.random.RandomState(self.seed)
+
+        # Make the shards, each with its own agents, seed, statistics and shocks
+        shards = []
+        hist_cols = []
+        for k in range(shard_count):
+            bot, top = bounds[k], bounds[k+1]
+            shard = copy(self)
+            shard.AgentCount = top - bot
+            shard.seed = SeedRNG.randint(0,2**31-1)
+            shard.track_stats = dict((name,[deepcopy(stat) for stat in stat_list])
+                                     for name, stat_list in track_stats.items())
+            if agent_idx is None:
+                shard.hist_agents = None
+            else:
+                these = np.logical_and(agent_idx >= bot,agent_idx < top)
+                shard.hist_agents = agent_idx[these] - bot
+                hist_cols.append(np.nonzero(these)[0])
+            if self.read_shocks:
+                for var_name in self.shock_vars:
+                    setattr(shard,var_name + '_hist',getattr(self,var_name + '_hist')[:,bot:top])
+            shards.append(shard)
+
+        # Simulate the shards, in worker processes if there's more than one job
+        var_names = []
+        for var_name in self.poststate_vars + self.shock_vars + self.track_vars + ['t_age','t_cycle']:
+            if var_name not in var_names:
+                var_names.append(var_name)
+        receive_vars = var_names + recorder.hist_names + ['track_stats','t_sim']
+        commands = ['initializeSim()','simulate(' + str(sim_periods) + ')']
+        if num_jobs is None:
+            num_jobs = min(shard_count,multiprocessing.cpu_count())
+        if num_jobs <= 1 or shard_count == 1:
+            for shard in shards:
+                runCommands(shard,commands)
+        else:
+            # Histories are made in shared memory so that they aren't pickled
+            tag = self.getSharedMemoryTag() or str(os.getpid())
+            for shard in shards:
+                shard.shared_memory = True
+                shard.shared_memory_tag = tag
+                shard.hist_disk_dir = None
+            pool = AgentPool(shards,num_jobs=num_jobs,local_vars=[])
+            try:
+                pool.run(commands,receive_vars=receive_vars)
+            finally:
+                pool.close()
+
+        # Put the shards' agents back together in order
+        for var_name in var_names:
+            values = [getattr(shard,var_name,None) for shard in shards]
+            if all(np.ndim(value) > 0 and np.shape(value)[0] == shard.AgentCount
+                   for value, shard in zip(values,shards)):
+                setattr(self,var_name,np.concatenate(values))
+        if agent_idx is None:
+            hist_cols = [slice(bounds[k],bounds[k+1]) for k in range(shard_count)]
+        old_recorder = getattr(self,'history_recorder',None)
+        if old_recorder is not None:
+            old_recorder.releaseHistories(self)
+        for hist_name in recorder.hist_names:
+            histories = [getattr(shard,hist_name) for shard in shards]
+            shape = (recorder.T_hist,recorder.N_hist)
+            if recorder.disk_dir is not None:
+                history = makeDiskArray(shape,histories[0].dtype,recorder.disk_dir,hist_name[:-5])
+            elif recorder.shared_memory:
+                history = makeSharedArray(shape,dtype=histories[0].dtype,tag=recorder.tag)
+            else:
+                history = np.empty(shape,dtype=histories[0].dtype)
+            for cols, shard_history in zip(hist_cols,histories):
+                history[:,cols] = shard_history
+                if not releaseSharedArray(shard_history) and isinstance(shard_history,np.memmap):
+                    os.remove(shard_history.filename)
+            setattr(self,hist_name,history)
+        for name, stat_list in track_stats.items():
+            for j, stat in enumerate(stat_list):
+                stat.__dict__.update(deepcopy(shards[0].track_stats[name][j].__dict__))
+                for shard in shards[1:]:
+                    stat.merge(shard.track_stats[name][j])
+        self.t_sim = shards[0].t_sim
+        self.history_recorder = recorder
+
     def clearHistory(self):
         '''
-        Clears the histories of the attributes named in self.track_vars.
+        Clears the histories of the attributes named in self.track_vars, making a
+        new HistoryRecorder (in self.history_recorder) with blank history arrays.
+        How the histories are stored is controlled by these attributes of self:
+
+        hist_float_type : type or None
+            Type used to store floating point variables, e.g. np.float32; None
+            means np.float64.  Boolean and integer variables keep their own type.
+        hist_period_step : int
+            Record only every hist_period_step-th period (row j of each history
+            is period j*hist_period_step).
+        hist_agents : int, np.array or None
+            Record only some agents: either a number of agents to be chosen at
+            random (reproducibly, using self.seed) or an array of their indices.
+            The indices used are stored in self.hist_agent_idx.
+        shared_memory : boolean
+            Make the history arrays in shared memory; see HARK.parallel.
+        hist_disk_dir : string or None
+            Directory in which to make the history arrays as memory-mapped files
+            rather than in memory; see HARK.history.iterHistoryBlocks for reading
+            them a block of periods at a time.
+        track_stats : {string : [StreamingStat]}
+            Streaming statistics (see HARK.history) of variables to be computed
+            as the simulation runs, keyed by variable name.  These are reset here.
+            A variable can have statistics without being in track_vars, in which
+            case its history is not stored at all.
 
         Parameters
         ----------
@@ -698,11 +1094,67 @@ class AgentType(HARKobject):
         -------
         None
         '''
-        for var_name in self.track_vars:
-            exec('self.' + var_name + '_hist = np.zeros((self.T_sim,self.AgentCount)) + np.nan')
+        old_recorder = getattr(self,'history_recorder',None)
+        if old_recorder is not None: # don't leave the old histories' files in shared memory
+            old_recorder.releaseHistories(self)
+        self.history_recorder = self.makeHistoryRecorder()
+        self.history_recorder.makeHistories(self)
+
+    def makeHistoryRecorder(self):
+        '''
+        Makes a HistoryRecorder for the variables in self.track_vars, set up as
+        described in clearHistory, and stores the indices of the recorded agents
+        in self.hist_agent_idx.  Does not make the history arrays themselves.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        recorder : HistoryRecorder
+            A new history recorder for this instance.
+        '''
+        hist_agents = getattr(self,'hist_agents',None)
+        if hist_agents is None:
+            agent_idx = None
+        elif np.ndim(hist_agents) == 0:
+            RNG = np.random.RandomState(self.seed)
+            agent_idx = np.sort(RNG.permutation(self.AgentCount)[:int(hist_agents)])
+        else:
+            agent_idx = np.asarray(hist_agents,dtype=int)
+        self.hist_agent_idx = agent_idx
+        return HistoryRecorder(self.track_vars,self.T_sim,self.AgentCount,
+                               period_step=getattr(self,'hist_period_step',1),
+                               agent_idx=agent_idx,
+                               float_type=getattr(self,'hist_float_type',None),
+                               shared_memory=getattr(self,'shared_memory',False),
+                               tag=self.getSharedMemoryTag(),
+                               stats=getattr(self,'track_stats',{}),
+                               disk_dir=getattr(self,'hist_disk_dir',None))
+
+    def getSharedMemoryTag(self):
+        '''
+        Returns the label used for this instance's shared memory files (only if
+        self.shared_memory is True), set to the current process ID on first use.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        tag : string or None
+            Label for shared memory files made by HARK.parallel.makeSharedArray.
+        '''
+        if not getattr(self,'shared_memory',False):
+            return None
+        if not hasattr(self,'shared_memory_tag'):
+            self.shared_memory_tag = str(os.getpid())
+        return self.shared_memory_tag
 
 
-def solveAgent(agent,verbose):
+def solveAgent(agent,verbose,solution_init=None):
     '''
     Solve the dynamic model for one agent type.  This function iterates on "cycles"
     of an agent's model either a given number of times or until solution convergence
@@ -714,6 +1166,11 @@ def solveAgent(agent,verbose):
         The microeconomic AgentType whose dynamic problem is to be solved.
     verbose : boolean
         If True, solution progress is printed to screen (when cycles != 1).
+    solution_init : Solution or None
+        Solution to start the first cycle from instead of agent.solution_terminal,
+        e.g. the solution to a nearby infinite horizon problem.  If given (or if
+        agent.warm_start is True), the attributes of the solution named in
+        agent.warm_start_criteria must also converge in an infinite horizon model.
 
     Returns
     -------
@@ -734,28 +1191,30 @@ def solveAgent(agent,verbose):
     if not agent.pseudo_terminal:
         solution.append(deepcopy(agent.solution_terminal))
 
+    # Resolve the inputs to the one period solver(s) once for all cycles
+    plan = agent.updateSolverPlan()
+
     # Initialize the process, then loop over cycles
-    solution_last    = agent.solution_terminal
+    solution_last    = agent.solution_terminal if solution_init is None else solution_init
     go               = True
     completed_cycles = 0
     max_cycles       = 5000 # escape clause
+    check_all        = infinite_horizon and (solution_init is not None or agent.warm_start)
+    criteria_last    = {}
     if verbose:
         t_last = clock()
     while go:
         # Solve a cycle of the model, recording it if horizon is finite
-        solution_cycle = solveOneCycle(agent,solution_last)
+        solution_cycle = solveOneCycle(agent,solution_last,plan)
         if not infinite_horizon:
             solution += solution_cycle
 
         # Check for termination: identical solutions across cycle iterations or run out of cycles
         solution_now = solution_cycle[-1]
         if infinite_horizon:
-            if completed_cycles > 0:
-                solution_distance = solution_now.distance(solution_last)
-                go = (solution_distance > agent.tolerance and completed_cycles < max_cycles)
-            else: # Assume solution does not converge after only one cycle
-                solution_distance = 100.0
-                go = True
+            solution_distance = calcCycleDistance(agent,solution_now,solution_last,completed_cycles,
+                                                  check_all,criteria_last,verbose)
+            go = (solution_distance > agent.tolerance and completed_cycles < max_cycles)
         else:
             cycles_left += -1
             go = cycles_left > 0
@@ -785,11 +1244,62 @@ def solveAgent(agent,verbose):
     return solution
 
 
-def solveOneCycle(agent,solution_last):
+def calcCycleDistance(agent,solution_now,solution_last,completed_cycles,check_all,criteria_last,verbose=False):
+    '''
+    Measures how far an infinite horizon solution still is from convergence
+    after a cycle of backward induction, as used by solveAgent.
+
+    Parameters
+    ----------
+    agent : AgentType
+        The microeconomic AgentType being solved.
+    solution_now : Solution
+        Solution to the first period of the cycle just solved.
+    solution_last : Solution
+        Solution to the first period of the previous cycle (or the solution
+        that the first cycle started from).
+    completed_cycles : int
+        Number of cycles completed before the one just solved.
+    check_all : boolean
+        Whether the attributes named in agent.warm_start_criteria must converge
+        as well as the solution's distance_criteria.
+    criteria_last : dict
+        Last step of each of the warm_start_criteria, updated in place; should
+        start empty.
+    verbose : boolean
+        If True, the exact distance is found rather than stopping once it is
+        known to exceed agent.tolerance.
+
+    Returns
+    -------
+    solution_distance : float
+        Distance from convergence; iterating should stop once it is at most
+        agent.tolerance.
+    '''
+    if completed_cycles == 0: # Assume solution does not converge after only one cycle
+        return 100.0
+    solution_distance = distanceMetric(solution_now,solution_last,None if verbose else agent.tolerance)
+    if check_all: # recursive parts of the solution that distance_criteria miss
+        for name in agent.warm_start_criteria:
+            criteria_distance = distanceMetric(getattr(solution_now,name),getattr(solution_last,name))
+            # These converge geometrically, maybe slowly: bound the remaining error,
+            # not just the last step, using the rate of convergence so far
+            step_last = criteria_last.get(name,np.inf)
+            if criteria_distance < step_last:
+                rate = criteria_distance/step_last
+                criteria_error = criteria_distance*max(1.0,rate/(1.0-rate))
+            else:
+                criteria_error = np.inf if completed_cycles < 2 else criteria_distance
+            criteria_last[name] = criteria_distance
+            solution_distance = max(solution_distance,criteria_error)
+    return solution_distance
+
+
+def solveOneCycle(agent,solution_last,plan=None):
     '''
     Solve one "cycle" of the dynamic model for one agent type.  This function
-    iterates over the periods within an agent's cycle, updating the time-varying
-    parameters and passing them to the single period solver(s).
+    iterates over the periods within an agent's cycle, passing the time-varying
+    parameters to the single period solver(s) as resolved by a SolverPlan.
 
     Parameters
     ----------
@@ -800,6 +1310,10 @@ def solveOneCycle(agent,solution_last):
         end of the sequence of one period problems.  This might be the term-
         inal period solution, a "pseudo terminal" solution, or simply the
         solution to the earliest period from the succeeding cycle.
+    plan : SolverPlan
+        Resolved inputs to the single period solver(s) for each period in the
+        cycle.  If None, the agent's current plan is used (and rebuilt if it is
+        out of date).
 
     Returns
     -------
@@ -807,48 +1321,18 @@ def solveOneCycle(agent,solution_last):
         A list of one period solutions for one "cycle" of the AgentType's
         microeconomic model.  Returns in reverse chronological order.
     '''
-    # Calculate number of periods per cycle, defaults to 1 if all variables are time invariant
-    if len(agent.time_vary) > 0:
-        name = agent.time_vary[0]
-        T    = len(eval('agent.' + name))
-    else:
-        T = 1
-
-    # Check whether the same solution method is used in all periods
-    always_same_solver = 'solveOnePeriod' not in agent.time_vary
-    if always_same_solver:
-        solveOnePeriod = agent.solveOnePeriod
-        these_args     = getArgNames(solveOnePeriod)
-
-    # Construct a dictionary to be passed to the solver
-    time_inv_string = ''
-    for name in agent.time_inv:
-        time_inv_string += ' \'' + name + '\' : agent.' +name + ','
-    time_vary_string = ''
-    for name in agent.time_vary:
-        time_vary_string += ' \'' + name + '\' : None,'
-    solve_dict = eval('{' + time_inv_string + time_vary_string + '}')
+    if plan is None:
+        plan = agent.updateSolverPlan()
 
     # Initialize the solution for this cycle, then iterate on periods
     solution_cycle = []
     solution_next  = solution_last
-    for t in range(T):
-        # Update which single period solver to use (if it depends on time)
-        if not always_same_solver:
-            solveOnePeriod = agent.solveOnePeriod[t]
-            these_args = getArgNames(solveOnePeriod)
-
-        # Update time-varying single period inputs
-        for name in agent.time_vary:
-            if name in these_args:
-                solve_dict[name] = eval('agent.' + name + '[t]')
-        solve_dict['solution_next'] = solution_next
-
-        # Make a temporary dictionary for this period
-        temp_dict = {name: solve_dict[name] for name in these_args}
-
+    for solveOnePeriod, period_args, uses_next in plan.periods:
         # Solve one period, add it to the solution, and move to the next period
-        solution_t = solveOnePeriod(**temp_dict)
+        if uses_next:
+            solution_t = solveOnePeriod(solution_next=solution_next,**period_args)
+        else:
+            solution_t = solveOnePeriod(**period_args)
         solution_cycle.append(solution_t)
         solution_next = solution_t
 
@@ -856,6 +1340,148 @@ def solveOneCycle(agent,solution_last):
     return solution_cycle
 
 
+class SolverPlan(HARKobject):
+    '''
+    A precompiled "plan" for solving one cycle of an AgentType's model.  Holds
+    the single period solver and the dictionary of its (non-solution) inputs for
+    each period of the cycle, so that solveOneCycle does not need to look up
+    parameters by name on every cycle.  The plan records the identity of every
+    input it was built from, and can check whether it is still valid for an agent.
+    '''
+    def __init__(self,agent):
+        '''
+        Make a new solver plan from the current attributes of an AgentType.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The microeconomic AgentType whose one period problems will be solved.
+
+        Returns
+        -------
+        None
+        '''
+        self.key = SolverPlan.makeKey(agent)
+
+        # Calculate number of periods per cycle, defaults to 1 if all variables are time invariant
+        if len(agent.time_vary) > 0:
+            T = len(getattr(agent,agent.time_vary[0]))
+        else:
+            T = 1
+
+        # Check whether the same solution method is used in all periods
+        always_same_solver = 'solveOnePeriod' not in agent.time_vary
+        if always_same_solver:
+            solveOnePeriod = agent.solveOnePeriod
+            these_args     = getArgNames(solveOnePeriod)
+
+        # Resolve the solver inputs for each period of the cycle
+        self.periods = []
+        for t in range(T):
+            if not always_same_solver:
+                solveOnePeriod = agent.solveOnePeriod[t]
+                these_args     = getArgNames(solveOnePeriod)
+            period_args = {}
+            for name in these_args:
+                if name == 'solution_next':
+                    continue
+                if name in agent.time_vary:
+                    period_args[name] = getattr(agent,name)[t]
+                elif name in agent.time_inv:
+                    period_args[name] = getattr(agent,name)
+                else:
+                    raise KeyError(name)
+            self.periods.append((solveOnePeriod,period_args,'solution_next' in these_args))
+        self.T = T
+
+    @staticmethod
+    def makeKey(agent):
+        '''
+        Makes a key describing the solver inputs of an AgentType: the names in
+        time_vary and time_inv, the direction of time, and the identity of each
+        named object (and of each element of time-varying lists).
+
+        Parameters
+        ----------
+        agent : AgentType
+            The microeconomic AgentType to be described.
+
+        Returns
+        -------
+        key : tuple
+            A hashable description of the solver inputs.
+        '''
+        vary_ids = []
+        for name in agent.time_vary:
+            thing = getattr(agent,name)
+            vary_ids.append((id(thing),tuple(id(x) for x in thing)))
+        inv_ids = tuple(id(getattr(agent,name)) for name in agent.time_inv)
+        return (tuple(agent.time_vary),tuple(agent.time_inv),agent.time_flow,
+                tuple(vary_ids),inv_ids)
+
+    def isValidFor(self,agent):
+        '''
+        Checks whether this plan still describes the solver inputs of an AgentType.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The microeconomic AgentType to be checked.
+
+        Returns
+        -------
+        valid : boolean
+            True if no parameter named in time_vary or time_inv has been changed
+            or replaced since the plan was made.
+        '''
+        try:
+            return SolverPlan.makeKey(agent) == self.key
+        except (AttributeError,TypeError):
+            return False
+
+
+def flattenSolverInput(thing,structure,values):
+    '''
+    Splits an input to a one period solver into its numeric values and a
+    description of everything else, recursing into lists, tuples, non-numeric
+    arrays, and the distance_criteria of HARKobjects.  Used to compare solver
+    inputs across parameter values.
+
+    Parameters
+    ----------
+    thing : object
+        The input to be described.
+    structure : list
+        Description of non-numeric parts so far; appended to in place.
+    values : [np.array]
+        Numeric values so far; appended to in place.
+
+    Returns
+    -------
+    none
+    '''
+    if isinstance(thing,(bool,int,long,float,np.number)):
+        structure.append(float)
+        values.append(np.array([thing],dtype=float))
+    elif isinstance(thing,np.ndarray):
+        structure.append(('array',thing.shape))
+        if thing.dtype.kind in 'biuf':
+            values.append(thing.astype(float).flatten())
+        else:
+            for x in thing.flat:
+                flattenSolverInput(x,structure,values)
+    elif isinstance(thing,(list,tuple)):
+        structure.append(('list',len(thing)))
+        for x in thing:
+            flattenSolverInput(x,structure,values)
+    elif isinstance(thing,HARKobject) and hasattr(thing,'distance_criteria'):
+        structure.append(type(thing))
+        for name in thing.distance_criteria:
+            flattenSolverInput(getattr(thing,name,None),structure,values)
+    else:
+        structure.append(thing)
+
+
 #========================================================================
 #========================================================================
 
@@ -939,7 +1565,68 @@ class Market(HARKobject):
         '''
         #for this_type in self.agents:
         #    this_type.solve()
-        multiThreadCommands(self.agents,['solve()'])
+        if self.poolIsOpen():
+            self.pool.run(['solve()'])
+        else:
+            multiThreadCommands(self.agents,['solve()'])
+
+    def openPool(self,num_jobs=None):
+        '''
+        Starts a persistent pool of worker processes that hold this market's
+        AgentTypes.  While the pool is open, solveAgents, cultivate and reset run
+        in the workers, and only changed attributes are passed between processes:
+        whatever the market sows or sets on the AgentTypes goes to the workers,
+        and the solutions and reap_vars come back.  The workers hold the rest of
+        each AgentType's simulation state; use pool.run to bring back anything
+        else that is needed, and closePool when done.
+
+        Parameters
+        ----------
+        num_jobs : int or None
+            Number of worker processes.  Defaults to the smaller of the number of
+            AgentTypes and the number of available cores.
+
+        Returns
+        -------
+        none
+        '''
+        self.closePool()
+        self.pool = AgentPool(self.agents,num_jobs)
+
+    def closePool(self):
+        '''
+        Shuts down this market's pool of worker processes, if there is one.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        none
+        '''
+        if getattr(self,'pool',None) is not None:
+            self.pool.close()
+        self.pool = None
+
+    def poolIsOpen(self):
+        '''
+        Checks whether this market has an open pool of worker processes holding
+        exactly the AgentTypes in self.agents.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        (unnamed) : boolean
+            True if the pool can be used.
+        '''
+        pool = getattr(self,'pool',None)
+        if pool is None or len(pool.agents) != len(self.agents):
+            return False
+        return all(a is b for a, b in zip(pool.agents,self.agents))
 
     def solve(self):
         '''
@@ -967,7 +1654,7 @@ class Market(HARKobject):
 
             # Check to see if the dynamic rule has converged (if this is not the first loop)
             if completed_loops > 0:
-                distance = new_dynamics.distance(old_dynamics)
+                distance = distanceMetric(new_dynamics,old_dynamics,self.tolerance)
             else:
                 distance = 1000000.0
 
@@ -1059,8 +1746,11 @@ class Market(HARKobject):
         -------
         none
         '''
-        for this_type in self.agents:
-            this_type.marketAction()
+        if self.poolIsOpen():
+            self.pool.run(['marketAction()'],receive_vars=self.reap_vars)
+        else:
+            for this_type in self.agents:
+                this_type.marketAction()
 
     def reset(self):
         '''
@@ -1080,8 +1770,11 @@ class Market(HARKobject):
         for var_name in self.sow_vars: # Set the sow variables to their initial levels
             initial_val = getattr(self,var_name + '_init')
             setattr(self,var_name,initial_val)
-        for this_type in self.agents: # Reset each AgentType in the market
-            this_type.reset()
+        if self.poolIsOpen(): # Reset each AgentType in the market
+            self.pool.run(['reset()'],receive_vars=[])
+        else:
+            for this_type in self.agents:
+                this_type.reset()
 
     def store(self):
         '''
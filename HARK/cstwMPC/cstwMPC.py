@@ -31,7 +31,7 @@ class cstwMPCagent(EstimationAgentClass):
     '''
     def reset(self):
         self.initializeSim()
-        self.t_age = drawDiscrete(self.AgentCount,P=self.AgeDstn,X=np.arange(self.AgeDstn.size),exact_match=False,seed=self.RNG.randint(0,2**31-1)).astype(int)
+        self.t_age = drawDiscrete(self.AgentCount,P=self.AgeDstn,X=np.arange(self.AgeDstn.size),exact_match=False,seed=self.RNG).astype(int)
         self.t_cycle = copy(self.t_age)
         if hasattr(self,'kGrid'):
             self.aLvlNow = self.kInit*np.ones(self.AgentCount) # Start simulation near SS
@@ -99,6 +99,17 @@ class cstwMPCmarket(EstimationMarketClass):
             self.solveAgents()
             self.makeHistory()
 
+    def solveAgents(self):
+        '''
+        Solves the microeconomic problem for all AgentTypes in this market.  In the idiosyncratic
+        shocks version, types that differ only in the distributed parameter are solved jointly,
+        unless some type can't be solved in a batch or a pool of worker processes is open.
+        '''
+        if self.AggShockBool or self.poolIsOpen() or not Model.canSolveIndShockBatch(self.agents):
+            EstimationMarketClass.solveAgents(self)
+        else:
+            Model.solveIndShockBatch(self.agents)
+
     def millRule(self,aLvlNow,pLvlNow,MPCnow,TranShkNow,EmpNow,t_age,LorenzBool,ManyStatsBool):
         '''
         The millRule for this class simply calls the method calcStats.
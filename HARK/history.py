@@ -0,0 +1,664 @@
+'''
+Tools for recording the simulated histories of variables of an AgentType.  The
+default storage is one preallocated T_sim x AgentCount array per variable, held
+in an attribute named X_hist for each variable X; a HistoryRecorder can also
+store histories with a smaller floating point type, for every k-th period only,
+for a subset of the agents, or in memory-mapped files on disk.  Histories that
+don't fit in memory can be read a block of periods at a time with iterHistory-
+Blocks, which also puts the histories of several AgentTypes side by side.
+
+Many uses of histories only need some statistics of them, like means, standard
+deviations, percentiles or Lorenz shares, by period or over a window of periods.
+The StreamingStat subclasses at the bottom compute these as the simulation runs,
+so the full history never has to exist.
+'''
+import os
+import tempfile
+from copy import deepcopy
+import numpy as np
+from parallel import makeSharedArray, releaseSharedArray
+
+class HistoryRecorder(object):
+    '''
+    A class for recording the history of some variables of an AgentType as it is
+    simulated.  Each variable X named in var_names is stored in an array in the
+    attribute X_hist of the agent, with one row per recorded period and one column
+    per recorded agent.  The type of each array is taken from the variable's value
+    when the histories are made: boolean and integer variables are stored as such,
+    while floating point variables are stored as float64 (or float_type) with NaN
+    marking periods that have not been simulated yet.
+    '''
+    def __init__(self,var_names,T_sim,AgentCount,period_step=1,agent_idx=None,float_type=None,
+                 shared_memory=False,tag=None,stats=None,disk_dir=None):
+        '''
+        Make a new history recorder.
+
+        Parameters
+        ----------
+        var_names : [string]
+            Names of the attributes whose histories should be recorded.
+        T_sim : int
+            Number of periods that will be simulated.
+        AgentCount : int
+            Number of agents being simulated.
+        period_step : int
+            Record every period_step-th period, starting with the first one.  Row
+            j of each history is then period j*period_step of the simulation.
+        agent_idx : np.array or None
+            Indices of the agents whose values should be recorded; None for all.
+        float_type : type or None
+            Type used to store floating point variables, like np.float32 to halve
+            the memory used.  None means np.float64.
+        shared_memory : boolean
+            Whether the history arrays should be made in shared memory (see
+            HARK.parallel.makeSharedArray).
+        tag : string or None
+            Label for shared memory files; see HARK.parallel.makeSharedArray.
+        stats : {string : [StreamingStat]} or None
+            Streaming statistics to update every period, keyed by the name of the
+            variable they describe; these variables need not be in var_names.
+        disk_dir : string or None
+            Directory in which to make the history arrays as memory-mapped files
+            (np.memmap), so that they needn't fit in memory; None keeps them in
+            memory.  Each period is one contiguous row of its file.  The files
+            aren't deleted automatically.
+
+        Returns
+        -------
+        None
+        '''
+        self.var_names     = list(var_names)
+        self.hist_names    = [var_name + '_hist' for var_name in self.var_names]
+        self.period_step   = max(int(period_step),1)
+        self.agent_idx     = None if agent_idx is None else np.asarray(agent_idx,dtype=int)
+        self.float_type    = float_type
+        self.shared_memory = shared_memory
+        self.tag           = tag
+        self.stats         = {} if stats is None else stats
+        self.disk_dir      = disk_dir
+        self.T_sim         = T_sim
+        self.T_hist        = (T_sim + self.period_step - 1)//self.period_step
+        self.N_hist        = AgentCount if agent_idx is None else self.agent_idx.size
+
+    def getDtype(self,value):
+        '''
+        Chooses the type of the history array for a variable with a given value.
+
+        Parameters
+        ----------
+        value : any
+            The current value of the variable, or None if it has no value yet.
+
+        Returns
+        -------
+        dtype : np.dtype
+            The type of the history array.
+        '''
+        if value is None:
+            kind = 'f'
+            dtype = np.dtype(np.float64)
+        else:
+            dtype = np.asarray(value).dtype
+            kind = dtype.kind
+        if kind in 'biu':
+            return dtype
+        if kind == 'f':
+            if self.float_type is not None:
+                return np.dtype(self.float_type)
+            return np.dtype(np.float64)
+        if kind == 'c':
+            return dtype
+        return np.dtype(np.float64)
+
+    def makeHistories(self,agent):
+        '''
+        Makes a blank history array for each variable, storing it in the agent,
+        and resets the streaming statistics.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The agent whose variables will be recorded.
+
+        Returns
+        -------
+        None
+        '''
+        shape = (self.T_hist,self.N_hist)
+        for var_name, hist_name in zip(self.var_names,self.hist_names):
+            dtype = self.getDtype(getattr(agent,var_name,None))
+            if self.disk_dir is not None:
+                history = makeDiskArray(shape,dtype,self.disk_dir,var_name)
+            elif self.shared_memory:
+                history = makeSharedArray(shape,dtype=dtype,tag=self.tag)
+            else:
+                history = np.empty(shape,dtype=dtype)
+            if dtype.kind in 'fc':
+                history.fill(np.nan)
+            else:
+                history.fill(0)
+            setattr(agent,hist_name,history)
+        for stat_list in self.stats.values():
+            for stat in stat_list:
+                stat.reset(self.T_sim)
+
+    def releaseHistories(self,agent):
+        '''
+        Deletes the shared memory files of the agent's history arrays, if they
+        were made in shared memory, before they are replaced by new ones (see
+        HARK.parallel.releaseSharedArray).  Files on disk are kept.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The agent whose histories were made by this recorder.
+
+        Returns
+        -------
+        None
+        '''
+        if not self.shared_memory:
+            return
+        for hist_name in self.hist_names:
+            history = getattr(agent,hist_name,None)
+            if history is not None:
+                releaseSharedArray(history)
+
+    def record(self,agent,t):
+        '''
+        Updates the streaming statistics with the current value of each variable,
+        then records the current value of each variable in its history, if period
+        t is one of the periods to be recorded.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The agent whose variables are being recorded.
+        t : int
+            The current period of the simulation.
+
+        Returns
+        -------
+        None
+        '''
+        for var_name, stat_list in self.stats.items():
+            value = getattr(agent,var_name)
+            for stat in stat_list:
+                stat.update(agent,value,t)
+        if t % self.period_step != 0:
+            return
+        row = t//self.period_step
+        agent_idx = self.agent_idx
+        for var_name, hist_name in zip(self.var_names,self.hist_names):
+            value = getattr(agent,var_name)
+            if agent_idx is not None and np.ndim(value) > 0:
+                value = value[agent_idx]
+            getattr(agent,hist_name)[row] = value
+
+
+def makeDiskArray(shape,dtype,disk_dir,label=''):
+    '''
+    Makes a new array in a memory-mapped file in a given directory, for history
+    arrays that are too big to keep in memory.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the new array.
+    dtype : type
+        Data type of the new array.
+    disk_dir : string
+        Directory in which to make the file (made if it doesn't exist).
+    label : string
+        Label included in the file name, like the name of the variable.
+
+    Returns
+    -------
+    array : np.memmap
+        A new array backed by a file in disk_dir.
+    '''
+    if int(np.prod(shape)) == 0: # np.memmap can't map an empty file
+        return np.zeros(shape,dtype=dtype)
+    if not os.path.isdir(disk_dir):
+        os.makedirs(disk_dir)
+    handle, filename = tempfile.mkstemp(prefix='HARK_hist_' + label + '_',suffix='.dat',dir=disk_dir)
+    os.close(handle)
+    return np.memmap(filename,dtype=dtype,mode='w+',shape=shape)
+
+
+def getHistoryBlock(histories,t0,t1):
+    '''
+    Returns periods (rows) t0 to t1 (exclusive) of one or more history arrays,
+    putting the histories side by side if there are several (e.g. the same var-
+    iable for several AgentTypes).  Only these rows are read from histories on
+    disk.
+
+    Parameters
+    ----------
+    histories : np.array or [np.array]
+        One history array, or several with the same number of periods.
+    t0 : int
+        First period of the block.
+    t1 : int
+        Period at which the block ends (exclusive).
+
+    Returns
+    -------
+    block : np.array
+        Array of shape (t1-t0,N), where N is the total number of agents.
+    '''
+    if isinstance(histories,np.ndarray):
+        return np.asarray(histories[t0:t1])
+    if len(histories) == 1:
+        return np.asarray(histories[0][t0:t1])
+    return np.concatenate([history[t0:t1] for history in histories],axis=1)
+
+
+def iterHistoryBlocks(histories,block_size=1000,t0=0,t1=None,overlap=0):
+    '''
+    Iterates over the periods of one or more history arrays in blocks, so that
+    statistics can be computed from histories on disk (see HistoryRecorder)
+    without ever loading all of them into memory.  Each block is made by get-
+    HistoryBlock, with the histories side by side.
+
+    Parameters
+    ----------
+    histories : np.array or [np.array]
+        One history array, or several with the same number of periods.
+    block_size : int
+        Number of new periods in each block.
+    t0 : int
+        First period to iterate over.
+    t1 : int or None
+        Period at which to stop (exclusive); None for the end of the histories.
+    overlap : int
+        Number of periods before each block's new periods to include at its
+        start (except where that would be before t0), for calculations across
+        periods such as differences.
+
+    Yields
+    ------
+    t : int
+        The period of the first row of the block.
+    block : np.array
+        Rows t to min(t_new + block_size,t1) of the histories, where t_new is
+        the block's first new period.
+    '''
+    if t1 is None:
+        t1 = (histories if isinstance(histories,np.ndarray) else histories[0]).shape[0]
+    block_size = max(int(block_size),1)
+    for t_new in range(t0,t1,block_size):
+        t = max(t_new - overlap,t0)
+        yield t, getHistoryBlock(histories,t,min(t_new + block_size,t1))
+
+
+class StreamingStat(object):
+    '''
+    A superclass for statistics of a variable that are updated as an AgentType
+    is simulated, so that the variable's full history never has to be stored.
+    Instances are put in the dictionary track_stats of an AgentType, keyed by the
+    name of the variable; each period, the statistic is updated with the cross-
+    section of values across agents.  A statistic can be computed for each
+    period separately (by_period) and pooled over the periods in a window.
+    '''
+    def __init__(self,t0=0,t1=None,by_period=True,weight_var=None,weight=1.0):
+        '''
+        Make a new streaming statistic.
+
+        Parameters
+        ----------
+        t0 : int
+            First period of the window over which values are pooled.
+        t1 : int or None
+            Period at which the window ends (exclusive); None for the end of the
+            simulation.
+        by_period : boolean
+            Whether the statistic should also be computed for each period.
+        weight_var : string or None
+            Name of an attribute of the agent with a weight for each agent; None
+            gives every agent the same weight.
+        weight : float
+            Weight multiplying the weight of every agent of this type, used when
+            statistics are combined across types (see combineStats).
+
+        Returns
+        -------
+        None
+        '''
+        self.t0 = t0
+        self.t1 = t1
+        self.by_period = by_period
+        self.weight_var = weight_var
+        self.weight = weight
+        self.reset(0)
+
+    def reset(self,T_sim):
+        '''
+        Clears the statistic before a new simulation of T_sim periods.
+
+        Parameters
+        ----------
+        T_sim : int
+            Number of periods that will be simulated.
+
+        Returns
+        -------
+        None
+        '''
+        self.T_sim = T_sim
+
+    def inWindow(self,t):
+        '''
+        Checks whether period t is in the window of pooled periods.
+        '''
+        return t >= self.t0 and (self.t1 is None or t < self.t1)
+
+    def update(self,agent,value,t):
+        '''
+        Updates the statistic with the values of the variable in period t.
+
+        Parameters
+        ----------
+        agent : AgentType
+            The agent being simulated.
+        value : np.array
+            The values of the variable for each agent in period t.
+        t : int
+            The current period of the simulation.
+
+        Returns
+        -------
+        None
+        '''
+        by_period = self.by_period and t < self.T_sim
+        pooled = self.inWindow(t)
+        if not (by_period or pooled):
+            return
+        values = np.asarray(value,dtype=float).ravel()
+        if self.weight_var is None:
+            weights = np.ones(values.size)
+        else:
+            weights = np.asarray(getattr(agent,self.weight_var),dtype=float).ravel()
+        weights = weights*self.weight
+        keep = ~np.isnan(values)
+        if not np.all(keep):
+            values = values[keep]
+            weights = weights[keep]
+        if values.size > 0:
+            self.add(values,weights,t if by_period else None,pooled)
+
+    def add(self,values,weights,t,pooled):
+        '''
+        Adds a cross-section of values to the statistic; defined by subclasses.
+
+        Parameters
+        ----------
+        values : np.array
+            Values of the variable (without NaNs).
+        weights : np.array
+            Weight of each value.
+        t : int or None
+            Period of the values, if by-period statistics should be updated.
+        pooled : boolean
+            Whether the pooled statistic should be updated.
+
+        Returns
+        -------
+        None
+        '''
+        raise NotImplementedError()
+
+    def merge(self,other):
+        '''
+        Combines the statistic with another of the same kind (computed for a
+        different AgentType), in place; defined by subclasses.
+        '''
+        raise NotImplementedError()
+
+
+class RunningMoments(StreamingStat):
+    '''
+    The (weighted) mean, variance and standard deviation of a variable, updated
+    with Welford's method, batched across agents as in Chan et al.'s pairwise
+    algorithm.  By period results are in mean_by_t, var_by_t and weight_by_t;
+    pooled results are given by mean(), var() and std().  Variances are
+    population variances (as np.var).
+    '''
+    def reset(self,T_sim):
+        self.T_sim       = T_sim
+        self.mean_by_t   = np.zeros(T_sim) + np.nan
+        self.var_by_t    = np.zeros(T_sim) + np.nan
+        self.weight_by_t = np.zeros(T_sim)
+        self.W  = 0.0
+        self.M1 = 0.0
+        self.M2 = 0.0
+
+    def add(self,values,weights,t,pooled):
+        W = np.sum(weights)
+        M1 = np.dot(weights,values)/W
+        M2 = np.dot(weights,(values-M1)**2)
+        if t is not None:
+            self.mean_by_t[t] = M1
+            self.var_by_t[t] = M2/W
+            self.weight_by_t[t] = W
+        if pooled:
+            self.combine(W,M1,M2)
+
+    def combine(self,W,M1,M2):
+        '''
+        Adds a batch with total weight W, mean M1 and sum of squared deviations M2
+        to the pooled moments.
+        '''
+        W_all = self.W + W
+        if W_all <= 0.0:
+            return
+        delta = M1 - self.M1
+        self.M2 += M2 + delta**2*self.W*W/W_all
+        self.M1 += delta*W/W_all
+        self.W = W_all
+
+    def merge(self,other):
+        self.combine(other.W,other.M1,other.M2)
+        W_all = self.weight_by_t + other.weight_by_t
+        both = W_all > 0.0
+        share = np.zeros_like(W_all)
+        share[both] = other.weight_by_t[both]/W_all[both]
+        mean_A = np.where(self.weight_by_t > 0.0,self.mean_by_t,0.0)
+        mean_B = np.where(other.weight_by_t > 0.0,other.mean_by_t,0.0)
+        var_A = np.where(self.weight_by_t > 0.0,self.var_by_t,0.0)
+        var_B = np.where(other.weight_by_t > 0.0,other.var_by_t,0.0)
+        delta = mean_B - mean_A
+        mean_all = mean_A + delta*share
+        var_all = (1.0-share)*var_A + share*var_B + delta**2*share*(1.0-share)
+        self.mean_by_t = np.where(both,mean_all,np.nan)
+        self.var_by_t = np.where(both,var_all,np.nan)
+        self.weight_by_t = W_all
+
+    def mean(self):
+        '''
+        Returns the pooled mean of the variable.
+        '''
+        return self.M1 if self.W > 0.0 else np.nan
+
+    def var(self):
+        '''
+        Returns the pooled variance of the variable.
+        '''
+        return self.M2/self.W if self.W > 0.0 else np.nan
+
+    def std(self):
+        '''
+        Returns the pooled standard deviation of the variable.
+        '''
+        return np.sqrt(self.var())
+
+
+class QuantileSketch(StreamingStat):
+    '''
+    Percentiles of a variable.  By period percentiles are computed exactly from
+    each period's cross-section and stored in pctl_by_t (one row per period).
+    Pooled percentiles come from a sketch in the style of a t-digest: the values
+    are summarized by at most about size centroids (the weighted mean of a group
+    of adjacent values and the group's total weight), with smaller groups in the
+    tails, so that the pooled values never have to be stored.
+    '''
+    def __init__(self,percentiles=[0.5],size=1000,**kwds):
+        '''
+        Make a new quantile sketch.
+
+        Parameters
+        ----------
+        percentiles : [float]
+            The percentiles to calculate, each in (0,1).
+        size : int
+            Approximate maximum number of centroids in the pooled sketch.
+        **kwds : keyword arguments
+            Other arguments for StreamingStat (t0, t1, by_period, weight_var, weight).
+
+        Returns
+        -------
+        None
+        '''
+        self.percentiles = np.asarray(percentiles,dtype=float)
+        self.size = size
+        StreamingStat.__init__(self,**kwds)
+
+    def reset(self,T_sim):
+        self.T_sim = T_sim
+        self.by_t = np.zeros((T_sim,self.percentiles.size)) + np.nan
+        self.centroid_val = np.zeros(0)
+        self.centroid_wt = np.zeros(0)
+
+    @property
+    def pctl_by_t(self):
+        return self.by_t
+
+    def calcByPeriod(self,values,weights):
+        '''
+        Calculates the by-period statistic from one sorted cross-section.
+        '''
+        cum_dist = np.cumsum(weights)/np.sum(weights)
+        return np.interp(self.percentiles,cum_dist,values,left=np.nan,right=np.nan)
+
+    def add(self,values,weights,t,pooled):
+        order = np.argsort(values)
+        values = values[order]
+        weights = weights[order]
+        if t is not None:
+            self.by_t[t] = self.calcByPeriod(values,weights)
+        if pooled:
+            self.absorb(values,weights)
+
+    def absorb(self,values,weights):
+        '''
+        Adds sorted, weighted values to the pooled sketch, then compresses it
+        back to at most about size centroids.
+        '''
+        values = np.concatenate((self.centroid_val,values))
+        weights = np.concatenate((self.centroid_wt,weights))
+        if self.centroid_val.size > 0:
+            order = np.argsort(values,kind='mergesort')
+            values = values[order]
+            weights = weights[order]
+        cum_wt = np.cumsum(weights)
+        total = cum_wt[-1]
+        if total <= 0.0:
+            return
+        q = (cum_wt - 0.5*weights)/total
+        k = self.size*(np.arcsin(2.0*q - 1.0)/np.pi + 0.5)
+        group = np.minimum(k.astype(int),self.size-1)
+        group_wt = np.bincount(group,weights=weights,minlength=self.size)
+        group_sum = np.bincount(group,weights=weights*values,minlength=self.size)
+        used = group_wt > 0.0
+        self.centroid_wt = group_wt[used]
+        self.centroid_val = group_sum[used]/self.centroid_wt
+
+    def merge(self,other):
+        self.absorb(other.centroid_val,other.centroid_wt)
+        self.by_t = self.by_t + np.nan # exact by-period statistics can't be merged
+
+    def getPercentiles(self,percentiles=None):
+        '''
+        Returns pooled percentiles of the variable, estimated from the sketch.
+
+        Parameters
+        ----------
+        percentiles : [float] or None
+            Percentiles to calculate; None for those given at initialization.
+
+        Returns
+        -------
+        pctl_out : np.array
+            The requested percentiles.
+        '''
+        if percentiles is None:
+            percentiles = self.percentiles
+        if self.centroid_wt.size == 0:
+            return np.zeros(np.size(percentiles)) + np.nan
+        cum_dist = (np.cumsum(self.centroid_wt) - 0.5*self.centroid_wt)/np.sum(self.centroid_wt)
+        return np.interp(percentiles,cum_dist,self.centroid_val)
+
+
+class LorenzAccumulator(QuantileSketch):
+    '''
+    Lorenz shares of a variable: the share of the (weighted) total held by those
+    below each percentile.  By period shares are computed exactly and stored in
+    lorenz_by_t; pooled shares come from the centroid sketch of QuantileSketch,
+    which keeps the total of each group of values exactly, so that the shares
+    are exact at the edges of groups and interpolated between them.
+    '''
+    @property
+    def lorenz_by_t(self):
+        return self.by_t
+
+    def calcByPeriod(self,values,weights):
+        cum_dist = np.cumsum(weights)/np.sum(weights)
+        temp = values*weights
+        cum_data = np.cumsum(temp)/np.sum(temp)
+        return np.interp(self.percentiles,cum_dist,cum_data,left=np.nan,right=np.nan)
+
+    def getLorenzShares(self,percentiles=None):
+        '''
+        Returns pooled Lorenz shares of the variable, estimated from the sketch.
+
+        Parameters
+        ----------
+        percentiles : [float] or None
+            Percentiles at which to calculate the Lorenz curve; None for those
+            given at initialization.
+
+        Returns
+        -------
+        lorenz_out : np.array
+            The requested Lorenz curve points.
+        '''
+        if percentiles is None:
+            percentiles = self.percentiles
+        if self.centroid_wt.size == 0:
+            return np.zeros(np.size(percentiles)) + np.nan
+        temp = self.centroid_val*self.centroid_wt
+        cum_dist = np.concatenate(([0.0],np.cumsum(self.centroid_wt)/np.sum(self.centroid_wt)))
+        cum_data = np.concatenate(([0.0],np.cumsum(temp)/np.sum(temp)))
+        return np.interp(percentiles,cum_dist,cum_data)
+
+
+def combineStats(stat_list):
+    '''
+    Combines streaming statistics of the same kind computed for several Agent-
+    Types (e.g. the ex ante heterogeneous types of a market) into one.  Weight
+    each type with the weight attribute of its statistic.
+
+    Parameters
+    ----------
+    stat_list : [StreamingStat]
+        Statistics of one kind to be combined.
+
+    Returns
+    -------
+    stat_all : StreamingStat
+        A new statistic combining those in stat_list.
+    '''
+    stat_all = deepcopy(stat_list[0])
+    for stat in stat_list[1:]:
+        stat_all.merge(stat)
+    return stat_all
@@ -27,6 +27,172 @@ def _isscalar(x):
     '''
     return np.isscalar(x) or hasattr(x, 'shape') and x.shape == ()
 
+def _findGridType(x_list):
+    '''
+    Checks whether a grid is evenly spaced in x, in log(1+x) (like a grid made by
+    HARK.utilities.makeGridExpMult with one level of nesting) or in log(x) (like
+    one with no nesting), so that the interval in which a point lies can be found
+    directly rather than by a search.  Grids with more levels of nesting are
+    not recognized, as the repeated logarithms take longer than a search.
+
+    Parameters
+    ----------
+    x_list : np.array
+        An increasing grid of values.
+
+    Returns
+    -------
+    grid_type : string or None
+        'linear', 'log1p' or 'log' if the grid is evenly spaced in x, log(1+x) or
+        log(x) respectively; None if it is none of these.
+    grid_start : float
+        First gridpoint, after transformation.
+    grid_step : float
+        Distance between gridpoints, after transformation.
+    '''
+    x_list = np.asarray(x_list,dtype=float)
+    if x_list.ndim != 1 or x_list.size < 2 or not np.all(np.isfinite(x_list)):
+        return None, None, None
+    transforms = [('linear',lambda x : x)]
+    if x_list[0] > -1.0:
+        transforms.append(('log1p',np.log1p))
+    if x_list[0] > 0.0:
+        transforms.append(('log',np.log))
+    probe_idx = np.array([0,x_list.size//3,(2*x_list.size)//3,x_list.size-1])
+    for grid_type, transform in transforms:
+        # Rule out most grids from a few points before transforming the whole grid
+        z = transform(x_list[probe_idx])
+        step = (z[-1] - z[0])/(x_list.size - 1)
+        if step <= 0.0:
+            break
+        if np.max(np.abs(z - (z[0] + step*probe_idx))) > 1e-8*step:
+            continue
+        z = transform(x_list)
+        step = (z[-1] - z[0])/(z.size - 1)
+        if step <= 0.0:
+            break
+        if np.max(np.abs(z - (z[0] + step*np.arange(z.size)))) <= 1e-8*step:
+            return grid_type, z[0], step
+    return None, None, None
+
+
+def _findSegments(x_list,grid_type,grid_start,grid_step,x):
+    '''
+    Finds the index i of the gridpoint at the top of the segment in which each
+    value of x lies, so that x_list[i-1] < x <= x_list[i], with i between 1 and
+    x_list.size-1, calculating i directly if the grid is evenly spaced (in x,
+    log(x) or log(1+x), as found by _findGridType) and searching otherwise.
+
+    Parameters
+    ----------
+    x_list : np.array
+        An increasing grid of values.
+    grid_type : string or None
+        Type of the grid, as returned by _findGridType(x_list).
+    grid_start : float
+        First gridpoint after transformation, as returned by _findGridType.
+    grid_step : float
+        Distance between gridpoints after transformation, as returned by _findGridType.
+    x : np.array
+        Values whose segments should be found.
+
+    Returns
+    -------
+    i : np.array
+        Index of the top of the segment for each value in x.
+    '''
+    if grid_type is None or x.size < 32:
+        return np.maximum(np.searchsorted(x_list[:-1],x),1)
+    n = x_list.size
+    z = np.fmin(np.fmax(x,x_list[0]),x_list[-2])
+    if grid_type == 'log':
+        np.log(z,out=z)
+    elif grid_type == 'log1p':
+        np.log1p(z,out=z)
+    z -= grid_start
+    z *= 1.0/grid_step
+    i = z.astype(int)
+    i += 1
+    np.clip(i,1,n-1,out=i)
+    # Correct any rounding error in the calculated index
+    i -= (x_list[i-1] >= x) & (i > 1)
+    i += (x > x_list[i]) & (i < n-1)
+    return i
+
+def _multilinearEvalAndGrad(f_values,grids,points,search_funcs):
+    '''
+    Evaluates a multilinear interpolation on a tensor grid and its gradient,
+    searching each grid only once.  The corners of each point's cell are
+    combined one dimension at a time, and the derivative with respect to each
+    dimension is formed (and then carried along) as that dimension is combined.
+
+    Parameters
+    ----------
+    f_values : np.array
+        Function values on the tensor grid, with one axis for each of grids.
+    grids : [np.array]
+        Gridpoints in each dimension.
+    points : [np.array]
+        Values at which to evaluate, one array for each dimension.
+    search_funcs : [function]
+        Functions that return the reference location of values in each grid:
+        indices = search_func(grid,values).
+
+    Returns
+    -------
+    f : np.array
+        Interpolated function evaluated at the points.
+    grad : [np.array]
+        Derivatives of the interpolated function with respect to each dimension.
+    '''
+    d = len(grids)
+    index = []
+    weights = []
+    steps = []
+    for k in range(d):
+        grid = grids[k]
+        pos = np.asarray(search_funcs[k](grid,points[k]))
+        pos = np.minimum(np.maximum(pos,1),grid.size-1)
+        step = grid[pos] - grid[pos-1]
+        weights.append((points[k] - grid[pos-1])/step)
+        steps.append(step)
+        shape = [1]*(d+1)
+        shape[k] = 2
+        index.append(pos - 1 + np.arange(2).reshape(shape))
+    values = f_values[tuple(index)]
+    grad = []
+    for k in range(d-1,-1,-1):
+        w = weights[k]
+        grad = [(1-w)*g[...,0,:] + w*g[...,1,:] for g in grad]
+        grad.insert(0,(values[...,1,:] - values[...,0,:])/steps[k])
+        values = (1-w)*values[...,0,:] + w*values[...,1,:]
+    return values, grad
+
+def _evalWithGradient(func,*args):
+    '''
+    Evaluates a function of two to four variables and its gradient, using its
+    eval_with_gradient method if it has one and its derivative methods if not.
+
+    Parameters
+    ----------
+    func : function
+        A function with methods derivativeX, derivativeY (etc), like the
+        HARKinterpolator2D, HARKinterpolator3D and HARKinterpolator4D classes.
+    *args : np.array
+        Values at which to evaluate the function.
+
+    Returns
+    -------
+    out : tuple
+        The level of the function and its derivatives with respect to each input.
+    '''
+    if hasattr(func,'eval_with_gradient'):
+        return func.eval_with_gradient(*args)
+    names = ['X','Y','Z']
+    if len(args) == 4:
+        names = ['W'] + names
+    return (func(*args),) + tuple(getattr(func,'derivative' + name)(*args) for name in names[:len(args)])
+
 
 class HARKinterpolator1D(HARKobject):
     '''
@@ -92,6 +258,38 @@ class HARKinterpolator1D(HARKobject):
         y, dydx = self._evalAndDer(z.flatten())
         return y.reshape(z.shape), dydx.reshape(z.shape)
 
+    def eval_into(self,x,out=None,dydx_out=None):
+        '''
+        Evaluates the interpolated function and/or its derivative at the given
+        input, putting the results into arrays provided by the caller rather than
+        new arrays, to avoid allocating memory when this is done repeatedly.
+
+        Parameters
+        ----------
+        x : np.array
+            Real values to be evaluated in the interpolated function.
+        out : np.array or None
+            A C-contiguous float array with the same size as x in which to put the
+            interpolated function evaluated at x; None if it is not needed.
+        dydx_out : np.array or None
+            A C-contiguous float array with the same size as x in which to put the
+            interpolated function's first derivative evaluated at x; None if it
+            is not needed.
+
+        Returns
+        -------
+        None
+        '''
+        z = np.asarray(x).ravel()
+        buffers = []
+        for buf in (out,dydx_out):
+            if buf is not None:
+                if buf.size != z.size or not buf.flags.c_contiguous or buf.dtype != np.float64:
+                    raise ValueError('Output arrays must be C-contiguous float arrays the same size as x!')
+                buf = buf.reshape(z.size)
+            buffers.append(buf)
+        self._evalInto(z,buffers[0],buffers[1])
+
     def _evaluate(self,x):
         '''
         Interpolated function evaluator, to be defined in subclasses.
@@ -110,6 +308,18 @@ class HARKinterpolator1D(HARKobject):
         '''
         raise NotImplementedError()
 
+    def _evalInto(self,x,y_out,dydx_out):
+        '''
+        Puts the level and/or derivative of the function at each value in x into
+        y_out and dydx_out.  Subclasses can override this to avoid making new arrays.
+        '''
+        if y_out is not None and dydx_out is not None:
+            y_out[:], dydx_out[:] = self._evalAndDer(x)
+        elif y_out is not None:
+            y_out[:] = self._evaluate(x)
+        elif dydx_out is not None:
+            dydx_out[:] = self._der(x)
+
 
 class HARKinterpolator2D(HARKobject):
     '''
@@ -185,6 +395,36 @@ class HARKinterpolator2D(HARKobject):
         ya = np.asarray(y)
         return (self._derY(xa.flatten(),ya.flatten())).reshape(xa.shape)
 
+    def eval_with_gradient(self,x,y):
+        '''
+        Evaluates the interpolated function and both of its partial derivatives
+        at the given input, locating each point on the grid only once.
+
+        Parameters
+        ----------
+        x : np.array or float
+            Real values to be evaluated in the interpolated function.
+        y : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as x.
+
+        Returns
+        -------
+        fxy : np.array or float
+            The interpolated function evaluated at x,y: fxy = f(x,y), with the
+            same shape as x and y.
+        dfdx : np.array or float
+            The derivative of the interpolated function with respect to x, eval-
+            uated at x,y: dfdx = f_x(x,y), with the same shape as x and y.
+        dfdy : np.array or float
+            The derivative of the interpolated function with respect to y, eval-
+            uated at x,y: dfdy = f_y(x,y), with the same shape as x and y.
+        '''
+        xa = np.asarray(x)
+        ya = np.asarray(y)
+        out = self._evalAndGrad(xa.flatten(),ya.flatten())
+        return tuple(f.reshape(xa.shape) for f in out)
+
     def _evaluate(self,x,y):
         '''
         Interpolated function evaluator, to be defined in subclasses.
@@ -203,6 +443,13 @@ class HARKinterpolator2D(HARKobject):
         '''
         raise NotImplementedError()
 
+    def _evalAndGrad(self,x,y):
+        '''
+        Interpolated function and gradient evaluator; subclasses that can share
+        the grid search across the level and derivatives should override this.
+        '''
+        return self._evaluate(x,y), self._derX(x,y), self._derY(x,y)
+
 
 class HARKinterpolator3D(HARKobject):
     '''
@@ -317,6 +564,43 @@ class HARKinterpolator3D(HARKobject):
         za = np.asarray(z)
         return (self._derZ(xa.flatten(),ya.flatten(),za.flatten())).reshape(xa.shape)
 
+    def eval_with_gradient(self,x,y,z):
+        '''
+        Evaluates the interpolated function and all three of its partial deriv-
+        atives at the given input, locating each point on the grid only once.
+
+        Parameters
+        ----------
+        x : np.array or float
+            Real values to be evaluated in the interpolated function.
+        y : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as x.
+        z : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as x.
+
+        Returns
+        -------
+        fxyz : np.array or float
+            The interpolated function evaluated at x,y,z: fxyz = f(x,y,z), with
+            the same shape as x, y, and z.
+        dfdx : np.array or float
+            The derivative with respect to x of the interpolated function, with
+            the same shape as x, y, and z.
+        dfdy : np.array or float
+            The derivative with respect to y of the interpolated function, with
+            the same shape as x, y, and z.
+        dfdz : np.array or float
+            The derivative with respect to z of the interpolated function, with
+            the same shape as x, y, and z.
+        '''
+        xa = np.asarray(x)
+        ya = np.asarray(y)
+        za = np.asarray(z)
+        out = self._evalAndGrad(xa.flatten(),ya.flatten(),za.flatten())
+        return tuple(f.reshape(xa.shape) for f in out)
+
     def _evaluate(self,x,y,z):
         '''
         Interpolated function evaluator, to be defined in subclasses.
@@ -341,6 +625,13 @@ class HARKinterpolator3D(HARKobject):
         '''
         raise NotImplementedError()
 
+    def _evalAndGrad(self,x,y,z):
+        '''
+        Interpolated function and gradient evaluator; subclasses that can share
+        the grid search across the level and derivatives should override this.
+        '''
+        return self._evaluate(x,y,z), self._derX(x,y,z), self._derY(x,y,z), self._derZ(x,y,z)
+
 
 class HARKinterpolator4D(HARKobject):
     '''
@@ -502,6 +793,41 @@ class HARKinterpolator4D(HARKobject):
         za = np.asarray(z)
         return (self._derZ(wa.flatten(),xa.flatten(),ya.flatten(),za.flatten())).reshape(wa.shape)
 
+    def eval_with_gradient(self,w,x,y,z):
+        '''
+        Evaluates the interpolated function and all four of its partial deriv-
+        atives at the given input, locating each point on the grid only once.
+
+        Parameters
+        ----------
+        w : np.array or float
+            Real values to be evaluated in the interpolated function.
+        x : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as w.
+        y : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as w.
+        z : np.array or float
+            Real values to be evaluated in the interpolated function; must be
+            the same size as w.
+
+        Returns
+        -------
+        fwxyz : np.array or float
+            The interpolated function evaluated at w,x,y,z: fwxyz = f(w,x,y,z),
+            with the same shape as w, x, y, and z.
+        dfdw, dfdx, dfdy, dfdz : np.array or float
+            The derivatives with respect to w, x, y, and z of the interpolated
+            function, each with the same shape as the inputs.
+        '''
+        wa = np.asarray(w)
+        xa = np.asarray(x)
+        ya = np.asarray(y)
+        za = np.asarray(z)
+        out = self._evalAndGrad(wa.flatten(),xa.flatten(),ya.flatten(),za.flatten())
+        return tuple(f.reshape(wa.shape) for f in out)
+
     def _evaluate(self,w,x,y,z):
         '''
         Interpolated function evaluator, to be defined in subclasses.
@@ -532,6 +858,14 @@ class HARKinterpolator4D(HARKobject):
         '''
         raise NotImplementedError()
 
+    def _evalAndGrad(self,w,x,y,z):
+        '''
+        Interpolated function and gradient evaluator; subclasses that can share
+        the grid search across the level and derivatives should override this.
+        '''
+        return (self._evaluate(w,x,y,z), self._derW(w,x,y,z), self._derX(w,x,y,z),
+                self._derY(w,x,y,z), self._derZ(w,x,y,z))
+
 
 class IdentityFunction(HARKobject):
     '''
@@ -727,8 +1061,8 @@ class LinearInterp(HARKinterpolator1D):
         extrapolation is used above the highest gridpoint.
         '''
         # Make the basic linear spline interpolation
-        self.x_list = np.array(x_list)
-        self.y_list = np.array(y_list)
+        self.x_list = np.array(x_list,dtype=float)
+        self.y_list = np.array(y_list,dtype=float)
         self.lower_extrap = lower_extrap
         self.x_n = self.x_list.size
 
@@ -746,8 +1080,42 @@ class LinearInterp(HARKinterpolator1D):
         else:
             self.decay_extrap = False
 
+        # Precompute the slope of each segment; whether segments can be found
+        # directly is only checked when it's first needed (see _findSegments)
+        self.slopes = (self.y_list[1:] - self.y_list[:-1])/(self.x_list[1:] - self.x_list[:-1])
+        self.grid_type, self.grid_start, self.grid_step = None, None, None
+        self.large_evals = 0
+
+    def _findSegments(self,x):
+        '''
+        Finds the index i of the gridpoint at the top of the segment in which each
+        value of x lies, so that x_list[i-1] < x <= x_list[i], with i between 1
+        and x_n-1 (so that values off the grid use the first or last segment).
+        This is the same as np.maximum(np.searchsorted(self.x_list[:-1],x),1),
+        but is much faster on an evenly spaced grid (or one that is evenly spaced
+        in log(x) or log(1+x)), where i can be calculated directly.  The type of
+        grid is found (and remembered) the second time enough values are sought
+        for it to matter, so that interpolants that are made on endogenous grids
+        and evaluated only once, as in each step of backward induction, don't pay
+        for checking.
+
+        Parameters
+        ----------
+        x : np.array
+            Values whose segments should be found.
+
+        Returns
+        -------
+        i : np.array
+            Index of the top of the segment for each value in x.
+        '''
+        if x.size >= 32 and self.large_evals < 2:
+            self.large_evals += 1
+            if self.large_evals == 2:
+                self.grid_type, self.grid_start, self.grid_step = _findGridType(self.x_list)
+        return _findSegments(self.x_list,self.grid_type,self.grid_start,self.grid_step,x)
 
-    def _evalOrDer(self,x,_eval,_Der):
+    def _evalOrDer(self,x,_eval,_Der,y_out=None,dydx_out=None):
         '''
         Returns the level and/or first derivative of the function at each value in
         x.  Only called internally by HARKinterpolator1D.eval_and_der (etc).
@@ -760,23 +1128,32 @@ class LinearInterp(HARKinterpolator1D):
             Indicator for whether to evalute the level of the interpolated function.
         _Der : boolean
             Indicator for whether to evaluate the derivative of the interpolated function.
+        y_out : np.array or None
+            Array in which to put the level of the function, if any.
+        dydx_out : np.array or None
+            Array in which to put the derivative of the function, if any.
 
         Returns
         -------
         A list including the level and/or derivative of the interpolated function where requested.
         '''
-
-
-
-        i      = np.maximum(np.searchsorted(self.x_list[:-1],x),1)
-        alpha  = (x-self.x_list[i-1])/(self.x_list[i]-self.x_list[i-1])
+        j     = self._findSegments(x)
+        j    -= 1
+        slope = self.slopes.take(j)
 
         if _eval:
-                y = (1.-alpha)*self.y_list[i-1] + alpha*self.y_list[i]
+            y = self.x_list.take(j) if y_out is None else self.x_list.take(j,out=y_out)
+            np.subtract(x,y,out=y)
+            y *= slope
+            y += self.y_list.take(j)
         if _Der:
-                dydx = (self.y_list[i] - self.y_list[i-1])/(self.x_list[i] - self.x_list[i-1])
+            if dydx_out is None:
+                dydx = slope
+            else:
+                dydx = dydx_out
+                dydx[:] = slope
 
-        if not self.lower_extrap:
+        if not self.lower_extrap and x.size > 0 and np.fmin.reduce(x) < self.x_list[0]:
             below_lower_bound = x < self.x_list[0]
 
             if _eval:
@@ -784,7 +1161,7 @@ class LinearInterp(HARKinterpolator1D):
             if _Der:
                 dydx[below_lower_bound] = np.nan
 
-        if self.decay_extrap:
+        if x.size > 0 and self.decay_extrap and np.fmax.reduce(x) > self.x_list[-1]:
             above_upper_bound = x > self.x_list[-1]
             x_temp = x[above_upper_bound] - self.x_list[-1]
 
@@ -806,6 +1183,13 @@ class LinearInterp(HARKinterpolator1D):
 
         return output
 
+    def _evalInto(self,x,y_out,dydx_out):
+        '''
+        Puts the level and/or first derivative of the function at each value in x
+        into y_out and dydx_out.  Only called internally by HARKinterpolator1D.eval_into.
+        '''
+        self._evalOrDer(x,y_out is not None,dydx_out is not None,y_out,dydx_out)
+
     def _evaluate(self,x,return_indices = False):
         '''
         Returns the level of the interpolated function at each value in x.  Only
@@ -868,29 +1252,29 @@ class CubicInterp(HARKinterpolator1D):
         NOTE: When no input is given for the limiting linear function, linear
         extrapolation is used above the highest gridpoint.
         '''
-        self.x_list = np.asarray(x_list)
-        self.y_list = np.asarray(y_list)
-        self.dydx_list = np.asarray(dydx_list)
+        self.x_list = np.array(x_list,dtype=float)
+        self.y_list = np.array(y_list,dtype=float)
+        self.dydx_list = np.array(dydx_list,dtype=float)
         self.n = len(x_list)
+        x_list = self.x_list
+        y_list = self.y_list
+        dydx_list = self.dydx_list
 
         # Define lower extrapolation as linear function (or just NaN)
         if lower_extrap:
-            self.coeffs = [[y_list[0],dydx_list[0],0,0]]
+            coeffs_bot = [y_list[0],dydx_list[0],0,0]
         else:
-            self.coeffs = [[np.nan,np.nan,np.nan,np.nan]]
+            coeffs_bot = [np.nan,np.nan,np.nan,np.nan]
 
         # Calculate interpolation coefficients on segments mapped to [0,1]
-        for i in xrange(self.n-1):
-           x0 = x_list[i]
-           y0 = y_list[i]
-           x1 = x_list[i+1]
-           y1 = y_list[i+1]
-           Span = x1 - x0
-           dydx0 = dydx_list[i]*Span
-           dydx1 = dydx_list[i+1]*Span
-
-           temp = [y0, dydx0, 3*(y1 - y0) - 2*dydx0 - dydx1, 2*(y0 - y1) + dydx0 + dydx1];
-           self.coeffs.append(temp)
+        x1 = x_list[-1]
+        y1 = y_list[-1]
+        Span = x_list[1:] - x_list[:-1]
+        dydx0 = dydx_list[:-1]*Span
+        dydx1 = dydx_list[1:]*Span
+        coeffs_in = np.column_stack([y_list[:-1], dydx0,
+                                     3*(y_list[1:] - y_list[:-1]) - 2*dydx0 - dydx1,
+                                     2*(y_list[:-1] - y_list[1:]) + dydx0 + dydx1])
 
         # Calculate extrapolation coefficients as a decay toward limiting function y = mx+b
         if slope_limit is None and intercept_limit is None:
@@ -899,132 +1283,181 @@ class CubicInterp(HARKinterpolator1D):
         gap = slope_limit*x1 + intercept_limit - y1
         slope = slope_limit - dydx_list[self.n-1]
         if (gap != 0) and (slope <= 0):
-            temp = [intercept_limit, slope_limit, gap, slope/gap]
+            coeffs_top = [intercept_limit, slope_limit, gap, slope/gap]
         elif slope > 0:
-            temp = [intercept_limit, slope_limit, 0, 0] # fixing a problem when slope is positive
+            coeffs_top = [intercept_limit, slope_limit, 0, 0] # fixing a problem when slope is positive
         else:
-            temp = [intercept_limit, slope_limit, gap, 0]
-        self.coeffs.append(temp)
-        self.coeffs = np.array(self.coeffs)
+            coeffs_top = [intercept_limit, slope_limit, gap, 0]
+        self.coeffs = np.vstack([coeffs_bot,coeffs_in,coeffs_top])
+
+        # Also store each segment's cubic as a polynomial in (x - x_list[i]), in a
+        # table whose columns are contiguous, so that evaluation needs no division
+        self.poly = np.empty((self.n-1,4),order='F')
+        self.poly[:,0] = y_list[:-1]
+        self.poly[:,1] = dydx_list[:-1]
+        self.poly[:,2] = coeffs_in[:,2]/Span**2
+        self.poly[:,3] = coeffs_in[:,3]/Span**3
+        self.grid_type, self.grid_start, self.grid_step = None, None, None
+        self.large_evals = 0 # see LinearInterp._findSegments
+
+    def _findSegments(self,x):
+        '''
+        Finds the index i of the gridpoint at the top of the segment in which each
+        value of x lies, as in LinearInterp._findSegments.
+        '''
+        if x.size >= 32 and self.large_evals < 2:
+            self.large_evals += 1
+            if self.large_evals == 2:
+                self.grid_type, self.grid_start, self.grid_step = _findGridType(self.x_list)
+        return _findSegments(self.x_list,self.grid_type,self.grid_start,self.grid_step,x)
+
+    def _evalOrDer(self,x,_eval,_Der,_Der2=False,y_out=None,dydx_out=None,d2ydx2_out=None):
+        '''
+        Returns the level, first derivative and/or second derivative of the
+        function at each value in x, finding the segment of each value only once
+        and evaluating the cubics by Horner's rule.  Only called internally by
+        HARKinterpolator1D.__call__ (etc).
+
+        Parameters
+        ----------
+        x : scalar or np.array
+            Set of points where we want to evaluate the interpolated function.
+        _eval : boolean
+            Indicator for whether to evalute the level of the interpolated function.
+        _Der : boolean
+            Indicator for whether to evaluate the derivative of the interpolated function.
+        _Der2 : boolean
+            Indicator for whether to evaluate the second derivative of the
+            interpolated function.
+        y_out : np.array or None
+            Array in which to put the level of the function, if any.
+        dydx_out : np.array or None
+            Array in which to put the derivative of the function, if any.
+        d2ydx2_out : np.array or None
+            Array in which to put the second derivative of the function, if any.
+
+        Returns
+        -------
+        A list including the level, derivative and/or second derivative of the
+        interpolated function where requested.
+        '''
+        if _isscalar(x):
+            return [f[0] for f in self._evalOrDer(np.array([x],dtype=float),_eval,_Der,_Der2)]
+        j = self._findSegments(x)
+        j -= 1
+        first = 0 if _eval else (1 if _Der else 2)
+        c = [None]*first + [self.poly[:,k].take(j) for k in range(first,4)]
+        t = x - self.x_list.take(j)
+
+        output = []
+        if _eval:
+            y = np.multiply(c[3],t,out=y_out)
+            y += c[2]
+            y *= t
+            y += c[1]
+            y *= t
+            y += c[0]
+            output.append(y)
+        if _Der:
+            dydx = np.multiply(c[3],3.0*t,out=dydx_out)
+            dydx += 2.0*c[2]
+            dydx *= t
+            dydx += c[1]
+            output.append(dydx)
+        if _Der2:
+            d2ydx2 = np.multiply(c[3],6.0*t,out=d2ydx2_out)
+            d2ydx2 += 2.0*c[2]
+            output.append(d2ydx2)
+        if x.size == 0:
+            return output
+
+        # Points at or below the bottom gridpoint use the lower extrapolation
+        if np.fmin.reduce(x) <= self.x_list[0]:
+            out_bot = x <= self.x_list[0]
+            c = self.coeffs[0]
+            k = 0
+            if _eval:
+                output[k][out_bot] = c[0] + c[1]*(x[out_bot] - self.x_list[0])
+                k += 1
+            if _Der:
+                output[k][out_bot] = c[1]
+                k += 1
+            if _Der2:
+                output[k][out_bot] = 0.0*c[1]
+
+        # Points above the top gridpoint decay toward the limiting linear function
+        if np.fmax.reduce(x) > self.x_list[-1]:
+            out_top = x > self.x_list[-1]
+            x_top = x[out_top]
+            c = self.coeffs[self.n]
+            decay = np.exp((x_top - self.x_list[-1])*c[3])
+            k = 0
+            if _eval:
+                output[k][out_top] = c[0] + x_top*c[1] - c[2]*decay
+                k += 1
+            if _Der:
+                output[k][out_top] = c[1] - c[2]*c[3]*decay
+                k += 1
+            if _Der2:
+                output[k][out_top] = -c[2]*c[3]**2*decay
+        return output
+
+    def eval_with_derivatives(self,x):
+        '''
+        Evaluates the interpolated function and its first and second derivatives
+        at the given input, finding the segment of each point only once.
+
+        Parameters
+        ----------
+        x : np.array or float
+            Real values to be evaluated in the interpolated function.
+
+        Returns
+        -------
+        y : np.array or float
+            The interpolated function evaluated at x: y = f(x), with the same
+            shape as x.
+        dydx : np.array or float
+            The interpolated function's first derivative evaluated at x:
+            dydx = f'(x), with the same shape as x.
+        d2ydx2 : np.array or float
+            The interpolated function's second derivative evaluated at x:
+            d2ydx2 = f''(x), with the same shape as x.
+        '''
+        z = np.asarray(x)
+        y, dydx, d2ydx2 = self._evalOrDer(z.flatten(),True,True,True)
+        return y.reshape(z.shape), dydx.reshape(z.shape), d2ydx2.reshape(z.shape)
+
+    def _evalInto(self,x,y_out,dydx_out):
+        '''
+        Puts the level and/or first derivative of the function at each value in x
+        into y_out and dydx_out.  Only called internally by HARKinterpolator1D.eval_into.
+        '''
+        self._evalOrDer(x,y_out is not None,dydx_out is not None,False,y_out,dydx_out)
 
     def _evaluate(self,x):
         '''
         Returns the level of the interpolated function at each value in x.  Only
         called internally by HARKinterpolator1D.__call__ (etc).
         '''
-        if _isscalar(x):
-            pos = np.searchsorted(self.x_list,x)
-            if pos == 0:
-                y = self.coeffs[0,0] + self.coeffs[0,1]*(x - self.x_list[0])
-            elif (pos < self.n):
-                alpha = (x - self.x_list[pos-1])/(self.x_list[pos] - self.x_list[pos-1])
-                y = self.coeffs[pos,0] + alpha*(self.coeffs[pos,1] + alpha*(self.coeffs[pos,2] + alpha*self.coeffs[pos,3]))
-            else:
-                alpha = x - self.x_list[self.n-1]
-                y = self.coeffs[pos,0] + x*self.coeffs[pos,1] - self.coeffs[pos,2]*np.exp(alpha*self.coeffs[pos,3])
-        else:
-            m = len(x)
-            pos = np.searchsorted(self.x_list,x)
-            y = np.zeros(m)
-            if y.size > 0:
-                out_bot   = pos == 0
-                out_top   = pos == self.n
-                in_bnds   = np.logical_not(np.logical_or(out_bot, out_top))
-
-                # Do the "in bounds" evaluation points
-                i = pos[in_bnds]
-                coeffs_in = self.coeffs[i,:]
-                alpha = (x[in_bnds] - self.x_list[i-1])/(self.x_list[i] - self.x_list[i-1])
-                y[in_bnds] = coeffs_in[:,0] + alpha*(coeffs_in[:,1] + alpha*(coeffs_in[:,2] + alpha*coeffs_in[:,3]))
-
-                # Do the "out of bounds" evaluation points
-                y[out_bot] = self.coeffs[0,0] + self.coeffs[0,1]*(x[out_bot] - self.x_list[0])
-                alpha = x[out_top] - self.x_list[self.n-1]
-                y[out_top] = self.coeffs[self.n,0] + x[out_top]*self.coeffs[self.n,1] - self.coeffs[self.n,2]*np.exp(alpha*self.coeffs[self.n,3])
-        return y
+        return self._evalOrDer(x,True,False)[0]
 
     def _der(self,x):
         '''
         Returns the first derivative of the interpolated function at each value
         in x. Only called internally by HARKinterpolator1D.derivative (etc).
         '''
-        if _isscalar(x):
-            pos = np.searchsorted(self.x_list,x)
-            if pos == 0:
-                dydx = self.coeffs[0,1]
-            elif (pos < self.n):
-                alpha = (x - self.x_list[pos-1])/(self.x_list[pos] - self.x_list[pos-1])
-                dydx = (self.coeffs[pos,1] + alpha*(2*self.coeffs[pos,2] + alpha*3*self.coeffs[pos,3]))/(self.x_list[pos] - self.x_list[pos-1])
-            else:
-                alpha = x - self.x_list[self.n-1]
-                dydx = self.coeffs[pos,1] - self.coeffs[pos,2]*self.coeffs[pos,3]*np.exp(alpha*self.coeffs[pos,3])
-        else:
-            m = len(x)
-            pos = np.searchsorted(self.x_list,x)
-            dydx = np.zeros(m)
-            if dydx.size > 0:
-                out_bot   = pos == 0
-                out_top   = pos == self.n
-                in_bnds   = np.logical_not(np.logical_or(out_bot, out_top))
-
-                # Do the "in bounds" evaluation points
-                i = pos[in_bnds]
-                coeffs_in = self.coeffs[i,:]
-                alpha = (x[in_bnds] - self.x_list[i-1])/(self.x_list[i] - self.x_list[i-1])
-                dydx[in_bnds] = (coeffs_in[:,1] + alpha*(2*coeffs_in[:,2] + alpha*3*coeffs_in[:,3]))/(self.x_list[i] - self.x_list[i-1])
-
-                # Do the "out of bounds" evaluation points
-                dydx[out_bot] = self.coeffs[0,1]
-                alpha = x[out_top] - self.x_list[self.n-1]
-                dydx[out_top] = self.coeffs[self.n,1] - self.coeffs[self.n,2]*self.coeffs[self.n,3]*np.exp(alpha*self.coeffs[self.n,3])
-        return dydx
-
+        return self._evalOrDer(x,False,True)[0]
 
     def _evalAndDer(self,x):
         '''
         Returns the level and first derivative of the function at each value in
         x.  Only called internally by HARKinterpolator1D.eval_and_der (etc).
         '''
-        if _isscalar(x):
-            pos = np.searchsorted(self.x_list,x)
-            if pos == 0:
-                y = self.coeffs[0,0] + self.coeffs[0,1]*(x - self.x_list[0])
-                dydx = self.coeffs[0,1]
-            elif (pos < self.n):
-                alpha = (x - self.x_list[pos-1])/(self.x_list[pos] - self.x_list[pos-1])
-                y = self.coeffs[pos,0] + alpha*(self.coeffs[pos,1] + alpha*(self.coeffs[pos,2] + alpha*self.coeffs[pos,3]))
-                dydx = (self.coeffs[pos,1] + alpha*(2*self.coeffs[pos,2] + alpha*3*self.coeffs[pos,3]))/(self.x_list[pos] - self.x_list[pos-1])
-            else:
-                alpha = x - self.x_list[self.n-1]
-                y = self.coeffs[pos,0] + x*self.coeffs[pos,1] - self.coeffs[pos,2]*np.exp(alpha*self.coeffs[pos,3])
-                dydx = self.coeffs[pos,1] - self.coeffs[pos,2]*self.coeffs[pos,3]*np.exp(alpha*self.coeffs[pos,3])
-        else:
-            m = len(x)
-            pos = np.searchsorted(self.x_list,x)
-            y = np.zeros(m)
-            dydx = np.zeros(m)
-            if y.size > 0:
-                out_bot   = pos == 0
-                out_top   = pos == self.n
-                in_bnds   = np.logical_not(np.logical_or(out_bot, out_top))
-
-                # Do the "in bounds" evaluation points
-                i = pos[in_bnds]
-                coeffs_in = self.coeffs[i,:]
-                alpha = (x[in_bnds] - self.x_list[i-1])/(self.x_list[i] - self.x_list[i-1])
-                y[in_bnds] = coeffs_in[:,0] + alpha*(coeffs_in[:,1] + alpha*(coeffs_in[:,2] + alpha*coeffs_in[:,3]))
-                dydx[in_bnds] = (coeffs_in[:,1] + alpha*(2*coeffs_in[:,2] + alpha*3*coeffs_in[:,3]))/(self.x_list[i] - self.x_list[i-1])
-
-                # Do the "out of bounds" evaluation points
-                y[out_bot] = self.coeffs[0,0] + self.coeffs[0,1]*(x[out_bot] - self.x_list[0])
-                dydx[out_bot] = self.coeffs[0,1]
-                alpha = x[out_top] - self.x_list[self.n-1]
-                y[out_top] = self.coeffs[self.n,0] + x[out_top]*self.coeffs[self.n,1] - self.coeffs[self.n,2]*np.exp(alpha*self.coeffs[self.n,3])
-                dydx[out_top] = self.coeffs[self.n,1] - self.coeffs[self.n,2]*self.coeffs[self.n,3]*np.exp(alpha*self.coeffs[self.n,3])
+        y, dydx = self._evalOrDer(x,True,True)
         return y, dydx
 
 
-
 class BilinearInterp(HARKinterpolator2D):
     '''
     Bilinear full (or tensor) grid interpolation of a function f(x,y).
@@ -1132,10 +1565,20 @@ class BilinearInterp(HARKinterpolator2D):
         dfdy = (
               ((1-alpha)*self.f_values[x_pos-1,y_pos]
             +  alpha*self.f_values[x_pos,y_pos]) -
-              ((1-alpha)*self.f_values[x_pos-1,y_pos]
-            +  alpha*self.f_values[x_pos-1,y_pos-1]))/(self.y_list[y_pos] - self.y_list[y_pos-1])
+              ((1-alpha)*self.f_values[x_pos-1,y_pos-1]
+            +  alpha*self.f_values[x_pos,y_pos-1]))/(self.y_list[y_pos] - self.y_list[y_pos-1])
         return dfdy
 
+    def _evalAndGrad(self,x,y):
+        '''
+        Returns the level of the interpolated function and its derivatives with
+        respect to x and y at each value in x,y. Only called internally by
+        HARKinterpolator2D.eval_with_gradient.
+        '''
+        f, grad = _multilinearEvalAndGrad(self.f_values,[self.x_list,self.y_list],
+                                          [x,y],[self.xSearchFunc,self.ySearchFunc])
+        return tuple([f] + grad)
+
 
 class TrilinearInterp(HARKinterpolator3D):
     '''
@@ -1318,6 +1761,16 @@ class TrilinearInterp(HARKinterpolator3D):
            +  alpha*beta*self.f_values[x_pos,y_pos,z_pos-1]))/(self.z_list[z_pos] - self.z_list[z_pos-1])
         return dfdz
 
+    def _evalAndGrad(self,x,y,z):
+        '''
+        Returns the level of the interpolated function and its derivatives with
+        respect to x, y and z at each value in x,y,z. Only called internally by
+        HARKinterpolator3D.eval_with_gradient.
+        '''
+        f, grad = _multilinearEvalAndGrad(self.f_values,[self.x_list,self.y_list,self.z_list],
+                                          [x,y,z],[self.xSearchFunc,self.ySearchFunc,self.zSearchFunc])
+        return tuple([f] + grad)
+
 
 class QuadlinearInterp(HARKinterpolator4D):
     '''
@@ -1631,6 +2084,16 @@ class QuadlinearInterp(HARKinterpolator4D):
               )/(self.z_list[l] - self.z_list[l-1])
         return dfdz
 
+    def _evalAndGrad(self,w,x,y,z):
+        '''
+        Returns the level of the interpolated function and its derivatives with
+        respect to w, x, y and z at each value in w,x,y,z. Only called internally
+        by HARKinterpolator4D.eval_with_gradient.
+        '''
+        f, grad = _multilinearEvalAndGrad(self.f_values,[self.w_list,self.x_list,self.y_list,self.z_list],
+                                          [w,x,y,z],[self.wSearchFunc,self.xSearchFunc,self.ySearchFunc,self.zSearchFunc])
+        return tuple([f] + grad)
+
 
 class LowerEnvelope(HARKinterpolator1D):
     '''
@@ -1700,42 +2163,176 @@ class LowerEnvelope(HARKinterpolator1D):
         return y,dydx
 
 
-class UpperEnvelope(HARKinterpolator1D):
+class KinkedLinearInterp(LinearInterp):
     '''
-    The upper envelope of a finite set of 1D functions, each of which can be of
-    any class that has the methods __call__, derivative, and eval_with_derivative.
-    Generally: it combines HARKinterpolator1Ds.
+    The lower envelope of a LinearInterp and a straight line that starts at some
+    point, stored as a single piecewise linear interpolation.  This is the form
+    of a consumption function with a borrowing constraint, where the line is the
+    constrained consumption function c = m - mNrmMin: the points where the two
+    functions cross are found once when the envelope is made, so it can be
+    evaluated (with its derivative) with one search rather than by evaluating
+    both functions and comparing them.  It gives the same results as
+    LowerEnvelope(func,line), including below the start of the line (where it is
+    func) and above the top gridpoint of func (where func is extrapolated).
     '''
     distance_criteria = ['functions']
 
-    def __init__(self,*functions):
+    def __init__(self,func,line):
         '''
-        Constructor to make a new upper envelope iterpolation.
+        Make a new kinked linear interpolation.
 
         Parameters
         ----------
-        *functions : function
-            Any number of real functions; often instances of HARKinterpolator1D
+        func : LinearInterp
+            A linear interpolation without lower extrapolation; may have a decay
+            extrapolation.
+        line : LinearInterp
+            A linear interpolation with two gridpoints and no lower extrapolation
+            or decay extrapolation, starting between the first and last gridpoints
+            of func (see canFuse).
 
         Returns
         -------
-        new instance of UpperEnvelope
-        '''
-        self.functions = []
-        for function in functions:
-            self.functions.append(function)
-        self.funcCount = len(self.functions)
+        new instance of KinkedLinearInterp
+        '''
+        self.functions = [func,line]
+        self.funcCount = 2
+
+        # Find the envelope at the gridpoints of func above the start of the line
+        x_start = line.x_list[0]
+        x_grid = np.concatenate(([x_start],func.x_list[func.x_list > x_start]))
+        func_vals = func(x_grid)
+        line_vals = line(x_grid)
+        y_grid = np.minimum(func_vals,line_vals)
+
+        # Add the points where the functions cross between gridpoints
+        gap = func_vals - line_vals
+        cross = np.nonzero(gap[:-1]*gap[1:] < 0.)[0]
+        if cross.size > 0:
+            x_cross = x_grid[cross] + (x_grid[cross+1] - x_grid[cross])*gap[cross]/(gap[cross] - gap[cross+1])
+            y_cross = line(x_cross)
+            x_grid = np.insert(x_grid,cross+1,x_cross)
+            y_grid = np.insert(y_grid,cross+1,y_cross)
+            distinct = np.concatenate(([True],x_grid[1:] > x_grid[:-1]))
+            x_grid = x_grid[distinct]
+            y_grid = y_grid[distinct]
+
+        LinearInterp.__init__(self,x_grid,y_grid)
+        self.func_below = x_start > func.x_list[0]
+
+    @staticmethod
+    def canFuse(func,line):
+        '''
+        Checks whether the lower envelope of two functions can be represented as
+        a KinkedLinearInterp.
 
-    def _evaluate(self,x):
+        Parameters
+        ----------
+        func : function
+            A function that should be a LinearInterp without lower extrapolation.
+        line : function
+            A function that should be a LinearInterp with two gridpoints and no
+            lower or decay extrapolation, starting between the first and last
+            gridpoints of func.
+
+        Returns
+        -------
+        can_fuse : boolean
+            Whether KinkedLinearInterp(func,line) can be made.
         '''
-        Returns the level of the function at each value in x as the maximum among
-        all of the functions.  Only called internally by HARKinterpolator1D.__call__.
+        if type(func) is not LinearInterp or type(line) is not LinearInterp:
+            return False
+        if func.lower_extrap or line.lower_extrap or line.decay_extrap or line.x_n != 2:
+            return False
+        return func.x_list[0] <= line.x_list[0] < func.x_list[-1]
+
+    def _evalOrDer(self,x,_eval,_Der,y_out=None,dydx_out=None):
         '''
-        if _isscalar(x):
-            y = np.nanmax([f(x) for f in self.functions])
-        else:
-            m = len(x)
-            fx = np.zeros((m,self.funcCount))
+        Returns the level and/or first derivative of the function at each value in
+        x.  Only called internally by HARKinterpolator1D.eval_and_der (etc).  See
+        LinearInterp._evalOrDer for the arguments and outputs.
+        '''
+        output = LinearInterp._evalOrDer(self,x,_eval,_Der,y_out,dydx_out)
+        if x.size == 0:
+            return output
+        func, line = self.functions
+
+        # Below the start of the line, only func is defined
+        if self.func_below and np.fmin.reduce(x) < self.x_list[0]:
+            below = x < self.x_list[0]
+            output_below = func._evalOrDer(x[below],_eval,_Der)
+            for j in range(len(output)):
+                output[j][below] = output_below[j]
+
+        # Above the top gridpoint, func is extrapolated, and may cross the line again
+        if np.fmax.reduce(x) > self.x_list[-1]:
+            above = x > self.x_list[-1]
+            x_above = x[above]
+            func_above = func._evalOrDer(x_above,True,_Der)
+            line_above = line._evalOrDer(x_above,True,_Der)
+            use_line = line_above[0] < func_above[0]
+            for j in range(len(output)):
+                k = j if _eval else j+1
+                output[j][above] = np.where(use_line,line_above[k],func_above[k])
+        return output
+
+
+def makeLowerEnvelope(*functions):
+    '''
+    Makes the lower envelope of some functions, as a KinkedLinearInterp if that is
+    possible (see KinkedLinearInterp.canFuse) or a LowerEnvelope otherwise.
+
+    Parameters
+    ----------
+    *functions : function
+        Any number of real functions; often instances of HARKinterpolator1D
+
+    Returns
+    -------
+    envelope : KinkedLinearInterp or LowerEnvelope
+        The lower envelope of the functions.
+    '''
+    if len(functions) == 2 and KinkedLinearInterp.canFuse(*functions):
+        return KinkedLinearInterp(*functions)
+    return LowerEnvelope(*functions)
+
+
+class UpperEnvelope(HARKinterpolator1D):
+    '''
+    The upper envelope of a finite set of 1D functions, each of which can be of
+    any class that has the methods __call__, derivative, and eval_with_derivative.
+    Generally: it combines HARKinterpolator1Ds.
+    '''
+    distance_criteria = ['functions']
+
+    def __init__(self,*functions):
+        '''
+        Constructor to make a new upper envelope iterpolation.
+
+        Parameters
+        ----------
+        *functions : function
+            Any number of real functions; often instances of HARKinterpolator1D
+
+        Returns
+        -------
+        new instance of UpperEnvelope
+        '''
+        self.functions = []
+        for function in functions:
+            self.functions.append(function)
+        self.funcCount = len(self.functions)
+
+    def _evaluate(self,x):
+        '''
+        Returns the level of the function at each value in x as the maximum among
+        all of the functions.  Only called internally by HARKinterpolator1D.__call__.
+        '''
+        if _isscalar(x):
+            y = np.nanmax([f(x) for f in self.functions])
+        else:
+            m = len(x)
+            fx = np.zeros((m,self.funcCount))
             for j in range(self.funcCount):
                 fx[:,j] = self.functions[j](x)
             y = np.nanmax(fx,axis=1)
@@ -1768,6 +2365,309 @@ class UpperEnvelope(HARKinterpolator1D):
         return y,dydx
 
 
+class InterpolatorBank(HARKobject):
+    '''
+    A set of 1D functions packed into padded tables of polynomial coefficients,
+    so that they can be evaluated together with one vectorized gather: either
+    every function at the same points, or a different function at each point.
+    This replaces loops over the consumption functions for each Markov state,
+    preference shock or period, where each call pays its own overhead.
+
+    LinearInterp, CubicInterp and KinkedLinearInterp functions are packed into
+    the tables, giving the same results as evaluating them one at a time; any
+    other function is simply called on the points that use it.
+    '''
+    distance_criteria = ['functions']
+
+    def __init__(self,functions):
+        '''
+        Make a new interpolator bank.
+
+        Parameters
+        ----------
+        functions : [function]
+            The functions to pack, usually instances of HARKinterpolator1D.
+
+        Returns
+        -------
+        new instance of InterpolatorBank
+        '''
+        self.functions = list(functions)
+        self.N = len(self.functions)
+        rows = [self._makeRow(f) for f in self.functions]
+        seg_counts = [row['lo'].size for row in rows]
+        S = max(seg_counts)
+        self.seg_count = np.array(seg_counts)
+        self.seg_lo = np.zeros((self.N,S)) + np.nan
+        self.seg_hi = np.zeros((self.N,S)) + np.nan
+        self.poly = np.zeros((4,self.N,S)) + np.nan
+        for k, row in enumerate(rows):
+            n = seg_counts[k]
+            self.seg_lo[k,:n] = row['lo']
+            self.seg_hi[k,:n] = row['hi']
+            self.poly[:,k,:n] = 0.0
+            for j, coeffs in enumerate(row['poly']):
+                self.poly[j,k,:n] = coeffs
+        self.cubic = any(row['cubic'] for row in rows)
+
+        # All rows' interior segment boundaries in one ragged array, keyed by
+        # row in the real part and x in the imaginary part; numpy orders complex
+        # numbers lexicographically, so one searchsorted finds every point's
+        # segment within its own row
+        self.seg_offset = np.cumsum(np.concatenate(([0],self.seg_count[:-1]-1)))
+        self.seg_keys = self._makeKeys(np.repeat(np.arange(self.N),self.seg_count-1),
+                                       np.concatenate([row['hi'][:-1] for row in rows]))
+        for name in ['lower_cut','lower_nan','upper_top','intercept','slope','decay_A',
+                     'decay_rate','exact_top']:
+            setattr(self,name,np.array([row[name] for row in rows]))
+
+    @staticmethod
+    def _makeRow(func):
+        '''
+        Describes one function as a row of the bank's tables: segments (lo,hi]
+        with a cubic in (x-lo) on each (given by its nonzero coefficients), a
+        cutoff below which the function is NaN or extrapolated linearly from the
+        first segment, a decay extrapolation above the top, and a point above
+        which the function itself is called.
+        '''
+        row = dict(cubic=False,lower_cut=-np.inf,lower_nan=False,upper_top=np.inf,
+                   intercept=0.,slope=0.,decay_A=0.,decay_rate=0.,exact_top=np.inf)
+        if type(func) is LinearInterp:
+            row['lo'] = func.x_list[:-1]
+            row['hi'] = func.x_list[1:]
+            row['poly'] = [func.y_list[:-1],func.slopes]
+            if not func.lower_extrap:
+                row.update(lower_cut=func.x_list[0],lower_nan=True)
+            if func.decay_extrap:
+                row.update(upper_top=func.x_list[-1],intercept=func.intercept_limit,slope=func.slope_limit,
+                           decay_A=func.decay_extrap_A,decay_rate=-func.decay_extrap_B)
+        elif type(func) is CubicInterp:
+            top = func.coeffs[func.n]
+            row['lo'] = func.x_list[:-1]
+            row['hi'] = func.x_list[1:]
+            row['poly'] = func.poly.T
+            row.update(cubic=True,lower_cut=np.nextafter(func.x_list[0],np.inf),
+                       lower_nan=np.isnan(func.coeffs[0,0]),upper_top=func.x_list[-1],
+                       intercept=top[0],slope=top[1],decay_A=top[2],decay_rate=top[3])
+        elif type(func) is KinkedLinearInterp:
+            # Below the start of the line the function is func, whose last segment
+            # there is cut off just short of the start of the line
+            below = func.functions[0]
+            i = np.searchsorted(below.x_list,func.x_list[0]) if func.func_below else 0
+            hi_below = np.append(below.x_list[1:i],np.nextafter(func.x_list[0],-np.inf))[:i]
+            row['lo'] = np.concatenate((below.x_list[:i],func.x_list[:-1]))
+            row['hi'] = np.concatenate((hi_below,func.x_list[1:]))
+            row['poly'] = [np.concatenate((below.y_list[:i],func.y_list[:-1])),
+                           np.concatenate((below.slopes[:i],func.slopes))]
+            row.update(lower_cut=row['lo'][0],lower_nan=True,exact_top=func.x_list[-1])
+        else:
+            # Call the function itself at every point
+            row.update(lo=np.zeros(1),hi=np.zeros(1),poly=[np.zeros(1)+np.nan]*2,exact_top=-np.inf)
+        return row
+
+    def _findSegments(self,k,x):
+        '''
+        Returns the index of the segment of row k in which each value of x lies,
+        using the first segment for values below it and the last for values above.
+        '''
+        return np.searchsorted(self.seg_hi[k,:(self.seg_count[k]-1)],x)
+
+    @staticmethod
+    def _makeKeys(rows,x):
+        '''
+        Combines row indices and values of x into complex search keys, setting
+        the parts directly so that infinite values of x are kept as they are.
+        '''
+        keys = np.empty(x.size,dtype=complex)
+        keys.real = rows
+        keys.imag = x
+        return keys
+
+    def _findSegmentsByIndex(self,rows,x):
+        '''
+        Returns the index of the segment of row rows[i] in which x[i] lies, for
+        each i, with one search of the ragged array of all rows' boundaries.
+        Matches _findSegments row by row, including for NaN values of x.
+        '''
+        seg = np.searchsorted(self.seg_keys,self._makeKeys(rows,x)) - self.seg_offset[rows]
+        return np.minimum(seg,self.seg_count[rows]-1)
+
+    def _evalTable(self,rows,x,seg,_eval,_Der):
+        '''
+        Evaluates the level and/or first derivative of function rows[i] at x[i]
+        from the tables, given the segment of each point, then calls the functions
+        themselves for any points they don't cover.  Returns a list of the
+        requested outputs, each with the same shape as x.
+        '''
+        t = x - self.seg_lo[rows,seg]
+        c1 = self.poly[1][rows,seg]
+        if self.cubic:
+            c2 = self.poly[2][rows,seg]
+            c3 = self.poly[3][rows,seg]
+        output = []
+        if _eval:
+            c0 = self.poly[0][rows,seg]
+            if self.cubic:
+                y = c3*t
+                y += c2
+                y *= t
+                y += c1
+            else:
+                y = c1.copy()
+            y *= t
+            y += c0
+            output.append(y)
+        if _Der:
+            if self.cubic:
+                dydx = c3*(3.0*t)
+                dydx += 2.0*c2
+                dydx *= t
+                dydx += c1
+            else:
+                dydx = c1
+            output.append(dydx)
+        if x.size == 0:
+            return output
+
+        # Below the bottom of each function: NaN, or a linear extrapolation
+        below = x < self.lower_cut[rows]
+        if np.any(below):
+            is_nan = self.lower_nan[rows[below]]
+            k = 0
+            if _eval:
+                output[k][below] = np.where(is_nan,np.nan,c0[below] + c1[below]*t[below])
+                k += 1
+            if _Der:
+                output[k][below] = np.where(is_nan,np.nan,c1[below])
+
+        # Above the top of each function: decay toward a limiting linear function
+        above = x > self.upper_top[rows]
+        if np.any(above):
+            r = rows[above]
+            x_above = x[above]
+            decay = np.exp((x_above - self.upper_top[r])*self.decay_rate[r])
+            k = 0
+            if _eval:
+                output[k][above] = self.intercept[r] + x_above*self.slope[r] - self.decay_A[r]*decay
+                k += 1
+            if _Der:
+                output[k][above] = self.slope[r] - self.decay_A[r]*self.decay_rate[r]*decay
+
+        # Points that the tables don't cover are evaluated by the function itself
+        exact = x > self.exact_top[rows]
+        if np.any(exact):
+            for j in np.unique(rows[exact]):
+                these = np.logical_and(exact,rows == j)
+                x_these = x[these]
+                func = self.functions[j]
+                if _eval and _Der:
+                    out_these = func.eval_with_derivative(x_these)
+                elif _eval:
+                    out_these = [func(x_these)]
+                else:
+                    out_these = [func.derivative(x_these)]
+                for f, f_these in zip(output,out_these):
+                    f[these] = f_these
+        return output
+
+    def evalAll(self,x,with_der=False):
+        '''
+        Evaluates every function in the bank at the same points.
+
+        Parameters
+        ----------
+        x : np.array or float
+            Values at which to evaluate the functions.
+        with_der : boolean
+            Whether to also return the derivatives of the functions.
+
+        Returns
+        -------
+        y : np.array
+            Array of shape (N,) + x.shape, where y[k] is the k-th function
+            evaluated at x.
+        dydx : np.array
+            Array of the same shape as y with the functions' derivatives at x;
+            only returned if with_der is True.
+        '''
+        xa = np.asarray(x,dtype=float)
+        x_flat = xa.flatten()
+        m = x_flat.size
+        seg = np.empty((self.N,m),dtype=int)
+        for k in xrange(self.N):
+            seg[k] = self._findSegments(k,x_flat)
+        rows = np.tile(np.arange(self.N).reshape((self.N,1)),(1,m))
+        x_all = np.tile(x_flat,(self.N,1))
+        output = self._evalTable(rows,x_all,seg,True,with_der)
+        output = [f.reshape((self.N,) + xa.shape) for f in output]
+        if with_der:
+            return output[0], output[1]
+        return output[0]
+
+    def evalByIndex(self,k,x,with_der=False):
+        '''
+        Evaluates the k[i]-th function in the bank at x[i], for each i.
+
+        Parameters
+        ----------
+        k : np.array
+            Indices of the functions to use, between 0 and N-1.
+        x : np.array
+            Values at which to evaluate the functions; should be the same size
+            as k.
+        with_der : boolean
+            Whether to also return the derivatives of the functions.
+
+        Returns
+        -------
+        y : np.array
+            Array of the same shape as x, with y[i] = functions[k[i]](x[i]).
+        dydx : np.array
+            Array of the same shape as x with the functions' derivatives; only
+            returned if with_der is True.
+        '''
+        xa = np.asarray(x,dtype=float)
+        x_flat = xa.flatten()
+        rows = np.asarray(k,dtype=int).flatten()
+        if self.N == 1:
+            seg = self._findSegments(0,x_flat)
+        else:
+            seg = self._findSegmentsByIndex(rows,x_flat)
+        output = self._evalTable(rows,x_flat,seg,True,with_der)
+        output = [f.reshape(xa.shape) for f in output]
+        if with_der:
+            return output[0], output[1]
+        return output[0]
+
+
+def _lowerEnvelopeEvalAndGrad(functions,*args):
+    '''
+    Evaluates the lower envelope of a set of functions and its gradient, taking
+    the gradient of whichever function is lowest at each point.  Each function
+    is evaluated only once, with its gradient.
+
+    Parameters
+    ----------
+    functions : [function]
+        Functions of two or more variables, often HARKinterpolator2Ds or
+        HARKinterpolator3Ds.
+    *args : np.array
+        Values at which to evaluate the functions.
+
+    Returns
+    -------
+    out : tuple
+        The lower envelope and its derivatives with respect to each input.
+    '''
+    m = len(args[0])
+    out = [np.array(o) for o in zip(*[_evalWithGradient(func,*args) for func in functions])]
+    temp = out[0].copy()
+    temp[np.isnan(temp)] = np.inf
+    i = np.argmin(temp,axis=0)
+    j = np.arange(m)
+    return tuple(f[i,j] for f in out)
+
+
 class LowerEnvelope2D(HARKinterpolator2D):
     '''
     The lower envelope of a finite set of 2D functions, each of which can be of
@@ -1838,13 +2738,20 @@ class LowerEnvelope2D(HARKinterpolator2D):
             temp[:,j] = self.functions[j](x,y)
         temp[np.isnan(temp)] = np.inf
         i = np.argmin(temp,axis=1)
-        y = temp[np.arange(m),i]
         dfdy = np.zeros_like(x)
         for j in range(self.funcCount):
             c = i == j
             dfdy[c] = self.functions[j].derivativeY(x[c],y[c])
         return dfdy
 
+    def _evalAndGrad(self,x,y):
+        '''
+        Returns the level of the function and its derivatives with respect to
+        x and y at each value in (x,y).  Only called internally by
+        HARKinterpolator2D.eval_with_gradient.
+        '''
+        return _lowerEnvelopeEvalAndGrad(self.functions,x,y)
+
 
 class LowerEnvelope3D(HARKinterpolator3D):
     '''
@@ -1916,7 +2823,6 @@ class LowerEnvelope3D(HARKinterpolator3D):
             temp[:,j] = self.functions[j](x,y,z)
         temp[np.isnan(temp)] = np.inf
         i = np.argmin(temp,axis=1)
-        y = temp[np.arange(m),i]
         dfdy = np.zeros_like(x)
         for j in range(self.funcCount):
             c = i == j
@@ -1934,13 +2840,20 @@ class LowerEnvelope3D(HARKinterpolator3D):
             temp[:,j] = self.functions[j](x,y,z)
         temp[np.isnan(temp)] = np.inf
         i = np.argmin(temp,axis=1)
-        y = temp[np.arange(m),i]
         dfdz = np.zeros_like(x)
         for j in range(self.funcCount):
             c = i == j
             dfdz[c] = self.functions[j].derivativeZ(x[c],y[c],z[c])
         return dfdz
 
+    def _evalAndGrad(self,x,y,z):
+        '''
+        Returns the level of the function and its derivatives with respect to
+        x, y and z at each value in (x,y,z).  Only called internally by
+        HARKinterpolator3D.eval_with_gradient.
+        '''
+        return _lowerEnvelopeEvalAndGrad(self.functions,x,y,z)
+
 
 class VariableLowerBoundFunc2D(HARKobject):
     '''
@@ -2034,6 +2947,34 @@ class VariableLowerBoundFunc2D(HARKobject):
         dfdy_out = self.func.derivativeY(x-xShift,y) - xShiftDer*self.func.derivativeX(x-xShift,y)
         return dfdy_out
 
+    def eval_with_gradient(self,x,y):
+        '''
+        Evaluate the function and its first derivatives with respect to x and y
+        at given state space points, shifting by the lower bound only once.
+
+        Parameters
+        ----------
+        x : np.array
+             First input values.
+        y : np.array
+             Second input values; should be of same shape as x.
+
+        Returns
+        -------
+        f_out : np.array
+            Function evaluated at (x,y), of same shape as inputs.
+        dfdx_out : np.array
+            First derivative of function with respect to the first input,
+            evaluated at (x,y), of same shape as inputs.
+        dfdy_out : np.array
+            First derivative of function with respect to the second input,
+            evaluated at (x,y), of same shape as inputs.
+        '''
+        xShift,xShiftDer = self.lowerBound.eval_with_derivative(y)
+        f_out, dfdx_out, dfdy = _evalWithGradient(self.func,x-xShift,y)
+        dfdy_out = dfdy - xShiftDer*dfdx_out
+        return f_out, dfdx_out, dfdy_out
+
 
 class VariableLowerBoundFunc3D(HARKobject):
     '''
@@ -2158,6 +3099,183 @@ class VariableLowerBoundFunc3D(HARKobject):
         dfdz_out = self.func.derivativeZ(x-xShift,y,z)
         return dfdz_out
 
+    def eval_with_gradient(self,x,y,z):
+        '''
+        Evaluate the function and its first derivatives with respect to x, y and
+        z at given state space points, shifting by the lower bound only once.
+
+        Parameters
+        ----------
+        x : np.array
+             First input values.
+        y : np.array
+             Second input values; should be of same shape as x.
+        z : np.array
+             Third input values; should be of same shape as x.
+
+        Returns
+        -------
+        f_out : np.array
+            Function evaluated at (x,y,z), of same shape as inputs.
+        dfdx_out : np.array
+            First derivative of function with respect to the first input,
+            evaluated at (x,y,z), of same shape as inputs.
+        dfdy_out : np.array
+            First derivative of function with respect to the second input,
+            evaluated at (x,y,z), of same shape as inputs.
+        dfdz_out : np.array
+            First derivative of function with respect to the third input,
+            evaluated at (x,y,z), of same shape as inputs.
+        '''
+        xShift,xShiftDer = self.lowerBound.eval_with_derivative(y)
+        f_out, dfdx_out, dfdy, dfdz_out = _evalWithGradient(self.func,x-xShift,y,z)
+        dfdy_out = dfdy - xShiftDer*dfdx_out
+        return f_out, dfdx_out, dfdy_out, dfdz_out
+
+
+def _groupByBracket(pos,n):
+    '''
+    Sorts points by the bracket of a grid they lie in, so that the points in each
+    bracket can be handled together as a contiguous slice.
+
+    Parameters
+    ----------
+    pos : np.array
+        Integer bracket index of each point, between 0 and n-1.
+    n : int
+        Number of brackets.
+
+    Returns
+    -------
+    order : np.array
+        Indices that sort the points by bracket.
+    bounds : np.array
+        Array of size n+1; the points in bracket i are order[bounds[i]:bounds[i+1]].
+    '''
+    order = np.argsort(pos)
+    bounds = np.zeros(n+1,dtype=int)
+    np.cumsum(np.bincount(pos,minlength=n),out=bounds[1:])
+    return order, bounds
+
+def _evalOnBrackets(funcs,x,pos,with_der=False):
+    '''
+    Evaluates funcs[i-1] and funcs[i] at each value of x whose bracket is i, for
+    interpolating among the functions.  The values are sorted by bracket, so
+    each function is evaluated only once, on the contiguous slice of values in
+    the two brackets it bounds.
+
+    Parameters
+    ----------
+    funcs : [function]
+        Functions of one variable, one for each gridpoint; HARKinterpolator1Ds
+        if with_der is True.
+    x : np.array
+        Values at which to evaluate the functions.
+    pos : np.array
+        Index of the bracket of each value, between 1 and len(funcs)-1.
+    with_der : boolean
+        Whether to also return the derivatives of the functions, computed
+        together with their levels.
+
+    Returns
+    -------
+    order : np.array
+        Indices that sort the values by bracket.
+    f_lo : np.array
+        funcs[pos-1](x), in the order given by order.
+    f_hi : np.array
+        funcs[pos](x), in the order given by order.
+    d_lo : np.array
+        The derivative of funcs[pos-1] at x, in the order given by order; only
+        returned if with_der is True.
+    d_hi : np.array
+        The derivative of funcs[pos] at x, in the order given by order; only
+        returned if with_der is True.
+    '''
+    n = len(funcs)
+    n_out = 2 if with_der else 1
+    order, bounds = _groupByBracket(pos,n)
+    x_sorted = x[order]
+    out_lo = [np.empty(x.size) for a in range(n_out)]
+    out_hi = [np.empty(x.size) for a in range(n_out)]
+    for k in xrange(n):
+        start = bounds[k]
+        mid = bounds[k+1]
+        end = bounds[min(k+2,n)]
+        if end > start:
+            if with_der:
+                out_k = funcs[k]._evalAndDer(x_sorted[start:end])
+            else:
+                out_k = [funcs[k](x_sorted[start:end])]
+            for f_k,f_lo,f_hi in zip(out_k,out_lo,out_hi):
+                f_hi[start:mid] = f_k[:(mid-start)]
+                f_lo[mid:end] = f_k[(mid-start):]
+    if with_der:
+        return order, out_lo[0], out_hi[0], out_lo[1], out_hi[1]
+    return order, out_lo[0], out_hi[0]
+
+def _stackLinearInterps(interpolators):
+    '''
+    Checks whether a list of 1D interpolators are all LinearInterps on the same
+    grid, without decay extrapolation, so that they can be evaluated together
+    as a table; if so, stacks their levels and slopes into arrays.
+
+    Parameters
+    ----------
+    interpolators : [HARKinterpolator1D]
+        A list of 1D interpolators.
+
+    Returns
+    -------
+    stack : (LinearInterp, np.array, np.array) or None
+        The first interpolator, the levels of all interpolators (one row each)
+        and their slopes; None if the interpolators can't be stacked.
+    '''
+    first = interpolators[0]
+    for f in interpolators:
+        if type(f) is not LinearInterp or f.decay_extrap or f.lower_extrap != first.lower_extrap:
+            return None
+        if f.x_n != first.x_n or not np.array_equal(f.x_list,first.x_list):
+            return None
+    y_table = np.vstack([f.y_list for f in interpolators])
+    slope_table = np.vstack([f.slopes for f in interpolators])
+    return first, y_table, slope_table
+
+def _evalStacked(stack,x,rows,seg,deriv=False):
+    '''
+    Evaluates some of a set of stacked LinearInterps (see _stackLinearInterps),
+    giving the same results as LinearInterp.
+
+    Parameters
+    ----------
+    stack : (LinearInterp, np.array, np.array)
+        Stacked interpolators, as returned by _stackLinearInterps.
+    x : np.array
+        Values at which to evaluate the interpolators.
+    rows : np.array
+        Index of the interpolator to use for each value of x.
+    seg : np.array
+        Index of the grid segment of each value of x (from _findSegments, minus 1).
+    deriv : boolean
+        Whether to return the derivative rather than the level.
+
+    Returns
+    -------
+    f : np.array
+        The level (or derivative) of interpolator rows[k] at x[k], for each k.
+    '''
+    first, y_table, slope_table = stack
+    slope = slope_table[rows,seg]
+    if deriv:
+        f = slope
+    else:
+        f = x - first.x_list[seg]
+        f *= slope
+        f += y_table[rows,seg]
+    if not first.lower_extrap:
+        f[x < first.x_list[0]] = np.nan
+    return f
+
 
 class LinearInterpOnInterp1D(HARKinterpolator2D):
     '''
@@ -2185,6 +3303,70 @@ class LinearInterpOnInterp1D(HARKinterpolator2D):
         self.xInterpolators = xInterpolators
         self.y_list = y_values
         self.y_n = y_values.size
+        self.x_stack = _stackLinearInterps(xInterpolators)
+
+    def _findPos(self,y):
+        '''
+        Returns the index of the top of the bracket of y_list that each y lies in.
+        '''
+        y_pos = np.searchsorted(self.y_list,y)
+        y_pos[y_pos > self.y_n-1] = self.y_n-1
+        y_pos[y_pos < 1] = 1
+        return y_pos
+
+    def _evalBrackets(self,x,y_pos,deriv=False):
+        '''
+        Evaluates the x interpolators (or their derivatives) bracketing each point,
+        returning the results in the order given by order (None if unsorted).
+        '''
+        if self.x_stack is not None:
+            seg = self.x_stack[0]._findSegments(x) - 1
+            f_lo = _evalStacked(self.x_stack,x,y_pos-1,seg,deriv)
+            f_hi = _evalStacked(self.x_stack,x,y_pos,seg,deriv)
+            return None, f_lo, f_hi
+        if deriv:
+            funcs = [f._der for f in self.xInterpolators]
+        else:
+            funcs = self.xInterpolators
+        return _evalOnBrackets(funcs,x,y_pos)
+
+    def _evalBracketsWithDer(self,x,y_pos):
+        '''
+        Evaluates the x interpolators bracketing each point and their derivatives
+        together, returning the results in the order given by order (None if
+        unsorted).
+        '''
+        if self.x_stack is not None:
+            seg = self.x_stack[0]._findSegments(x) - 1
+            f = [_evalStacked(self.x_stack,x,rows,seg,deriv)
+                 for deriv in (False,True) for rows in (y_pos-1,y_pos)]
+            return [None] + f
+        return _evalOnBrackets(self.xInterpolators,x,y_pos,with_der=True)
+
+    def _combineBrackets(self,x,y,deriv_x,deriv_y):
+        '''
+        Interpolates linearly in y between the bracketing x interpolators, for the
+        level or the derivative with respect to x or y.
+        '''
+        f = np.zeros(len(x)) + np.nan
+        if y.size == 0:
+            return f
+        y_pos = self._findPos(y)
+        order, f_lo, f_hi = self._evalBrackets(x,y_pos,deriv_x)
+        if order is not None:
+            y = y[order]
+            y_pos = y_pos[order]
+        y_lo = self.y_list[y_pos-1]
+        y_hi = self.y_list[y_pos]
+        if deriv_y:
+            f_sorted = (f_hi - f_lo)/(y_hi - y_lo)
+        else:
+            alpha = (y - y_lo)/(y_hi - y_lo)
+            f_sorted = (1-alpha)*f_lo + alpha*f_hi
+        if order is None:
+            return f_sorted
+        f[order] = f_sorted
+        return f
 
     def _evaluate(self,x,y):
         '''
@@ -2196,17 +3378,7 @@ class LinearInterpOnInterp1D(HARKinterpolator2D):
             alpha = (y - self.y_list[y_pos-1])/(self.y_list[y_pos] - self.y_list[y_pos-1])
             f = (1-alpha)*self.xInterpolators[y_pos-1](x) + alpha*self.xInterpolators[y_pos](x)
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            f = np.zeros(m) + np.nan
-            if y.size > 0:
-                for i in xrange(1,self.y_n):
-                    c = y_pos == i
-                    if np.any(c):
-                        alpha = (y[c] - self.y_list[i-1])/(self.y_list[i] - self.y_list[i-1])
-                        f[c] = (1-alpha)*self.xInterpolators[i-1](x[c]) + alpha*self.xInterpolators[i](x[c])
+            f = self._combineBrackets(x,y,False,False)
         return f
 
     def _derX(self,x,y):
@@ -2219,17 +3391,7 @@ class LinearInterpOnInterp1D(HARKinterpolator2D):
             alpha = (y - self.y_list[y_pos-1])/(self.y_list[y_pos] - self.y_list[y_pos-1])
             dfdx = (1-alpha)*self.xInterpolators[y_pos-1]._der(x) + alpha*self.xInterpolators[y_pos]._der(x)
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            dfdx = np.zeros(m) + np.nan
-            if y.size > 0:
-                for i in xrange(1,self.y_n):
-                    c = y_pos == i
-                    if np.any(c):
-                        alpha = (y[c] - self.y_list[i-1])/(self.y_list[i] - self.y_list[i-1])
-                        dfdx[c] = (1-alpha)*self.xInterpolators[i-1]._der(x[c]) + alpha*self.xInterpolators[i]._der(x[c])
+            dfdx = self._combineBrackets(x,y,True,False)
         return dfdx
 
     def _derY(self,x,y):
@@ -2241,18 +3403,35 @@ class LinearInterpOnInterp1D(HARKinterpolator2D):
             y_pos = max(min(np.searchsorted(self.y_list,y),self.y_n-1),1)
             dfdy = (self.xInterpolators[y_pos](x) - self.xInterpolators[y_pos-1](x))/(self.y_list[y_pos] - self.y_list[y_pos-1])
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            dfdy = np.zeros(m) + np.nan
-            if y.size > 0:
-                for i in xrange(1,self.y_n):
-                    c = y_pos == i
-                    if np.any(c):
-                        dfdy[c] = (self.xInterpolators[i](x[c]) - self.xInterpolators[i-1](x[c]))/(self.y_list[i] - self.y_list[i-1])
+            dfdy = self._combineBrackets(x,y,False,True)
         return dfdy
 
+    def _evalAndGrad(self,x,y):
+        '''
+        Returns the level of the interpolated function and its derivatives with
+        respect to x and y at each value in x,y, evaluating each x interpolator
+        only once. Only called internally by HARKinterpolator2D.eval_with_gradient.
+        '''
+        out = [np.zeros(len(x)) + np.nan for a in range(3)]
+        if y.size == 0:
+            return tuple(out)
+        y_pos = self._findPos(y)
+        order, f_lo, f_hi, d_lo, d_hi = self._evalBracketsWithDer(x,y_pos)
+        if order is not None:
+            y = y[order]
+            y_pos = y_pos[order]
+        y_lo = self.y_list[y_pos-1]
+        y_hi = self.y_list[y_pos]
+        alpha = (y - y_lo)/(y_hi - y_lo)
+        out_sorted = [(1-alpha)*f_lo + alpha*f_hi,
+                      (1-alpha)*d_lo + alpha*d_hi,
+                      (f_hi - f_lo)/(y_hi - y_lo)]
+        if order is None:
+            return tuple(out_sorted)
+        for f,f_sorted in zip(out,out_sorted):
+            f[order] = f_sorted
+        return tuple(out)
+
 
 class BilinearInterpOnInterp1D(HARKinterpolator3D):
     '''
@@ -2286,6 +3465,100 @@ class BilinearInterpOnInterp1D(HARKinterpolator3D):
         self.y_n = y_values.size
         self.z_list = z_values
         self.z_n = z_values.size
+        self.x_stack = _stackLinearInterps([f for f_list in xInterpolators for f in f_list])
+
+    def _findPos(self,y,z):
+        '''
+        Returns the indices of the tops of the brackets of y_list and z_list that
+        each y and z lie in.
+        '''
+        y_pos = np.searchsorted(self.y_list,y)
+        y_pos[y_pos > self.y_n-1] = self.y_n-1
+        y_pos[y_pos < 1] = 1
+        z_pos = np.searchsorted(self.z_list,z)
+        z_pos[z_pos > self.z_n-1] = self.z_n-1
+        z_pos[z_pos < 1] = 1
+        return y_pos, z_pos
+
+    def _evalBrackets(self,x,y_pos,z_pos,deriv=False):
+        '''
+        Evaluates the four x interpolators (or their derivatives) bracketing each
+        point, returning the results in the order given by order (None if unsorted).
+        '''
+        if self.x_stack is not None:
+            seg = self.x_stack[0]._findSegments(x) - 1
+            f = [_evalStacked(self.x_stack,x,(y_pos-a)*self.z_n+(z_pos-b),seg,deriv)
+                 for a,b in [(1,1),(1,0),(0,1),(0,0)]]
+            return [None] + f
+        bracket = y_pos*self.z_n + z_pos
+        order, bounds = _groupByBracket(bracket,self.y_n*self.z_n)
+        x_sorted = x[order]
+        f = [np.empty(x.size) for a in range(4)]
+        for k in np.nonzero(bounds[1:] > bounds[:-1])[0]:
+            i, j = divmod(k,self.z_n)
+            these = slice(bounds[k],bounds[k+1])
+            x_these = x_sorted[these]
+            for f_out,func in zip(f,[self.xInterpolators[i-1][j-1],self.xInterpolators[i-1][j],
+                                     self.xInterpolators[i][j-1],self.xInterpolators[i][j]]):
+                f_out[these] = func._der(x_these) if deriv else func(x_these)
+        return [order] + f
+
+    def _evalBracketsWithDer(self,x,y_pos,z_pos):
+        '''
+        Evaluates the four x interpolators bracketing each point and their deriv-
+        atives together, returning the levels and then the derivatives in the
+        order given by order (None if unsorted).
+        '''
+        corners = [(1,1),(1,0),(0,1),(0,0)]
+        if self.x_stack is not None:
+            seg = self.x_stack[0]._findSegments(x) - 1
+            f = [_evalStacked(self.x_stack,x,(y_pos-a)*self.z_n+(z_pos-b),seg,deriv)
+                 for deriv in (False,True) for a,b in corners]
+            return [None] + f
+        bracket = y_pos*self.z_n + z_pos
+        order, bounds = _groupByBracket(bracket,self.y_n*self.z_n)
+        x_sorted = x[order]
+        f = [np.empty(x.size) for a in range(8)]
+        for k in np.nonzero(bounds[1:] > bounds[:-1])[0]:
+            i, j = divmod(k,self.z_n)
+            these = slice(bounds[k],bounds[k+1])
+            x_these = x_sorted[these]
+            for n,(a,b) in enumerate(corners):
+                f[n][these], f[n+4][these] = self.xInterpolators[i-a][j-b]._evalAndDer(x_these)
+        return [order] + f
+
+    def _combineBrackets(self,x,y,z,deriv_x,wrt):
+        '''
+        Interpolates bilinearly in y and z between the bracketing x interpolators,
+        for the level (wrt=None) or the derivative with respect to x, y or z.
+        '''
+        f = np.zeros(len(x)) + np.nan
+        if x.size == 0:
+            return f
+        y_pos, z_pos = self._findPos(y,z)
+        order, f00, f01, f10, f11 = self._evalBrackets(x,y_pos,z_pos,deriv_x)
+        if order is not None:
+            y = y[order]
+            z = z[order]
+            y_pos = y_pos[order]
+            z_pos = z_pos[order]
+        y_lo = self.y_list[y_pos-1]
+        y_hi = self.y_list[y_pos]
+        z_lo = self.z_list[z_pos-1]
+        z_hi = self.z_list[z_pos]
+        alpha = (y - y_lo)/(y_hi - y_lo)
+        beta = (z - z_lo)/(z_hi - z_lo)
+        if wrt == 'y':
+            f_sorted = (((1-beta)*f10 + beta*f11) - ((1-beta)*f00 + beta*f01))/(y_hi - y_lo)
+        elif wrt == 'z':
+            f_sorted = (((1-alpha)*f01 + alpha*f11) - ((1-alpha)*f00 + alpha*f10))/(z_hi - z_lo)
+        else:
+            f_sorted = ((1-alpha)*(1-beta)*f00 + (1-alpha)*beta*f01
+                      + alpha*(1-beta)*f10 + alpha*beta*f11)
+        if order is None:
+            return f_sorted
+        f[order] = f_sorted
+        return f
 
     def _evaluate(self,x,y,z):
         '''
@@ -2302,25 +3575,7 @@ class BilinearInterpOnInterp1D(HARKinterpolator3D):
               + alpha*(1-beta)*self.xInterpolators[y_pos][z_pos-1](x)
               + alpha*beta*self.xInterpolators[y_pos][z_pos](x))
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            z_pos = np.searchsorted(self.z_list,z)
-            z_pos[z_pos > self.z_n-1] = self.z_n-1
-            z_pos[z_pos < 1] = 1
-            f = np.zeros(m) + np.nan
-            for i in xrange(1,self.y_n):
-                for j in xrange(1,self.z_n):
-                    c = np.logical_and(i == y_pos, j == z_pos)
-                    if np.any(c):
-                        alpha = (y[c] - self.y_list[i-1])/(self.y_list[i] - self.y_list[i-1])
-                        beta = (z[c] - self.z_list[j-1])/(self.z_list[j] - self.z_list[j-1])
-                        f[c] = (
-                          (1-alpha)*(1-beta)*self.xInterpolators[i-1][j-1](x[c])
-                          + (1-alpha)*beta*self.xInterpolators[i-1][j](x[c])
-                          + alpha*(1-beta)*self.xInterpolators[i][j-1](x[c])
-                          + alpha*beta*self.xInterpolators[i][j](x[c]))
+            f = self._combineBrackets(x,y,z,False,None)
         return f
 
     def _derX(self,x,y,z):
@@ -2338,25 +3593,7 @@ class BilinearInterpOnInterp1D(HARKinterpolator3D):
               + alpha*(1-beta)*self.xInterpolators[y_pos][z_pos-1]._der(x)
               + alpha*beta*self.xInterpolators[y_pos][z_pos]._der(x))
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            z_pos = np.searchsorted(self.z_list,z)
-            z_pos[z_pos > self.z_n-1] = self.z_n-1
-            z_pos[z_pos < 1] = 1
-            dfdx = np.zeros(m) + np.nan
-            for i in xrange(1,self.y_n):
-                for j in xrange(1,self.z_n):
-                    c = np.logical_and(i == y_pos, j == z_pos)
-                    if np.any(c):
-                        alpha = (y[c] - self.y_list[i-1])/(self.y_list[i] - self.y_list[i-1])
-                        beta = (z[c] - self.z_list[j-1])/(self.z_list[j] - self.z_list[j-1])
-                        dfdx[c] = (
-                          (1-alpha)*(1-beta)*self.xInterpolators[i-1][j-1]._der(x[c])
-                          + (1-alpha)*beta*self.xInterpolators[i-1][j]._der(x[c])
-                          + alpha*(1-beta)*self.xInterpolators[i][j-1]._der(x[c])
-                          + alpha*beta*self.xInterpolators[i][j]._der(x[c]))
+            dfdx = self._combineBrackets(x,y,z,True,None)
         return dfdx
 
     def _derY(self,x,y,z):
@@ -2371,21 +3608,7 @@ class BilinearInterpOnInterp1D(HARKinterpolator3D):
             dfdy = (((1-beta)*self.xInterpolators[y_pos][z_pos-1](x) + beta*self.xInterpolators[y_pos][z_pos](x))
                  -  ((1-beta)*self.xInterpolators[y_pos-1][z_pos-1](x) + beta*self.xInterpolators[y_pos-1][z_pos](x)))/(self.y_list[y_pos] - self.y_list[y_pos-1])
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            z_pos = np.searchsorted(self.z_list,z)
-            z_pos[z_pos > self.z_n-1] = self.z_n-1
-            z_pos[z_pos < 1] = 1
-            dfdy = np.zeros(m) + np.nan
-            for i in xrange(1,self.y_n):
-                for j in xrange(1,self.z_n):
-                    c = np.logical_and(i == y_pos, j == z_pos)
-                    if np.any(c):
-                        beta = (z[c] - self.z_list[j-1])/(self.z_list[j] - self.z_list[j-1])
-                        dfdy[c] = (((1-beta)*self.xInterpolators[i][j-1](x[c]) + beta*self.xInterpolators[i][j](x[c]))
-                                -  ((1-beta)*self.xInterpolators[i-1][j-1](x[c]) + beta*self.xInterpolators[i-1][j](x[c])))/(self.y_list[i] - self.y_list[i-1])
+            dfdy = self._combineBrackets(x,y,z,False,'y')
         return dfdy
 
     def _derZ(self,x,y,z):
@@ -2400,23 +3623,41 @@ class BilinearInterpOnInterp1D(HARKinterpolator3D):
             dfdz = (((1-alpha)*self.xInterpolators[y_pos-1][z_pos](x) + alpha*self.xInterpolators[y_pos][z_pos](x))
                  -  ((1-alpha)*self.xInterpolators[y_pos-1][z_pos-1](x) + alpha*self.xInterpolators[y_pos][z_pos-1](x)))/(self.z_list[z_pos] - self.z_list[z_pos-1])
         else:
-            m = len(x)
-            y_pos = np.searchsorted(self.y_list,y)
-            y_pos[y_pos > self.y_n-1] = self.y_n-1
-            y_pos[y_pos < 1] = 1
-            z_pos = np.searchsorted(self.z_list,z)
-            z_pos[z_pos > self.z_n-1] = self.z_n-1
-            z_pos[z_pos < 1] = 1
-            dfdz = np.zeros(m) + np.nan
-            for i in xrange(1,self.y_n):
-                for j in xrange(1,self.z_n):
-                    c = np.logical_and(i == y_pos, j == z_pos)
-                    if np.any(c):
-                        alpha = (y[c] - self.y_list[i-1])/(self.y_list[i] - self.y_list[i-1])
-                        dfdz[c] = (((1-alpha)*self.xInterpolators[i-1][j](x[c]) + alpha*self.xInterpolators[i][j](x[c]))
-                                -  ((1-alpha)*self.xInterpolators[i-1][j-1](x[c]) + alpha*self.xInterpolators[i][j-1](x[c])))/(self.z_list[j] - self.z_list[j-1])
+            dfdz = self._combineBrackets(x,y,z,False,'z')
         return dfdz
 
+    def _evalAndGrad(self,x,y,z):
+        '''
+        Returns the level of the interpolated function and its derivatives with
+        respect to x, y and z at each value in x,y,z, evaluating each x interp-
+        olator only once. Only called internally by HARKinterpolator3D.eval_with_gradient.
+        '''
+        out = [np.zeros(len(x)) + np.nan for a in range(4)]
+        if x.size == 0:
+            return tuple(out)
+        y_pos, z_pos = self._findPos(y,z)
+        order, f00, f01, f10, f11, d00, d01, d10, d11 = self._evalBracketsWithDer(x,y_pos,z_pos)
+        if order is not None:
+            y = y[order]
+            z = z[order]
+            y_pos = y_pos[order]
+            z_pos = z_pos[order]
+        y_lo = self.y_list[y_pos-1]
+        y_hi = self.y_list[y_pos]
+        z_lo = self.z_list[z_pos-1]
+        z_hi = self.z_list[z_pos]
+        alpha = (y - y_lo)/(y_hi - y_lo)
+        beta = (z - z_lo)/(z_hi - z_lo)
+        out_sorted = [(1-alpha)*(1-beta)*f00 + (1-alpha)*beta*f01 + alpha*(1-beta)*f10 + alpha*beta*f11,
+                      (1-alpha)*(1-beta)*d00 + (1-alpha)*beta*d01 + alpha*(1-beta)*d10 + alpha*beta*d11,
+                      (((1-beta)*f10 + beta*f11) - ((1-beta)*f00 + beta*f01))/(y_hi - y_lo),
+                      (((1-alpha)*f01 + alpha*f11) - ((1-alpha)*f00 + alpha*f10))/(z_hi - z_lo)]
+        if order is None:
+            return tuple(out_sorted)
+        for f,f_sorted in zip(out,out_sorted):
+            f[order] = f_sorted
+        return tuple(out)
+
 
 
 class TrilinearInterpOnInterp1D(HARKinterpolator4D):
@@ -3072,6 +4313,7 @@ class Curvilinear2DInterp(HARKinterpolator2D):
         self.x_n = my_shape[0]
         self.y_n = my_shape[1]
         self.updatePolarity()
+        self.updateSectorIndex()
 
     def updatePolarity(self):
         '''
@@ -3108,10 +4350,123 @@ class Curvilinear2DInterp(HARKinterpolator2D):
         # sector must use the "minus" solution instead
         self.polarity = np.reshape(polarity,(self.x_n-1,self.y_n-1))
 
+    def updateSectorIndex(self):
+        '''
+        Makes an index for quickly guessing the sector of a point: the bounding
+        box of the grid is cut into a uniform grid of (x_n-1) by (y_n-1) buckets,
+        and the sector containing the center of each bucket is stored.  A point's
+        sector is then searched for starting from the sector stored for its
+        bucket, which takes one or two steps rather than O(x_n + y_n) from the
+        middle of the grid.  Needs to be called in __init__, after updatePolarity.
+
+        Parameters
+        ----------
+        none
+
+        Returns
+        -------
+        none
+        '''
+        self.index_x_min = np.min(self.x_values)
+        self.index_y_min = np.min(self.y_values)
+        self.index_x_n = self.x_n-1
+        self.index_y_n = self.y_n-1
+        self.index_x_step = (np.max(self.x_values) - self.index_x_min)/self.index_x_n
+        self.index_y_step = (np.max(self.y_values) - self.index_y_min)/self.index_y_n
+        if self.index_x_step <= 0.0 or self.index_y_step <= 0.0:
+            self.index_x_step = None # Degenerate grid, so search from the middle
+            return
+
+        # Start the search for each bucket center from the sector whose center
+        # point is in that bucket (if any), else from the middle of the grid
+        x_mid = 0.25*(self.x_values[:-1,:-1] + self.x_values[1:,:-1] + self.x_values[:-1,1:] + self.x_values[1:,1:])
+        y_mid = 0.25*(self.y_values[:-1,:-1] + self.y_values[1:,:-1] + self.y_values[:-1,1:] + self.y_values[1:,1:])
+        x_guess = np.zeros((self.index_x_n,self.index_y_n),dtype=int) + self.x_n//2
+        y_guess = np.zeros((self.index_x_n,self.index_y_n),dtype=int) + self.y_n//2
+        i, j = self.findBucket(x_mid.ravel(),y_mid.ravel())
+        sectors = np.indices((self.x_n-1,self.y_n-1)).reshape((2,-1))
+        x_guess[i,j] = sectors[0]
+        y_guess[i,j] = sectors[1]
+
+        x_center = self.index_x_min + (np.arange(self.index_x_n) + 0.5)*self.index_x_step
+        y_center = self.index_y_min + (np.arange(self.index_y_n) + 0.5)*self.index_y_step
+        x_center, y_center = np.meshgrid(x_center,y_center,indexing='ij')
+        x_pos, y_pos = self.walkToSector(x_center.ravel(),y_center.ravel(),x_guess.ravel(),y_guess.ravel())
+        self.index_x_pos = np.reshape(x_pos,(self.index_x_n,self.index_y_n))
+        self.index_y_pos = np.reshape(y_pos,(self.index_x_n,self.index_y_n))
+
+    def findBucket(self,x,y):
+        '''
+        Finds the bucket of the sector index (see updateSectorIndex) for each
+        (x,y) point in the input; points outside the grid's bounding box are put
+        in the nearest bucket.
+
+        Parameters
+        ----------
+        x : np.array
+            Values whose bucket should be found.
+        y : np.array
+            Values whose bucket should be found.  Should be same size as x.
+
+        Returns
+        -------
+        i : np.array
+            Bucket x-coordinates for each point of the input, of the same size.
+        j : np.array
+            Bucket y-coordinates for each point of the input, of the same size.
+        '''
+        i = np.floor((x - self.index_x_min)/self.index_x_step)
+        j = np.floor((y - self.index_y_min)/self.index_y_step)
+        i = np.clip(np.nan_to_num(i),0,self.index_x_n-1).astype(int)
+        j = np.clip(np.nan_to_num(j),0,self.index_y_n-1).astype(int)
+        return i, j
+
     def findSector(self,x,y):
         '''
         Finds the quadrilateral "sector" for each (x,y) point in the input.
-        Only called as a subroutine of _evaluate().
+        Only called as a subroutine of _evaluate().  On a grid whose sectors
+        overlap (i.e. one that isn't a proper warped grid), a point in two
+        sectors may be found in either one, depending on where the search starts.
+
+        Parameters
+        ----------
+        x : np.array
+            Values whose sector should be found.
+        y : np.array
+            Values whose sector should be found.  Should be same size as x.
+
+        Returns
+        -------
+        x_pos : np.array
+            Sector x-coordinates for each point of the input, of the same size.
+        y_pos : np.array
+            Sector y-coordinates for each point of the input, of the same size.
+        '''
+        # Start the search from the sector stored in the index for each point
+        m = x.size
+        if self.index_x_step is None:
+            x_pos_guess = (np.ones(m)*self.x_n/2).astype(int)
+            y_pos_guess = (np.ones(m)*self.y_n/2).astype(int)
+            return self.walkToSector(x,y,x_pos_guess,y_pos_guess)
+        i, j = self.findBucket(x,y)
+        x_pos, y_pos = self.walkToSector(x,y,self.index_x_pos[i,j],self.index_y_pos[i,j])
+
+        # A point outside of the grid ends its search in whichever boundary sector
+        # it reaches first, which depends on where the search starts; search again
+        # for points that end on the boundary from the middle of the grid, so they
+        # get the same sector (and extrapolation) as always
+        edge = (x_pos == 0) | (x_pos == self.x_n-2) | (y_pos == 0) | (y_pos == self.y_n-2)
+        if np.any(edge):
+            x_pos_edge = (np.ones(np.sum(edge))*self.x_n/2).astype(int)
+            y_pos_edge = (np.ones(np.sum(edge))*self.y_n/2).astype(int)
+            x_pos[edge], y_pos[edge] = self.walkToSector(x[edge],y[edge],x_pos_edge,y_pos_edge)
+        return x_pos, y_pos
+
+    def walkToSector(self,x,y,x_pos_guess,y_pos_guess):
+        '''
+        Finds the quadrilateral "sector" for each (x,y) point in the input by
+        moving from an initial guess to a neighboring sector until the point is
+        in the sector.  Only called as a subroutine of findSector().
 
         Parameters
         ----------
@@ -3119,6 +4474,10 @@ class Curvilinear2DInterp(HARKinterpolator2D):
             Values whose sector should be found.
         y : np.array
             Values whose sector should be found.  Should be same size as x.
+        x_pos_guess : np.array
+            Initial guess of the sector x-coordinate of each point; changed here.
+        y_pos_guess : np.array
+            Initial guess of the sector y-coordinate of each point; changed here.
 
         Returns
         -------
@@ -3127,10 +4486,7 @@ class Curvilinear2DInterp(HARKinterpolator2D):
         y_pos : np.array
             Sector y-coordinates for each point of the input, of the same size.
         '''
-        # Initialize the sector guess
         m = x.size
-        x_pos_guess = (np.ones(m)*self.x_n/2).astype(int)
-        y_pos_guess = (np.ones(m)*self.y_n/2).astype(int)
 
         # Define a function that checks whether a set of points violates a linear
         # boundary defined by (x_bound_1,y_bound_1) and (x_bound_2,y_bound_2),
@@ -4,7 +4,14 @@ and joblib.  Packages can be installed by typing "conda install dill" (etc) at
 a command prompt.
 '''
 import multiprocessing
+import traceback
+import os
+import glob
+import mmap
+import atexit
+import tempfile
 import numpy as np
+from copy import copy
 from time import clock
 import csv
 
@@ -56,6 +63,8 @@ def multiThreadCommands(agent_list,command_list,num_jobs=None):
     '''
     Executes the list of commands in command_list for each AgentType in agent_list
     using a multithreaded system. Each command should be a method of that AgentType subclass.
+    If a command fails in a worker, a RuntimeError with its traceback is raised
+    after the AgentTypes whose commands ran have been put back into agent_list.
 
     Parameters
     ----------
@@ -78,11 +87,21 @@ def multiThreadCommands(agent_list,command_list,num_jobs=None):
         num_jobs = min(len(agent_list),multiprocessing.cpu_count())
 
     # Send each command in command_list to each of the types in agent_list to be run
-    agent_list_out = Parallel(n_jobs=num_jobs)(delayed(runCommands)(*args) for args in zip(agent_list, len(agent_list)*[command_list]))
+    # Arrays in shared memory are sent as references to their file, not as copies
+    packed_list = [packAgent(agent) for agent in agent_list]
+    agent_list_out = Parallel(n_jobs=num_jobs)(delayed(runCommandsShared)(*args) for args in zip(packed_list, len(agent_list)*[command_list]))
 
-    # Replace the original types with the output from the parallel call
+    # Replace the original types with the output from the parallel call, taking
+    # over the shared memory files made for them in the workers
+    errors = []
     for j in range(len(agent_list)):
-        agent_list[j] = agent_list_out[j]
+        status, result = agent_list_out[j]
+        if status != 'ok':
+            errors.append(result)
+            continue
+        agent_list[j] = unpackAgent(result,adopt=True)
+    if len(errors) > 0:
+        raise RuntimeError('A worker of multiThreadCommands failed:\n' + errors[0])
 
 def runCommands(agent,command_list):
     '''
@@ -105,6 +124,521 @@ def runCommands(agent,command_list):
         exec('agent.' + command)
     return agent
 
+def runCommandsShared(agent,command_list):
+    '''
+    Executes each command in command_list on an AgentType received from another
+    process, mapping its shared memory arrays before running the commands and
+    replacing them with references before it is sent back.  The shared memory
+    files that are sent back are handed over to the receiving process; those
+    made by commands that failed are deleted here, as they never leave.
+
+    Parameters
+    ----------
+    agent : AgentType
+        An instance of AgentType packed by packAgent.
+    command_list : [string]
+        A list of commands that the agent should run, as methods.
+
+    Returns
+    -------
+    status : string
+        'ok' if the commands ran, 'error' if one of them raised an exception.
+    result : AgentType or string
+        The AgentType after running the commands, packed by packAgent, or the
+        traceback of the exception.
+    '''
+    known_files = set(shared_files)
+    try:
+        agent = runCommands(unpackAgent(agent),command_list)
+    except Exception:
+        removeSharedFiles(keep=known_files)
+        return ('error',traceback.format_exc())
+    return ('ok',packAgent(agent,hand_over=True))
+
+
+class AgentPool(object):
+    '''
+    A persistent pool of worker processes, each of which keeps some of the Agent-
+    Types in agent_list resident in memory.  Unlike multiThreadCommands, which
+    sends every AgentType back and forth in full on each call, the pool only
+    ships attributes that have changed: attributes that have been reassigned in
+    the parent process since the last call are sent to the workers, and only
+    the attributes reassigned by the commands (or those specifically requested)
+    are sent back and set on the AgentTypes in agent_list.
+
+    Changes are detected by object identity, so an attribute that is modified in
+    place (rather than reassigned) is not noticed; name such attributes in
+    send_vars or receive_vars.  The workers are started by forking this process
+    and should be shut down with close() when they are no longer needed.
+    '''
+    def __init__(self,agent_list,num_jobs=None,local_vars=['solver_plan']):
+        '''
+        Starts the worker processes, giving each of them a share of agent_list.
+
+        Parameters
+        ----------
+        agent_list : [AgentType]
+            A list of instances of AgentType to be held by the pool.
+        num_jobs : int or None
+            Number of worker processes.  Defaults to the smaller of the number of
+            AgentTypes and the number of available cores.
+        local_vars : [string]
+            Names of attributes that are never shipped between processes, like
+            caches that each process can rebuild for itself.
+
+        Returns
+        -------
+        None
+        '''
+        if num_jobs is None:
+            num_jobs = min(len(agent_list),multiprocessing.cpu_count())
+        num_jobs = max(min(num_jobs,len(agent_list)),1)
+        self.agents    = list(agent_list)
+        self.local_vars = local_vars
+        self.groups    = [range(len(agent_list))[j::num_jobs] for j in range(num_jobs)]
+        self.snapshots = [attributeSnapshot(agent) for agent in self.agents]
+        self.workers   = []
+        self.conns     = []
+        for group in self.groups:
+            conn, child_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=agentPoolWorker,
+                                             args=(child_conn,[self.agents[i] for i in group],local_vars))
+            worker.daemon = True
+            worker.start()
+            child_conn.close()
+            self.workers.append(worker)
+            self.conns.append(conn)
+
+    def run(self,command_list,send_vars=[],receive_vars=None):
+        '''
+        Executes each command in command_list on every AgentType in the pool,
+        in the worker processes.
+
+        Parameters
+        ----------
+        command_list : [string]
+            A list of commands that each AgentType should run, as methods.
+        send_vars : [string]
+            Names of attributes to send to the workers even if they have not been
+            reassigned since the last call.
+        receive_vars : [string] or None
+            Names of attributes to bring back from the workers (if they have them).
+            If None, every attribute reassigned by the commands is brought back.
+
+        Returns
+        -------
+        None
+        '''
+        # Send each worker the updated attributes of its AgentTypes and the commands
+        for group, conn in zip(self.groups,self.conns):
+            updates = []
+            for i in group:
+                agent = self.agents[i]
+                changed = [name for name in changedAttributes(agent,self.snapshots[i])
+                           if name not in self.local_vars]
+                for name in send_vars:
+                    if name not in changed and hasattr(agent,name):
+                        changed.append(name)
+                updates.append(dict((name,packSharedArray(getattr(agent,name))) for name in changed))
+            conn.send_bytes(pickle.dumps((updates,command_list,receive_vars)))
+
+        # Collect the results from each worker and put them into the parent's AgentTypes
+        errors = []
+        for group, conn in zip(self.groups,self.conns):
+            status, results = pickle.loads(conn.recv_bytes())
+            if status != 'ok':
+                errors.append(results)
+                continue
+            for i, result in zip(group,results):
+                for name in result:
+                    setattr(self.agents[i],name,unpackSharedArray(result[name],adopt=True))
+        for i in range(len(self.agents)):
+            self.snapshots[i] = attributeSnapshot(self.agents[i])
+        if len(errors) > 0:
+            raise RuntimeError('An AgentPool worker failed:\n' + errors[0])
+
+    def close(self):
+        '''
+        Shuts down the worker processes.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        for conn in self.conns:
+            try:
+                conn.send_bytes(pickle.dumps(None))
+                conn.close()
+            except (IOError,EOFError):
+                pass
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        self.conns   = []
+
+
+def agentPoolWorker(conn,agent_list,local_vars):
+    '''
+    The loop run by each worker process of an AgentPool.  Waits for messages of
+    attribute updates and commands, runs the commands on each AgentType it holds,
+    and sends back the reassigned (or requested) attributes.  Shared memory files
+    that are sent back are handed over to the parent process; those made by
+    commands that failed are deleted.
+
+    Parameters
+    ----------
+    conn : multiprocessing.Connection
+        This worker's end of the pipe to the parent process.
+    agent_list : [AgentType]
+        The AgentTypes held by this worker.
+    local_vars : [string]
+        Names of attributes that are never sent back to the parent process.
+
+    Returns
+    -------
+    None
+    '''
+    while True:
+        try:
+            message = pickle.loads(conn.recv_bytes())
+        except EOFError:
+            break
+        if message is None:
+            break
+        updates, command_list, receive_vars = message
+        known_files = set(shared_files)
+        try:
+            results = []
+            for agent, update in zip(agent_list,updates):
+                for name in update:
+                    setattr(agent,name,unpackSharedArray(update[name]))
+                snapshot = attributeSnapshot(agent)
+                runCommands(agent,command_list)
+                if receive_vars is None:
+                    names = [name for name in changedAttributes(agent,snapshot)
+                             if name not in local_vars]
+                else:
+                    names = [name for name in receive_vars if hasattr(agent,name)]
+                results.append(dict((name,packSharedArray(getattr(agent,name),hand_over=True)) for name in names))
+            reply = ('ok',results)
+        except Exception:
+            removeSharedFiles(keep=known_files)
+            reply = ('error',traceback.format_exc())
+        conn.send_bytes(pickle.dumps(reply))
+    conn.close()
+
+
+def attributeSnapshot(agent):
+    '''
+    Records each attribute of an object (and a shallow copy of any attribute that
+    is a list), so that attributes reassigned later can be found by identity.
+
+    Parameters
+    ----------
+    agent : object
+        Any object, usually an AgentType.
+
+    Returns
+    -------
+    snapshot : dict
+        Dictionary mapping attribute names to the recorded objects.
+    '''
+    snapshot = {}
+    for name, value in agent.__dict__.items():
+        if type(value) is list:
+            snapshot[name] = (value,list(value))
+        else:
+            snapshot[name] = (value,None)
+    return snapshot
+
+
+def changedAttributes(agent,snapshot):
+    '''
+    Finds the attributes of an object that have been added or reassigned (or,
+    for lists, had elements added, removed or reassigned) since a snapshot was taken.
+
+    Parameters
+    ----------
+    agent : object
+        Any object, usually an AgentType.
+    snapshot : dict
+        A snapshot of the object made by attributeSnapshot.
+
+    Returns
+    -------
+    changed : [string]
+        Names of the attributes that have changed.
+    '''
+    changed = []
+    for name, value in agent.__dict__.items():
+        if name not in snapshot:
+            changed.append(name)
+            continue
+        value_then, elements_then = snapshot[name]
+        if value is not value_then:
+            changed.append(name)
+        elif elements_then is not None and (len(value) != len(elements_then) or
+                any(x is not y for x, y in zip(value,elements_then))):
+            changed.append(name)
+    return changed
+
+
+#=============================================================
+# ========  Shared memory arrays for simulation results ======
+#=============================================================
+
+if os.path.isdir('/dev/shm'):
+    shared_dir = '/dev/shm'
+else:
+    shared_dir = tempfile.gettempdir()
+
+
+def makeSharedArray(shape,dtype=float,tag=None):
+    '''
+    Makes a new array that lives in a memory-mapped file in shared memory (/dev/shm
+    when it exists), so that several processes can read and write it in place.
+    Such arrays are passed between processes by AgentPool and multiThreadCommands
+    as references to their file rather than as pickled copies.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the new array.
+    dtype : type
+        Data type of the new array.
+    tag : string or None
+        Label included in the file name so that the files can be removed later
+        with removeSharedArrays.  Defaults to the ID of the current process.
+
+    Returns
+    -------
+    array : np.memmap
+        A new (zero-filled) array backed by a file in shared memory.
+    '''
+    if tag is None:
+        tag = str(os.getpid())
+    if int(np.prod(shape)) == 0: # np.memmap can't map an empty file
+        return np.zeros(shape,dtype=dtype)
+    handle, filename = tempfile.mkstemp(prefix='HARK_' + tag + '_',suffix='.dat',dir=shared_dir)
+    os.close(handle)
+    shared_files[filename] = os.getpid()
+    return np.memmap(filename,dtype=dtype,mode='w+',shape=shape)
+
+
+def releaseSharedArray(array):
+    '''
+    Deletes the shared memory file of an array made by makeSharedArray, once it
+    is no longer needed, so that files don't pile up in shared memory until the
+    process exits.  The array itself stays valid in this process (and in others
+    that have already mapped it), but can't be passed to other processes anymore.
+
+    Parameters
+    ----------
+    array : np.array
+        An array that may have been made by makeSharedArray; anything else is
+        left alone.
+
+    Returns
+    -------
+    released : boolean
+        Whether the array's file was deleted.
+    '''
+    if not isinstance(packSharedArray(array),SharedArrayRef):
+        return False
+    if not os.path.basename(array.filename).startswith('HARK_'):
+        return False
+    try:
+        os.remove(array.filename)
+    except OSError: # already removed
+        pass
+    shared_files.pop(array.filename,None)
+    return True
+
+
+def removeSharedArrays(tag=None):
+    '''
+    Deletes the shared memory files made by makeSharedArray with a given tag,
+    except those that this process has handed over to another one (see
+    packSharedArray).  Arrays that are already mapped stay valid until they are
+    garbage collected.
+
+    Parameters
+    ----------
+    tag : string or None
+        Label of the files to delete.  Defaults to the ID of the current process.
+
+    Returns
+    -------
+    None
+    '''
+    if tag is None:
+        tag = str(os.getpid())
+    for filename in glob.glob(os.path.join(shared_dir,'HARK_' + tag + '_*.dat')):
+        if filename in shared_files and shared_files[filename] is None:
+            continue
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+def removeSharedFiles(keep=()):
+    '''
+    Deletes the shared memory files owned by this process that are still there,
+    whatever their tag: those made here by makeSharedArray and not handed over,
+    and those taken over from other processes.  Called when the process exits.
+
+    Parameters
+    ----------
+    keep : collection of strings
+        Names of files that are not deleted.
+
+    Returns
+    -------
+    None
+    '''
+    pid = os.getpid()
+    for filename, owner in shared_files.items():
+        if owner == pid and filename not in keep:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            del shared_files[filename]
+
+shared_files = {} # shared memory files, and the ID of the process that owns each (None if handed over)
+atexit.register(removeSharedArrays,str(os.getpid()))
+atexit.register(removeSharedFiles)
+
+
+class SharedArrayRef(object):
+    '''
+    A small, picklable reference to an np.memmap array in shared memory, used in
+    place of the array itself when passing data between processes.
+    '''
+    def __init__(self,array):
+        self.filename = array.filename
+        self.dtype    = array.dtype
+        self.shape    = array.shape
+        self.offset   = array.offset
+        self.order    = 'F' if (array.flags.f_contiguous and not array.flags.c_contiguous) else 'C'
+
+    def load(self):
+        '''
+        Maps the referenced file into memory again.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        array : np.memmap
+            An array sharing memory with the one that this reference was made from.
+        '''
+        return np.memmap(self.filename,dtype=self.dtype,mode='r+',offset=self.offset,
+                         shape=self.shape,order=self.order)
+
+
+def packSharedArray(value,hand_over=False):
+    '''
+    Replaces an array made by makeSharedArray with a SharedArrayRef; any other
+    value (including slices of shared arrays) is returned unchanged.
+
+    Parameters
+    ----------
+    value : any
+        The value to be passed to another process.
+    hand_over : boolean
+        Whether the receiving process takes over the array's file, so that this
+        process no longer deletes it when it exits.
+
+    Returns
+    -------
+    packed : any
+        A SharedArrayRef or the original value.
+    '''
+    if isinstance(value,np.memmap) and isinstance(value.base,mmap.mmap) and \
+            value.filename is not None and os.path.dirname(value.filename) == shared_dir:
+        if hand_over and shared_files.get(value.filename) == os.getpid():
+            shared_files[value.filename] = None
+        return SharedArrayRef(value)
+    return value
+
+
+def unpackSharedArray(value,adopt=False):
+    '''
+    Reverses packSharedArray.
+
+    Parameters
+    ----------
+    value : any
+        A value received from another process.
+    adopt : boolean
+        Whether this process takes over the referenced file, deleting it when
+        it exits.  Used for arrays handed over by packSharedArray.
+
+    Returns
+    -------
+    unpacked : any
+        The shared array referenced by value, or value itself.
+    '''
+    if isinstance(value,SharedArrayRef):
+        if adopt:
+            shared_files[value.filename] = os.getpid()
+        return value.load()
+    return value
+
+
+def packAgent(agent,hand_over=False):
+    '''
+    Makes a shallow copy of an object (usually an AgentType) with each of its
+    shared memory arrays replaced by a SharedArrayRef.
+
+    Parameters
+    ----------
+    agent : object
+        The object to be sent to another process.
+    hand_over : boolean
+        Whether the receiving process takes over the arrays' files.
+
+    Returns
+    -------
+    packed : object
+        A shallow copy of agent that can be pickled cheaply.
+    '''
+    packed = copy(agent)
+    for name, value in agent.__dict__.items():
+        packed_value = packSharedArray(value,hand_over)
+        if packed_value is not value:
+            setattr(packed,name,packed_value)
+    return packed
+
+
+def unpackAgent(agent,adopt=False):
+    '''
+    Reverses packAgent, mapping each referenced shared array into this process.
+
+    Parameters
+    ----------
+    agent : object
+        An object received from another process.
+    adopt : boolean
+        Whether this process takes over the referenced files.
+
+    Returns
+    -------
+    agent : object
+        The same object, with arrays in place of SharedArrayRefs.
+    '''
+    for name, value in agent.__dict__.items():
+        if isinstance(value,SharedArrayRef):
+            setattr(agent,name,unpackSharedArray(value,adopt))
+    return agent
+
 
 #=============================================================
 # ========  Define a parallel Nelder-Mead algorithm ==========
@@ -6,6 +6,27 @@ from __future__ import division
 import warnings                             # A library for runtime warnings
 import numpy as np                          # Numerical Python
 
+def makeRNG(seed=0):
+    '''
+    Returns a random number generator for the draw functions in this module.
+    Making a new np.random.RandomState from a seed takes much longer than the
+    draws themselves, so a generator that has already been made (such as the
+    RNG attribute of an AgentType) can be passed instead and is used as is.
+
+    Parameters
+    ----------
+    seed : int or np.random.RandomState
+        Seed for a new random number generator, or an existing generator.
+
+    Returns
+    -------
+    RNG : np.random.RandomState
+        The random number generator to draw from.
+    '''
+    if isinstance(seed,np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
 def drawMeanOneLognormal(N, sigma=1.0, seed=0):
     '''
     Generate arrays of mean one lognormal draws. The sigma input can be a number
@@ -21,8 +42,8 @@ def drawMeanOneLognormal(N, sigma=1.0, seed=0):
     sigma : float or [float]
         One or more standard deviations. Number of elements T in sigma
         determines number of rows of output.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns:
     ------------
@@ -31,7 +52,7 @@ def drawMeanOneLognormal(N, sigma=1.0, seed=0):
         a single array of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if isinstance(sigma,float): # Return a single array of length N
         mu = -0.5*sigma**2
@@ -61,8 +82,8 @@ def drawLognormal(N,mu=0.0,sigma=1.0,seed=0):
     sigma : float or [float]
         One or more standard deviations. Number of elements T in sigma
         determines number of rows of output.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns:
     ------------
@@ -71,7 +92,7 @@ def drawLognormal(N,mu=0.0,sigma=1.0,seed=0):
         a single array of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if isinstance(sigma,float): # Return a single array of length N
         if sigma == 0:
@@ -106,8 +127,8 @@ def drawNormal(N, mu=0.0, sigma=1.0, seed=0):
     sigma : float or [float]
         One or more standard deviations. Number of elements T in sigma
         determines number of rows of output.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns
     -------
@@ -116,7 +137,7 @@ def drawNormal(N, mu=0.0, sigma=1.0, seed=0):
         of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if isinstance(sigma,float): # Return a single array of length N
         draws = sigma*RNG.randn(N) + mu
@@ -148,8 +169,8 @@ def drawWeibull(N, scale=1.0, shape=1.0,  seed=0):
     shape : float or [float]
         One or more shape parameters. Number of elements T in scale
         determines number of rows of output.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns:
     ------------
@@ -158,7 +179,7 @@ def drawWeibull(N, scale=1.0, shape=1.0,  seed=0):
         array of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if scale == 1:
         scale = float(scale)
@@ -188,8 +209,8 @@ def drawUniform(N, bot=0.0, top=1.0, seed=0):
     top : float or [float]
         One or more top values. Number of elements T in top determines number of
         rows of output.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns
     -------
@@ -198,7 +219,7 @@ def drawUniform(N, bot=0.0, top=1.0, seed=0):
         array of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if isinstance(bot,float) or isinstance(bot,int): # Return a single array of size N
         draws = bot + (top - bot)*RNG.rand(N)
@@ -221,8 +242,8 @@ def drawBernoulli(N,p=0.5,seed=0):
         Number of draws in each row.
     p : float or [float]
         Probability or probabilities of the event occurring (True).
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns
     -------
@@ -231,7 +252,7 @@ def drawBernoulli(N,p=0.5,seed=0):
         array of size N (if sigma is a scalar).
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if isinstance(p,float):# Return a single array of size N
         draws = RNG.uniform(size=N) < p
@@ -259,8 +280,8 @@ def drawDiscrete(N,P=[1.0],X=[0.0],exact_match=False,seed=0):
         a random permutation of the N-length list that best fits the discrete
         distribution.  When False (default), each draw is independent from the
         others and the result could deviate from the input.
-    seed : int
-        Seed for random number generator.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
 
     Returns
     -------
@@ -268,7 +289,7 @@ def drawDiscrete(N,P=[1.0],X=[0.0],exact_match=False,seed=0):
         An array draws from the discrete distribution; each element is a value in X.
     '''
     # Set up the RNG
-    RNG = np.random.RandomState(seed)
+    RNG = makeRNG(seed)
 
     if exact_match:
         events = np.arange(P.size) # just a list of integers
@@ -293,6 +314,318 @@ def drawDiscrete(N,P=[1.0],X=[0.0],exact_match=False,seed=0):
         draws = np.asarray(X)[indices]
     return draws
 
+def makeAliasTable(P):
+    '''
+    Makes the tables for drawing from a discrete distribution with the alias
+    method (Vose's algorithm), so that each draw takes one uniform draw and
+    constant time however many outcomes there are.  Each outcome j gets a
+    probability prob[j] of being kept when it is picked uniformly at random
+    and an alias[j] to use otherwise.
+
+    Parameters
+    ----------
+    P : np.array
+        Probabilities of outcomes.  A 2D array holds one distribution in each
+        row, padded with zeros if they have different numbers of outcomes.
+
+    Returns
+    -------
+    prob : np.array
+        Probabilities of keeping each outcome when it is picked, with the same
+        shape as P.
+    alias : np.array
+        Outcomes to use instead when each outcome isn't kept, as integers, with
+        the same shape as P.
+    '''
+    P = np.asarray(P,dtype=float)
+    if P.ndim == 2:
+        tables = [makeAliasTable(P_row) for P_row in P]
+        return np.array([table[0] for table in tables]), np.array([table[1] for table in tables])
+
+    n = P.size
+    scaled = P*(n/np.sum(P))
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [j for j in range(n) if scaled[j] < 1.0]
+    large = [j for j in range(n) if scaled[j] >= 1.0]
+    while small and large:
+        j = small.pop()
+        k = large.pop()
+        prob[j] = scaled[j]
+        alias[j] = k
+        scaled[k] = (scaled[k] + scaled[j]) - 1.0
+        if scaled[k] < 1.0:
+            small.append(k)
+        else:
+            large.append(k)
+    return prob, alias
+
+def drawAlias(N,prob,alias,X=None,rows=None,seed=0,out=None):
+    '''
+    Simulates N draws from a discrete distribution using the tables made by
+    makeAliasTable.  If the tables have one distribution per row, rows says
+    which distribution to use for each draw.
+
+    Parameters
+    ----------
+    N : int
+        Number of draws to simulate.
+    prob : np.array
+        Probabilities of keeping each outcome, from makeAliasTable.
+    alias : np.array
+        Alternative outcomes, from makeAliasTable.
+    X : np.array or None
+        Discrete outcomes, with the same shape as prob.  If None, the indices
+        of the outcomes are returned.
+    rows : np.array or None
+        Size N array of the rows of the tables to draw from; only used (and
+        required) when the tables are 2D.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
+    out : np.array or None
+        Optional size N array in which to put the draws.
+
+    Returns
+    -------
+    draws : np.array
+        An array of draws from the discrete distribution(s); each element is an
+        outcome index, or a value in X.
+    '''
+    RNG = makeRNG(seed)
+    J = prob.shape[-1]
+
+    # Pick an outcome uniformly, then use the rest of the same draw to decide
+    # whether to keep it or use its alias
+    base_draws = RNG.uniform(size=N)*J
+    picks = np.minimum(base_draws.astype(int),J-1)
+    if rows is None:
+        keep = (base_draws - picks) < prob[picks]
+        indices = np.where(keep,picks,alias[picks])
+        draws = indices if X is None else np.asarray(X)[indices]
+    else:
+        keep = (base_draws - picks) < prob[rows,picks]
+        indices = np.where(keep,picks,alias[rows,picks])
+        draws = indices if X is None else np.asarray(X)[rows,indices]
+    if out is not None:
+        out[:] = draws
+        return out
+    return draws
+
+def makeCutoffTable(P):
+    '''
+    Makes a table for mapping uniform draws to the outcomes of several discrete
+    distributions at once.  The cumulative probabilities of all distributions
+    are kept in one ragged array of complex keys (row index as the real part,
+    cutoff as the imaginary part), so that one search finds the outcome of each
+    draw within its own distribution.
+
+    Parameters
+    ----------
+    P : [np.array]
+        Probabilities of outcomes of each distribution.
+
+    Returns
+    -------
+    keys : np.array
+        Complex search keys for all rows, in order.
+    first : np.array
+        Index of the first key of each row.
+    counts : np.array
+        Number of outcomes in each row.
+    '''
+    counts = np.array([len(P_row) for P_row in P])
+    first = np.concatenate(([0],np.cumsum(counts)[:-1]))
+    keys = np.empty(np.sum(counts),dtype=complex)
+    keys.real = np.repeat(np.arange(counts.size),counts)
+    keys.imag = np.concatenate([np.cumsum(P_row) for P_row in P])
+    return keys, first, counts
+
+def lookupCutoffTable(table,rows,draws):
+    '''
+    Maps uniform draws to outcomes using a table from makeCutoffTable.  The
+    outcome of draws[i] is the same as np.searchsorted(np.cumsum(P[rows[i]]),draws[i])
+    (capped at the last outcome, in case the probabilities sum to slightly less
+    than one).
+
+    Parameters
+    ----------
+    table : (np.array,np.array,np.array)
+        Output of makeCutoffTable.
+    rows : np.array
+        Integer array with the distribution to use for each draw.
+    draws : np.array
+        Uniform draws in [0,1), same size as rows.
+
+    Returns
+    -------
+    outcomes : np.array
+        Index of each draw's outcome within its own distribution.
+    '''
+    keys, first, counts = table
+    query = np.empty(draws.size,dtype=complex)
+    query.real = rows
+    query.imag = draws
+    return np.minimum(np.searchsorted(keys,query) - first[rows],counts[rows]-1)
+
+def drawStratifiedUniform(rows,seed=0):
+    '''
+    Draws one uniform per element of rows, stratified within each group of
+    elements that share a row: the n draws of a group are the midpoints of n
+    equal intervals of [0,1), in random order.  Mapping them through cumulative
+    probabilities gives each group the same event counts as drawDiscrete with
+    exact_match=True (up to rounding of ties), for all groups at once.
+
+    Parameters
+    ----------
+    rows : np.array
+        Array of nonnegative integers, giving the group of each draw.
+    seed : int or np.random.RandomState
+        Seed for random number generator, or a generator to draw from directly.
+
+    Returns
+    -------
+    draws : np.array
+        Stratified uniform draws, same size as rows.
+    '''
+    RNG = makeRNG(seed)
+    N = rows.size
+    order = np.lexsort((RNG.uniform(size=N),rows))
+    rows_sorted = rows[order]
+    rank = np.arange(N) - np.searchsorted(rows_sorted,rows_sorted)
+    draws = np.empty(N)
+    draws[order] = (rank + 0.5)/np.bincount(rows)[rows_sorted]
+    return draws
+
+
+def makeIncShkTable(IncomeDstns,PermGroFacs,flat=False,table=None):
+    '''
+    Packs income shock distributions into tables with one row for each period
+    and discrete state, so that shocks for all agents can be drawn at once.
+    Row t*StateCount + j holds IncomeDstns[t][j], with PermGroFacs[t] (or its
+    j-th element) folded into the permanent shocks; states that don't exist in
+    some period get a row with a single event of no shock.  If a table made
+    from the same inputs is passed, it is returned as is rather than rebuilt.
+
+    Parameters
+    ----------
+    IncomeDstns : [[[np.array]]]
+        For each period, a list with the income distribution in each discrete
+        state: [probabilities, permanent shocks, transitory shocks].
+    PermGroFacs : [float or np.array]
+        For each period, the permanent income growth factor, or an array with
+        the growth factor in each discrete state.
+    flat : boolean
+        Whether to make a ragged cutoff table (see makeCutoffTable), for use
+        with stratified draws, rather than padded alias tables (see makeAliasTable).
+    table : dict or None
+        A table made by an earlier call, to be reused if its inputs haven't
+        changed (the same distribution objects and equal growth factors).
+
+    Returns
+    -------
+    table : dict
+        The tables, with entries 'source' (the inputs), 'StateCount' and
+        'flat'; either 'cutoffs' (output of makeCutoffTable) or 'prob' and 'alias'
+        (outputs of makeAliasTable); and 'PermShk' and 'TranShk', which are
+        ragged 1D arrays if flat or padded 2D arrays otherwise.
+    '''
+    if table is not None and table['flat'] == flat and len(table['source'][0]) == len(IncomeDstns) and \
+            all([len(table['source'][0][t]) == len(IncomeDstns[t]) and
+                 all([Dstn is IncomeDstns[t][j] for j, Dstn in enumerate(table['source'][0][t])]) and
+                 np.array_equal(table['source'][1][t],PermGroFacs[t]) for t in range(len(IncomeDstns))]):
+        return table
+
+    IncomeDstns = [list(Dstns) for Dstns in IncomeDstns]
+    StateCount = max([len(Dstns) for Dstns in IncomeDstns])
+    NullDstn = [np.ones(1),np.ones(1),np.ones(1)]
+    Dstns = []
+    for t in range(len(IncomeDstns)):
+        PermGroFac = np.zeros(len(IncomeDstns[t])) + PermGroFacs[t]
+        for j in range(StateCount):
+            if j < len(IncomeDstns[t]):
+                Dstn = IncomeDstns[t][j]
+                Dstns.append([Dstn[0],Dstn[1]*PermGroFac[j],Dstn[2]])
+            else:
+                Dstns.append(NullDstn)
+    table = {'source' : (IncomeDstns,[np.array(PermGroFac) for PermGroFac in PermGroFacs]),
+             'StateCount' : StateCount, 'flat' : flat}
+
+    if flat:
+        table['cutoffs'] = makeCutoffTable([Dstn[0] for Dstn in Dstns])
+        table['PermShk'] = np.concatenate([Dstn[1] for Dstn in Dstns])
+        table['TranShk'] = np.concatenate([Dstn[2] for Dstn in Dstns])
+        return table
+
+    counts = np.array([Dstn[0].size for Dstn in Dstns])
+    ShkPrbTable = np.zeros((counts.size,counts.max()))
+    PermShkTable = np.ones((counts.size,counts.max()))
+    TranShkTable = np.ones((counts.size,counts.max()))
+    for row, Dstn in enumerate(Dstns):
+        ShkPrbTable[row,:counts[row]] = Dstn[0]
+        PermShkTable[row,:counts[row]] = Dstn[1]
+        TranShkTable[row,:counts[row]] = Dstn[2]
+    table['prob'], table['alias'] = makeAliasTable(ShkPrbTable)
+    table['PermShk'] = PermShkTable
+    table['TranShk'] = TranShkTable
+    return table
+
+
+def makeMarkovPath(MrkvArray,MrkvInit,draws,block_size=None):
+    '''
+    Makes a path of a Markov chain from uniform draws, with the same outcome as
+    the loop "MrkvNow = np.searchsorted(np.cumsum(MrkvArray[MrkvNow,:]),draws[t])"
+    but without a Python loop over every period.  The draws are split into
+    blocks; the paths through all blocks from every possible starting state are
+    found together, one period of the block at a time, and then the blocks are
+    chained together.  With block_size near sqrt(T), this takes about 2*sqrt(T)
+    steps of numpy work instead of T steps of Python.
+
+    Parameters
+    ----------
+    MrkvArray : np.array
+        Square Markov transition matrix; row i holds the probabilities of moving
+        from state i to each state.
+    MrkvInit : int
+        Initial state.
+    draws : np.array
+        Uniform draws, one per transition.
+    block_size : int or None
+        Number of periods in each block; defaults to about sqrt(draws.size).
+
+    Returns
+    -------
+    path : np.array
+        Integer array of size draws.size+1: the initial state, then the state
+        after each transition.
+    '''
+    draws = np.asarray(draws)
+    T = draws.size
+    StateCount = MrkvArray.shape[0]
+    table = makeCutoffTable(MrkvArray)
+    if block_size is None:
+        block_size = max(int(np.sqrt(T)),1)
+    BlockCount = max(int(np.ceil(T/block_size)),1)
+    draws_blocked = np.zeros(BlockCount*block_size) # extra draws only affect states after the end
+    draws_blocked[:T] = draws
+    draws_blocked = np.reshape(draws_blocked,(BlockCount,block_size))
+
+    # Path through each block from every starting state
+    paths = np.zeros((block_size+1,BlockCount,StateCount),dtype=int)
+    paths[0] = np.arange(StateCount)
+    for b in range(block_size):
+        paths[b+1] = np.reshape(lookupCutoffTable(table,paths[b].flatten(),np.repeat(draws_blocked[:,b],StateCount)),
+                                (BlockCount,StateCount))
+
+    # Chain the blocks together and pick out the path actually taken
+    starts = np.zeros(BlockCount+1,dtype=int)
+    starts[0] = MrkvInit
+    for n in range(BlockCount):
+        starts[n+1] = paths[block_size,n,starts[n]]
+    path = np.zeros(BlockCount*block_size+1,dtype=int)
+    path[:-1] = np.transpose(paths[:block_size,np.arange(BlockCount),starts[:-1]]).flatten()
+    path[-1] = starts[-1]
+    return path[:(T+1)]
+
 
 if __name__ == '__main__':
     print("Sorry, HARK.simulation doesn't actually do anything on its own.")
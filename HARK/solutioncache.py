@@ -0,0 +1,293 @@
+'''
+An on-disk cache of the solutions of AgentTypes.  Solving an AgentType's model
+depends only on the inputs to its one period solver(s) (the attributes named in
+time_inv and time_vary), the terminal solution, the number of cycles and the
+solver itself.  A SolutionCache hashes all of these into a key, and stores the
+solution list under that key as a compressed pickle in a local directory, so a
+later solve of an identical problem (in this or another session) can just load
+it.  The total size of the directory is kept under a limit by deleting the
+least recently used solutions.
+
+To use it, give an AgentType a solution_cache attribute:
+
+    MyType.solution_cache = SolutionCache('/path/to/cache')
+    MyType.solve() # backward induction, then saved to the cache
+    MyType.solve() # loaded from the cache
+
+Solvers are identified by their name and bytecode, but not by the code of the
+functions and classes they call.  Clear the cache (SolutionCache.clear) after
+changing a model's solution code.
+'''
+import os
+import zlib
+import struct
+import hashlib
+import tempfile
+import cPickle as pickle
+import types
+import numpy as np
+
+class SolutionCache(object):
+    '''
+    A directory of solutions to AgentTypes' models, indexed by a hash of all of
+    the inputs that determine the solution.
+    '''
+    file_ext = '.sol'
+    version = 1 # changes to the key or the file format should increment this
+    exclude = ['solution','cFunc'] # time_vary outputs of a solve, not inputs (see unpackcFunc)
+
+    def __init__(self,directory,max_bytes=2**30,compress_level=6,exclude=None):
+        '''
+        Make a new solution cache, using (and if necessary creating) a directory.
+
+        Parameters
+        ----------
+        directory : string
+            Directory in which the solutions are stored.  Several caches (and
+            processes) can share a directory.
+        max_bytes : int
+            Maximum total size of the solution files in the directory.  After
+            storing a solution, the least recently used ones are deleted until
+            the directory is under this limit.
+        compress_level : int
+            Level of zlib compression of the solution files, from 0 to 9.
+        exclude : [string] or None
+            Names in time_inv and time_vary that are not inputs to the solver
+            (e.g. things unpacked from a previous solution) and are left out of
+            the key.  Defaults to SolutionCache.exclude.
+
+        Returns
+        -------
+        None
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        if exclude is not None:
+            self.exclude = list(exclude)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def makeKey(self,agent):
+        '''
+        Makes the key under which the solution of an AgentType is stored: a hash
+        of its class, one period solver(s), solution_terminal, cycles, tolerance,
+        pseudo_terminal, time_flow, and every attribute named in time_inv and
+        time_vary other than those in exclude (like the solution itself, or the
+        consumption functions added to time_vary by unpackcFunc).
+
+        Parameters
+        ----------
+        agent : AgentType
+            The agent whose solution is wanted.
+
+        Returns
+        -------
+        key : string or None
+            Hexadecimal hash of the inputs, or None if some input can't be hashed
+            reliably (in which case the solution shouldn't be cached).
+        '''
+        hasher = hashlib.sha1()
+        hasher.update('SolutionCache%d' % self.version)
+        try:
+            updateDigest(hasher,agent.__class__)
+            updateDigest(hasher,getattr(agent,'solveOnePeriod',None))
+            for name in ['solution_terminal','cycles','tolerance','pseudo_terminal','time_flow']:
+                hasher.update(name)
+                updateDigest(hasher,getattr(agent,name,None))
+            for name in agent.time_vary + agent.time_inv:
+                if name in self.exclude:
+                    continue
+                hasher.update(name)
+                updateDigest(hasher,getattr(agent,name))
+        except ValueError:
+            return None
+        return hasher.hexdigest()
+
+    def getPath(self,key):
+        '''
+        Returns the name of the file holding the solution with the given key.
+        '''
+        return os.path.join(self.directory,key + self.file_ext)
+
+    def load(self,key):
+        '''
+        Loads the solution stored under a key, marking it as recently used.
+
+        Parameters
+        ----------
+        key : string
+            Key made by makeKey.
+
+        Returns
+        -------
+        solution : [Solution] or None
+            The stored solution, or None if there is none (or it can't be read).
+        '''
+        path = self.getPath(key)
+        try:
+            with open(path,'rb') as f:
+                solution = pickle.loads(zlib.decompress(f.read()))
+        except IOError:
+            return None
+        except Exception:
+            # A damaged or outdated file is as good as none
+            self.remove(path)
+            return None
+        try:
+            os.utime(path,None)
+        except OSError:
+            pass
+        return solution
+
+    def store(self,key,solution):
+        '''
+        Stores a solution under a key, then evicts the least recently used
+        solutions if the cache is over its size limit.  Solutions that can't be
+        pickled (e.g. because they hold lambda functions) are not stored.
+
+        Parameters
+        ----------
+        key : string
+            Key made by makeKey.
+        solution : [Solution]
+            The solution to be stored.
+
+        Returns
+        -------
+        stored : boolean
+            Whether the solution was stored.
+        '''
+        try:
+            data = zlib.compress(pickle.dumps(solution,pickle.HIGHEST_PROTOCOL),self.compress_level)
+        except (pickle.PicklingError,TypeError,AttributeError):
+            return False
+
+        # Write to a temporary file first so that other processes never see a partial file
+        handle, temp_path = tempfile.mkstemp(suffix='.tmp',dir=self.directory)
+        with os.fdopen(handle,'wb') as f:
+            f.write(data)
+        os.rename(temp_path,self.getPath(key))
+        self.evict()
+        return True
+
+    def evict(self):
+        '''
+        Deletes the least recently used solutions until the total size of the
+        solution files is at most max_bytes.
+        '''
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(self.file_ext):
+                continue
+            path = os.path.join(self.directory,file_name)
+            try:
+                info = os.stat(path)
+            except OSError: # removed by another process
+                continue
+            entries.append((info.st_mtime,info.st_size,path))
+        total_bytes = sum(entry[1] for entry in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self.remove(path)
+            total_bytes -= size
+
+    def clear(self):
+        '''
+        Deletes all of the solutions in the cache.
+        '''
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(self.file_ext):
+                self.remove(os.path.join(self.directory,file_name))
+
+    def remove(self,path):
+        '''
+        Deletes a file from the cache, if it is still there.
+        '''
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def updateDigest(hasher,thing,active=None):
+    '''
+    Feeds a description of an object into a hash, in a way that is the same in
+    every session: numbers, strings and arrays by their values; lists, tuples and
+    dictionaries by their contents; functions by their module, name, bytecode,
+    constants, default arguments and closure; classes by module and name; and
+    other objects by their class and attributes.
+
+    Parameters
+    ----------
+    hasher : hashlib hash
+        The hash to be updated.
+    thing : object
+        The object to be described.
+    active : set or None
+        Ids of the objects being described further up the recursion, to stop at
+        reference cycles.
+
+    Returns
+    -------
+    None
+    '''
+    if active is None:
+        active = set()
+    if thing is None or isinstance(thing,bool):
+        hasher.update('b' + repr(thing))
+    elif isinstance(thing,(int,long,np.integer)):
+        hasher.update('i' + repr(int(thing)))
+    elif isinstance(thing,(float,np.floating)):
+        hasher.update('f' + struct.pack('<d',float(thing)))
+    elif isinstance(thing,(str,unicode)):
+        hasher.update('s%d:' % len(thing) + (thing.encode('utf-8') if isinstance(thing,unicode) else thing))
+    elif isinstance(thing,np.ndarray):
+        hasher.update('a' + thing.dtype.str + repr(thing.shape))
+        if thing.dtype.hasobject:
+            for x in thing.flat:
+                updateDigest(hasher,x,active)
+        else:
+            hasher.update(np.ascontiguousarray(thing).tobytes())
+    elif id(thing) in active:
+        hasher.update('cycle')
+    elif isinstance(thing,(list,tuple)):
+        hasher.update('l%d' % len(thing))
+        active.add(id(thing))
+        for x in thing:
+            updateDigest(hasher,x,active)
+        active.discard(id(thing))
+    elif isinstance(thing,dict):
+        hasher.update('d%d' % len(thing))
+        active.add(id(thing))
+        for key in sorted(thing.keys()):
+            updateDigest(hasher,key,active)
+            updateDigest(hasher,thing[key],active)
+        active.discard(id(thing))
+    elif isinstance(thing,types.MethodType):
+        # Bound methods are identified by their function and their object's class,
+        # not by the whole object (which is often the AgentType itself)
+        updateDigest(hasher,thing.im_func,active)
+        updateDigest(hasher,getattr(thing.im_self,'__class__',None),active)
+    elif isinstance(thing,types.FunctionType):
+        code = thing.func_code
+        hasher.update('F' + thing.__module__ + '.' + thing.__name__)
+        hasher.update(code.co_code)
+        active.add(id(thing))
+        updateDigest(hasher,[x for x in code.co_consts if not isinstance(x,types.CodeType)],active)
+        updateDigest(hasher,thing.func_defaults,active)
+        updateDigest(hasher,[cell.cell_contents for cell in (thing.func_closure or [])],active)
+        active.discard(id(thing))
+    elif isinstance(thing,(types.BuiltinFunctionType,np.ufunc)):
+        hasher.update('B' + str(getattr(thing,'__module__',None)) + '.' + thing.__name__)
+    elif isinstance(thing,(type,types.ClassType)):
+        hasher.update('C' + thing.__module__ + '.' + thing.__name__)
+    elif hasattr(thing,'__dict__'):
+        updateDigest(hasher,thing.__class__,active)
+        active.add(id(thing))
+        updateDigest(hasher,thing.__dict__,active)
+        active.discard(id(thing))
+    else:
+        raise ValueError('Cannot make a stable description of ' + repr(type(thing)))
@@ -0,0 +1,176 @@
+"""
+This file implements unit tests for the persistent pool of worker processes
+(AgentPool) and the shared memory arrays in HARK/parallel.py
+"""
+
+from HARK import Market
+import HARK.parallel as parallel
+from HARK.parallel import AgentPool, makeSharedArray, releaseSharedArray, \
+                          packSharedArray, unpackSharedArray, SharedArrayRef, \
+                          multiThreadCommands, removeSharedFiles, shared_dir
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import os
+import glob
+import numpy as np
+
+def makeSharedSimAgents(tag):
+    agents = []
+    for DiscFac in [0.94,0.96]:
+        agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        agent.cycles = 0
+        agent.DiscFac = DiscFac
+        agent.AgentCount = 100
+        agent.T_sim = 10
+        agent.track_vars = ['aNrmNow','cNrmNow']
+        agent.shared_memory = True
+        agent.shared_memory_tag = tag
+        agent.solve()
+        agents.append(agent)
+    return agents
+
+def countSharedFiles(tag):
+    return len(glob.glob(os.path.join(shared_dir,'HARK_' + tag + '_*.dat')))
+
+class testsForAgentPool(unittest.TestCase):
+
+    def setUp(self):
+        self.agents = []
+        for DiscFac in [0.94,0.95,0.96]:
+            agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+            agent.cycles = 0
+            agent.DiscFac = DiscFac
+            self.agents.append(agent)
+        self.pool = AgentPool(self.agents,num_jobs=2)
+        self.m_grid = np.linspace(0.0,20.0,41)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def makeLocalAgent(self,DiscFac):
+        agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        agent.cycles = 0
+        agent.DiscFac = DiscFac
+        agent.solve()
+        return agent
+
+    def test_solve_in_workers(self):
+        self.pool.run(['solve()'])
+        for agent in self.agents:
+            local = self.makeLocalAgent(agent.DiscFac)
+            self.assertTrue(np.array_equal(agent.solution[0].cFunc(self.m_grid),local.solution[0].cFunc(self.m_grid)))
+
+    def test_changed_attributes_are_sent(self):
+        self.pool.run(['solve()'])
+        self.agents[0].DiscFac = 0.90 # reassigned in the parent after the last call
+        self.pool.run(['solve()'])
+        local = self.makeLocalAgent(0.90)
+        self.assertTrue(np.array_equal(self.agents[0].solution[0].cFunc(self.m_grid),local.solution[0].cFunc(self.m_grid)))
+
+    def test_receive_vars(self):
+        self.pool.run(['solve()'],receive_vars=['DiscFac'])
+        self.assertFalse(hasattr(self.agents[0],'solution'))
+
+    def test_worker_error(self):
+        self.assertRaises(RuntimeError,self.pool.run,['notAMethod()'])
+
+    def test_shared_array_in_place(self):
+        # A shared array is passed by reference, so changes made by a worker are
+        # seen in the parent without sending the array back
+        for agent in self.agents:
+            agent.shared_thing = makeSharedArray((5,))
+        self.pool.run(['shared_thing.fill(3.0)'],receive_vars=[])
+        for agent in self.agents:
+            self.assertTrue(np.all(agent.shared_thing == 3.0))
+            releaseSharedArray(agent.shared_thing)
+
+
+class testsForMarketPool(unittest.TestCase):
+
+    def test_solveAgents(self):
+        agents = []
+        for DiscFac in [0.94,0.96]:
+            agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+            agent.cycles = 0
+            agent.DiscFac = DiscFac
+            agents.append(agent)
+        market = Market(agents=agents)
+        market.openPool(num_jobs=2)
+        try:
+            self.assertTrue(market.poolIsOpen())
+            market.solveAgents()
+        finally:
+            market.closePool()
+        self.assertFalse(market.poolIsOpen())
+        self.assertTrue(all(hasattr(agent,'solution') for agent in agents))
+
+
+class testsForSharedArrays(unittest.TestCase):
+
+    def test_pack_and_unpack(self):
+        array = makeSharedArray((3,4),dtype=np.int32)
+        array[:] = np.arange(12).reshape((3,4))
+        ref = packSharedArray(array)
+        self.assertTrue(isinstance(ref,SharedArrayRef))
+        same = unpackSharedArray(ref)
+        self.assertTrue(np.array_equal(same,array))
+        same[0,0] = 99
+        self.assertEqual(array[0,0],99)
+        self.assertTrue(releaseSharedArray(array))
+        self.assertFalse(os.path.exists(array.filename))
+
+    def test_other_values_unchanged(self):
+        array = np.zeros(3)
+        self.assertTrue(packSharedArray(array) is array)
+        self.assertFalse(releaseSharedArray(array))
+
+    def test_empty_array(self):
+        array = makeSharedArray((0,5))
+        self.assertEqual(array.shape,(0,5))
+        self.assertFalse(releaseSharedArray(array))
+
+
+class testsForWorkerFiles(unittest.TestCase):
+    # Shared memory files made in worker processes are deleted by the parent
+    # process, or by the worker itself if the commands that made them failed
+
+    def tearDown(self):
+        removeSharedFiles()
+
+    def test_multiThreadCommands_adopts_files(self):
+        agents = makeSharedSimAgents('adopttest')
+        multiThreadCommands(agents,['initializeSim()','simulate()'],num_jobs=2)
+        self.assertEqual(countSharedFiles('adopttest'),4)
+        for agent in agents:
+            for var_name in agent.track_vars:
+                filename = getattr(agent,var_name + '_hist').filename
+                self.assertEqual(parallel.shared_files[filename],os.getpid())
+        removeSharedFiles()
+        self.assertEqual(countSharedFiles('adopttest'),0)
+
+    def test_multiThreadCommands_failure(self):
+        agents = makeSharedSimAgents('failtest')
+        agents[0].DiscFac = 1 # only the first agent has DiscFac.bit_length()
+        self.assertRaises(RuntimeError,multiThreadCommands,agents,['initializeSim()','simulate()','DiscFac.bit_length()'],2)
+        self.assertTrue(hasattr(agents[0],'aNrmNow_hist')) # the other agent came back
+        self.assertFalse(hasattr(agents[1],'aNrmNow_hist'))
+        self.assertEqual(countSharedFiles('failtest'),2)
+        removeSharedFiles()
+        self.assertEqual(countSharedFiles('failtest'),0)
+
+    def test_AgentPool_files(self):
+        agents = makeSharedSimAgents('pooltest')
+        agents[0].DiscFac = 1
+        pool = AgentPool(agents,num_jobs=2)
+        try:
+            self.assertRaises(RuntimeError,pool.run,['initializeSim()','simulate()','DiscFac.bit_length()'])
+        finally:
+            pool.close()
+        self.assertEqual(countSharedFiles('pooltest'),2)
+        removeSharedFiles()
+        self.assertEqual(countSharedFiles('pooltest'),0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+This file implements unit tests for the histogram method distributions in
+HARK/ConsumptionSaving/ConsDistribution.py
+"""
+
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType
+from HARK.ConsumptionSaving.ConsMarkovModel import MarkovConsumerType
+from HARK.ConsumptionSaving.ConsDistribution import StationaryDistribution, DistributionOperator, \
+                                                    makeLotteryWeights
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import numpy as np
+from copy import copy
+
+class testsForLotteryWeights(unittest.TestCase):
+
+    def test_mass_and_mean(self):
+        grid = np.array([0.0,0.5,2.0,5.0])
+        x = np.array([0.0,0.2,1.0,2.0,4.9,5.0])
+        idx, weight = makeLotteryWeights(x,grid)
+        self.assertTrue(np.all((weight >= 0.0) & (weight <= 1.0)))
+        self.assertTrue(np.allclose(weight*grid[idx] + (1.0-weight)*grid[idx+1],x))
+
+    def test_outside_grid(self):
+        grid = np.array([0.0,1.0,2.0])
+        idx, weight = makeLotteryWeights(np.array([-1.0,3.0]),grid)
+        self.assertTrue(np.array_equal(idx,[0,1]))
+        self.assertTrue(np.array_equal(weight,[1.0,0.0]))
+
+
+class testsForInfiniteHorizonDistribution(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        self.agent.cycles = 0
+        self.agent.solve()
+        self.dstn = StationaryDistribution(self.agent)
+
+    def test_fixed_point(self):
+        dstn = self.dstn
+        pmf = dstn.pmf.copy()
+        pmf_p = dstn.pmf_p.copy()
+        self.assertAlmostEqual(np.sum(pmf),1.0)
+        dstn.advance()
+        self.assertTrue(np.allclose(dstn.pmf,pmf,rtol=0.0,atol=1e-10))
+        self.assertTrue(np.allclose(dstn.pmf_p,pmf_p,rtol=1e-8,atol=1e-12))
+
+    def test_advance_from_newborns(self):
+        # Moving a cohort of newborns forward converges to the stationary distribution
+        operator = DistributionOperator(self.agent,aNrmGrid=self.dstn.aNrmGrid)
+        operator.advance(2000)
+        self.assertTrue(np.allclose(operator.pmf,self.dstn.pmf,rtol=0.0,atol=1e-8))
+
+    def test_matches_simulation(self):
+        agent = self.agent
+        agent.AgentCount = 20000
+        agent.T_sim = 200
+        agent.track_vars = ['aNrmNow']
+        agent.initializeSim()
+        agent.simulate()
+        aNrm_sim = np.mean(agent.aNrmNow_hist[-50:])
+        aNrm_dstn = np.dot(self.dstn.pmf,np.tile(self.dstn.aNrmGrid,self.dstn.PeriodCount))
+        self.assertLess(abs(aNrm_dstn/aNrm_sim - 1.0),0.03)
+
+
+class testsForMarkovDistribution(unittest.TestCase):
+
+    def setUp(self):
+        params = copy(Params.init_idiosyncratic_shocks)
+        params['MrkvArray'] = [np.array([[0.95,0.05],[0.5,0.5]])]
+        params['global_markov'] = False
+        agent = MarkovConsumerType(**params)
+        agent.cycles = 0
+        agent.vFuncBool = False
+        employed_income_dist   = [np.ones(1),np.ones(1),np.ones(1)]
+        unemployed_income_dist = [np.ones(1),np.ones(1),0.3*np.ones(1)]
+        agent.IncomeDstn = [[employed_income_dist,unemployed_income_dist]]
+        agent.Rfree = np.array(2*[agent.Rfree])
+        agent.PermGroFac = [np.array(2*agent.PermGroFac)]
+        agent.LivPrb = [agent.LivPrb*np.ones(2)]
+        agent.MrkvPrbsInit = [0.9,0.1]
+        agent.timeFwd()
+        agent.solve()
+        self.agent = agent
+        self.dstn = StationaryDistribution(agent)
+
+    def test_fixed_point(self):
+        dstn = self.dstn
+        pmf = dstn.pmf.copy()
+        dstn.advance()
+        self.assertTrue(np.allclose(dstn.pmf,pmf,rtol=0.0,atol=1e-10))
+
+    def test_matches_simulation(self):
+        agent = self.agent
+        agent.AgentCount = 20000
+        agent.T_sim = 200
+        agent.track_vars = ['aNrmNow','MrkvNow']
+        agent.initializeSim()
+        agent.simulate()
+        pmf = self.dstn.getPeriodPmf(0)
+        aNrm = agent.aNrmNow_hist[-50:]
+        Mrkv = agent.MrkvNow_hist[-50:]
+        for j in range(2):
+            self.assertLess(abs(np.sum(pmf[j]) - np.mean(Mrkv == j)),0.005)
+            aNrm_dstn = np.dot(pmf[j],self.dstn.aNrmGrid)/np.sum(pmf[j])
+            self.assertLess(abs(aNrm_dstn/np.mean(aNrm[Mrkv == j]) - 1.0),0.03)
+
+
+class testsForLifecycleDistribution(unittest.TestCase):
+
+    def setUp(self):
+        # The lifecycle parameters have T_age = T_cycle + 1
+        self.agent = IndShockConsumerType(**Params.init_lifecycle)
+        self.agent.solve()
+        self.dstn = StationaryDistribution(self.agent)
+
+    def test_survival_by_age(self):
+        # Mass at each age is the mass at the previous age times its survival
+        # probability, including the extra period back in period 0 of the cycle
+        dstn = self.dstn
+        self.assertEqual(dstn.PeriodCount,self.agent.T_age)
+        mass = np.array([dstn.getPeriodPmf(t).sum() for t in range(dstn.PeriodCount)])
+        LivPrb = np.array([self.agent.LivPrb[t % self.agent.T_cycle] for t in range(dstn.PeriodCount-1)])
+        self.assertTrue(np.allclose(mass[1:],mass[:-1]*LivPrb,rtol=1e-8,atol=0.0))
+        self.assertAlmostEqual(mass.sum(),1.0)
+
+    def test_matches_simulation(self):
+        # Mean end-of-period assets by age match a large simulation
+        dstn = self.dstn
+        agent = self.agent
+        agent.AgentCount = 20000
+        agent.T_sim = 40
+        agent.track_vars = ['aNrmNow','t_age']
+        agent.initializeSim()
+        agent.simulate()
+        age = agent.t_age_hist[-1] - 1 # t_age has already been advanced
+        aNrm = agent.aNrmNow_hist[-1]
+        for t in range(6):
+            pmf = dstn.getPeriodPmf(t).sum(axis=0)
+            aNrm_dstn = np.dot(pmf,dstn.aNrmGrid)/np.sum(pmf)
+            aNrm_sim = np.mean(aNrm[age == t])
+            self.assertLess(abs(aNrm_dstn - aNrm_sim),0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+This file implements unit tests for simulating MarkovConsumerType, in
+HARK/ConsumptionSaving/ConsMarkovModel.py
+"""
+
+from HARK.interpolation import LinearInterp
+from HARK.ConsumptionSaving.ConsMarkovModel import MarkovConsumerType
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+from copy import copy
+import numpy as np
+
+def makeMarkovAgent():
+    '''
+    Makes and solves an infinite horizon consumer who switches between a good
+    and a bad employment state.
+    '''
+    init_markov = copy(Params.init_idiosyncratic_shocks)
+    init_markov['MrkvArray'] = [np.array([[0.9,0.1],[0.3,0.7]])]
+    init_markov['global_markov'] = False
+    agent = MarkovConsumerType(**init_markov)
+    agent.cycles = 0
+    agent.vFuncBool = False
+    agent.IncomeDstn = [[agent.IncomeDstn[0],[np.array([0.5,0.5]),np.array([0.9,1.1]),np.array([0.1,0.3])]]]
+    agent.Rfree = np.array(2*[agent.Rfree])
+    agent.PermGroFac = [np.array(2*agent.PermGroFac)]
+    agent.LivPrb = [agent.LivPrb*np.ones(2)]
+    agent.timeFwd()
+    agent.solve()
+    agent.AgentCount = 1000
+    agent.T_sim = 10
+    agent.MrkvPrbsInit = [0.5,0.5]
+    return agent
+
+
+class testsForMarkovSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = makeMarkovAgent()
+        self.agent.initializeSim()
+        self.agent.simulate()
+
+    def test_controls(self):
+        agent = self.agent
+        agent.getControls()
+        for j in range(2):
+            these = agent.MrkvNow == j
+            self.assertTrue(np.allclose(agent.cNrmNow[these],agent.solution[0].cFunc[j](agent.mNrmNow[these]),
+                                        rtol=1e-12,atol=1e-12))
+
+    def test_replaced_cFunc(self):
+        # Replacing the consumption functions after a simulation is seen by getControls
+        agent = self.agent
+        agent.solution[0].cFunc = [LinearInterp(np.array([0.0,1.0]),np.array([0.0,0.5*(j+1)]),lower_extrap=True)
+                                   for j in range(2)]
+        agent.getControls()
+        self.assertTrue(np.allclose(agent.cNrmNow,0.5*(agent.MrkvNow + 1)*agent.mNrmNow,rtol=1e-12,atol=1e-12))
+
+    def test_income_shock_frequencies(self):
+        # Each state's events are drawn with the probabilities of IncomeDstn[0][j],
+        # with PermGroFac[0][j] folded into the permanent shocks
+        agent = self.agent
+        agent.AgentCount = 40000
+        agent.t_cycle = np.zeros(agent.AgentCount,dtype=int)
+        MrkvNow = np.repeat([0,1],20000)
+        PermShkNow, TranShkNow = agent.drawIncShks(MrkvNow)
+        for j in range(2):
+            IncomeDstn = agent.IncomeDstn[0][j]
+            PermShk = IncomeDstn[1]*agent.PermGroFac[0][j]
+            for k in range(IncomeDstn[0].size):
+                freq = np.mean((PermShkNow[MrkvNow == j] == PermShk[k]) & (TranShkNow[MrkvNow == j] == IncomeDstn[2][k]))
+                self.assertTrue(abs(freq - IncomeDstn[0][k]) < 0.01)
+
+        # The tables are rebuilt when the growth factors change
+        agent.PermGroFac = [np.array([1.0,0.9])]
+        PermShkNow, TranShkNow = agent.drawIncShks(MrkvNow)
+        self.assertTrue(np.all(np.in1d(PermShkNow[MrkvNow == 1],0.9*agent.IncomeDstn[0][1][1])))
+
+
+if __name__ == '__main__':
+    unittest.main()
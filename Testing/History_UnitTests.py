@@ -0,0 +1,248 @@
+"""
+This file implements unit tests for recording simulated histories, in
+HARK/history.py and AgentType.simulate
+"""
+
+from HARK.parallel import shared_dir
+from HARK.history import RunningMoments, QuantileSketch, LorenzAccumulator, combineStats, \
+                         makeDiskArray, getHistoryBlock, iterHistoryBlocks
+from HARK.utilities import getPercentiles, getLorenzShares
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import os
+import glob
+import shutil
+import tempfile
+import numpy as np
+
+def makeSimAgent(**kwds):
+    agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+    agent.cycles = 0
+    agent.AgentCount = 500
+    agent.T_sim = 20
+    agent.track_vars = ['aNrmNow','cNrmNow','t_age']
+    for name in kwds:
+        setattr(agent,name,kwds[name])
+    agent.solve()
+    return agent
+
+
+class testsForSharedHistories(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = makeSimAgent(shared_memory=True,shared_memory_tag='histtest')
+
+    def tearDown(self):
+        self.agent.history_recorder.releaseHistories(self.agent)
+
+    def countFiles(self):
+        return len(glob.glob(os.path.join(shared_dir,'HARK_histtest_*.dat')))
+
+    def test_same_as_in_memory(self):
+        self.agent.initializeSim()
+        self.agent.simulate()
+        plain = makeSimAgent()
+        plain.initializeSim()
+        plain.simulate()
+        for var_name in self.agent.track_vars:
+            shared = getattr(self.agent,var_name + '_hist')
+            self.assertTrue(isinstance(shared,np.memmap))
+            self.assertTrue(np.array_equal(shared,getattr(plain,var_name + '_hist')))
+
+    def test_no_leaked_files(self):
+        # Each new simulation replaces the histories' files instead of adding to them
+        for i in range(3):
+            self.agent.initializeSim()
+            self.agent.simulate()
+            self.assertEqual(self.countFiles(),len(self.agent.track_vars))
+        self.agent.history_recorder.releaseHistories(self.agent)
+        self.assertEqual(self.countFiles(),0)
+
+
+class testsForHistoryOptions(unittest.TestCase):
+
+    def setUp(self):
+        self.full = makeSimAgent()
+        self.full.initializeSim()
+        self.full.simulate()
+
+    def simulateWith(self,**kwds):
+        agent = makeSimAgent(**kwds)
+        agent.initializeSim()
+        agent.simulate()
+        return agent
+
+    def test_period_step(self):
+        agent = self.simulateWith(hist_period_step=3)
+        self.assertEqual(agent.aNrmNow_hist.shape,(7,agent.AgentCount))
+        self.assertTrue(np.array_equal(agent.aNrmNow_hist,self.full.aNrmNow_hist[::3]))
+
+    def test_agent_subset(self):
+        agent = self.simulateWith(hist_agents=50)
+        self.assertEqual(agent.hist_agent_idx.size,50)
+        self.assertTrue(np.array_equal(agent.aNrmNow_hist,self.full.aNrmNow_hist[:,agent.hist_agent_idx]))
+
+    def test_float_type(self):
+        agent = self.simulateWith(hist_float_type=np.float32)
+        self.assertEqual(agent.aNrmNow_hist.dtype,np.float32)
+        self.assertEqual(agent.t_age_hist.dtype,self.full.t_age_hist.dtype)
+        self.assertTrue(np.array_equal(agent.aNrmNow_hist,self.full.aNrmNow_hist.astype(np.float32)))
+
+
+class testsForDiskHistories(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_makeDiskArray(self):
+        array = makeDiskArray((4,3),np.float32,os.path.join(self.directory,'new'),'aNrmNow')
+        self.assertTrue(isinstance(array,np.memmap))
+        self.assertEqual(array.shape,(4,3))
+        self.assertEqual(array.dtype,np.float32)
+        self.assertEqual(os.path.dirname(array.filename),os.path.join(self.directory,'new'))
+        self.assertTrue(os.path.basename(array.filename).startswith('HARK_hist_aNrmNow_'))
+        empty = makeDiskArray((0,3),float,self.directory)
+        self.assertEqual(empty.shape,(0,3))
+
+    def test_same_as_in_memory(self):
+        agent = makeSimAgent(hist_disk_dir=self.directory)
+        agent.initializeSim()
+        agent.simulate()
+        plain = makeSimAgent()
+        plain.initializeSim()
+        plain.simulate()
+        self.assertEqual(len(os.listdir(self.directory)),len(agent.track_vars))
+        for var_name in agent.track_vars:
+            on_disk = getattr(agent,var_name + '_hist')
+            self.assertTrue(isinstance(on_disk,np.memmap))
+            self.assertTrue(np.array_equal(on_disk,getattr(plain,var_name + '_hist')))
+
+
+class testsForHistoryBlocks(unittest.TestCase):
+
+    def setUp(self):
+        RNG = np.random.RandomState(0)
+        self.histories = [RNG.uniform(size=(23,N)) for N in [5,8,3]]
+        self.whole = np.concatenate(self.histories,axis=1)
+
+    def test_getHistoryBlock(self):
+        self.assertTrue(np.array_equal(getHistoryBlock(self.histories,4,11),self.whole[4:11]))
+        self.assertTrue(np.array_equal(getHistoryBlock(self.histories[:1],4,11),self.histories[0][4:11]))
+        self.assertTrue(np.array_equal(getHistoryBlock(self.histories[1],0,23),self.histories[1]))
+
+    def test_blocks_cover_history(self):
+        for histories, whole in [(self.histories,self.whole),(self.histories[0],self.histories[0])]:
+            for block_size in [1,5,7,23,100]:
+                blocks = list(iterHistoryBlocks(histories,block_size))
+                self.assertEqual([t for t, block in blocks],range(0,23,block_size))
+                self.assertTrue(np.array_equal(np.concatenate([block for t, block in blocks]),whole))
+
+    def test_overlap_and_window(self):
+        t0, t1 = 3, 20
+        for block_size in [1,4,6]:
+            for overlap in [0,1,2]:
+                t_new = t0
+                for t, block in iterHistoryBlocks(self.histories,block_size,t0=t0,t1=t1,overlap=overlap):
+                    self.assertEqual(t,max(t_new - overlap,t0))
+                    t_end = min(t_new + block_size,t1)
+                    self.assertTrue(np.array_equal(block,self.whole[t:t_end]))
+                    t_new = t_end
+                self.assertEqual(t_new,t1)
+
+
+class testsForStreamingStats(unittest.TestCase):
+
+    def setUp(self):
+        RNG = np.random.RandomState(0)
+        self.values = [RNG.lognormal(0.0,1.0,size=1000) for t in range(10)]
+        self.weights = [RNG.uniform(0.5,1.5,size=1000) for t in range(10)]
+        self.percentiles = [0.1,0.25,0.5,0.75,0.9]
+
+    def feed(self,stat,cols):
+        stat.reset(len(self.values))
+        for t in range(len(self.values)):
+            stat.add(self.values[t][cols],self.weights[t][cols],t,True)
+        return stat
+
+    def test_moments_merge(self):
+        # Merging the moments of two halves of the agents gives the moments of all of them
+        whole = self.feed(RunningMoments(),slice(None))
+        parts = [self.feed(RunningMoments(),slice(0,300)),self.feed(RunningMoments(),slice(300,None))]
+        merged = combineStats(parts)
+        all_values = np.concatenate(self.values)
+        all_weights = np.concatenate(self.weights)
+        mean = np.average(all_values,weights=all_weights)
+        var = np.average((all_values-mean)**2,weights=all_weights)
+        for stat in [whole,merged]:
+            self.assertAlmostEqual(stat.mean(),mean)
+            self.assertAlmostEqual(stat.var(),var)
+        self.assertTrue(np.allclose(merged.mean_by_t,whole.mean_by_t,rtol=1e-12,atol=0.0))
+        self.assertTrue(np.allclose(merged.var_by_t,whole.var_by_t,rtol=1e-12,atol=0.0))
+
+    def test_quantile_sketch(self):
+        whole = self.feed(QuantileSketch(self.percentiles),slice(None))
+        parts = [self.feed(QuantileSketch(self.percentiles),slice(0,300)),
+                 self.feed(QuantileSketch(self.percentiles),slice(300,None))]
+        merged = combineStats(parts)
+        exact = getPercentiles(np.concatenate(self.values),np.concatenate(self.weights),self.percentiles)
+        self.assertTrue(np.allclose(whole.getPercentiles(),exact,rtol=0.01,atol=0.0))
+        self.assertTrue(np.allclose(merged.getPercentiles(),exact,rtol=0.01,atol=0.0))
+        self.assertTrue(np.allclose(whole.pctl_by_t[0],getPercentiles(self.values[0],self.weights[0],self.percentiles)))
+        self.assertTrue(np.all(np.isnan(merged.pctl_by_t)))
+
+    def test_lorenz(self):
+        whole = self.feed(LorenzAccumulator(self.percentiles),slice(None))
+        exact = getLorenzShares(np.concatenate(self.values),np.concatenate(self.weights),self.percentiles)
+        self.assertTrue(np.allclose(whole.getLorenzShares(),exact,rtol=0.01,atol=0.0))
+
+    def test_track_stats(self):
+        # Statistics computed as the agents are simulated match their histories
+        agent = makeSimAgent(track_stats={'aNrmNow':[RunningMoments(t0=10)]})
+        agent.initializeSim()
+        agent.simulate()
+        stat = agent.track_stats['aNrmNow'][0]
+        self.assertTrue(np.allclose(stat.mean_by_t,np.mean(agent.aNrmNow_hist,axis=1)))
+        self.assertAlmostEqual(stat.mean(),np.mean(agent.aNrmNow_hist[10:]))
+        self.assertAlmostEqual(stat.var(),np.var(agent.aNrmNow_hist[10:]))
+
+
+class testsForShardedSimulation(unittest.TestCase):
+
+    def simulateSharded(self,num_jobs):
+        agent = makeSimAgent(track_stats={'aNrmNow':[RunningMoments()]})
+        agent.simulateSharded(3,num_jobs=num_jobs)
+        return agent
+
+    def test_same_for_any_num_jobs(self):
+        serial = self.simulateSharded(1)
+        parallel = self.simulateSharded(2)
+        for var_name in serial.track_vars:
+            self.assertTrue(np.array_equal(getattr(serial,var_name + '_hist'),getattr(parallel,var_name + '_hist')))
+        for var_name in ['aNrmNow','pLvlNow','t_age','t_cycle']:
+            self.assertTrue(np.array_equal(getattr(serial,var_name),getattr(parallel,var_name)))
+        self.assertEqual(serial.t_sim,parallel.t_sim)
+        self.assertEqual(serial.track_stats['aNrmNow'][0].mean(),parallel.track_stats['aNrmNow'][0].mean())
+        self.assertEqual(len(glob.glob(os.path.join(shared_dir,'HARK_' + str(os.getpid()) + '_*.dat'))),0)
+
+    def test_shards_put_back_together(self):
+        agent = self.simulateSharded(1)
+        self.assertEqual(agent.aNrmNow_hist.shape,(agent.T_sim,agent.AgentCount))
+        self.assertEqual(agent.aNrmNow.size,agent.AgentCount)
+        self.assertFalse(np.any(np.isnan(agent.aNrmNow_hist)))
+        stat = agent.track_stats['aNrmNow'][0]
+        self.assertAlmostEqual(stat.mean(),np.mean(agent.aNrmNow_hist))
+        self.assertTrue(np.allclose(stat.mean_by_t,np.mean(agent.aNrmNow_hist,axis=1)))
+
+    def test_reproducible(self):
+        first = self.simulateSharded(1)
+        second = self.simulateSharded(1)
+        self.assertTrue(np.array_equal(first.aNrmNow_hist,second.aNrmNow_hist))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+This file implements unit tests for solving several consumer types together
+with solveIndShockBatch in HARK/ConsumptionSaving/ConsIndShockModel.py
+"""
+
+import HARK.ConsumptionSaving.ConsIndShockModel as Model
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import numpy as np
+
+class testsForIndShockBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.DiscFac_list = [0.94,0.95,0.96,0.97]
+        self.m_grid = np.linspace(0.0,50.0,101)
+
+    def makeAgents(self,**kwds):
+        agents = []
+        for DiscFac in self.DiscFac_list:
+            agent = Model.IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+            agent.cycles = 0
+            agent.DiscFac = DiscFac
+            for name in kwds:
+                setattr(agent,name,kwds[name])
+            agents.append(agent)
+        return agents
+
+    def compareBatchAndIndividual(self,batch_agents):
+        Model.solveIndShockBatch(batch_agents)
+        single_agents = self.makeAgents()
+        for k in range(len(single_agents)):
+            single = single_agents[k]
+            for name in ['vFuncBool','CubicBool']:
+                setattr(single,name,getattr(batch_agents[k],name))
+            single.solve()
+            batch_sol = batch_agents[k].solution[0]
+            single_sol = single.solution[0]
+            self.assertEqual(len(batch_agents[k].solution),len(single.solution))
+            self.assertTrue(np.array_equal(batch_sol.cFunc(self.m_grid),single_sol.cFunc(self.m_grid)))
+            self.assertAlmostEqual(batch_sol.MPCmin,single_sol.MPCmin)
+            self.assertAlmostEqual(batch_sol.hNrm,single_sol.hNrm)
+
+    def test_DiscFac_spread(self):
+        agents = self.makeAgents()
+        self.assertTrue(Model.canSolveIndShockBatch(agents))
+        self.compareBatchAndIndividual(agents)
+
+    def test_not_batchable(self):
+        # Types with a value function are solved one at a time
+        agents = self.makeAgents(vFuncBool=True)
+        self.assertFalse(Model.canSolveIndShockBatch(agents))
+        self.compareBatchAndIndividual(agents)
+    def test_warm_start(self):
+        # Warm starts are used and stored by batched solves just as by solve()
+        self.DiscFac_list = [0.94,0.96]
+        batch_agents = self.makeAgents(warm_start=True)
+        single_agents = self.makeAgents(warm_start=True)
+        cold_agents = self.makeAgents(warm_start=True,Rfree=1.02)
+        Model.solveIndShockBatch(batch_agents)
+        for agent in single_agents:
+            agent.solve()
+        for agent in batch_agents + single_agents:
+            agent.Rfree = 1.02
+        Model.solveIndShockBatch(batch_agents)
+        m_grid = np.array([0.5,2.0,5.0,20.0,200.0,2000.0])
+        for k in range(len(batch_agents)):
+            self.assertEqual(len(batch_agents[k].warm_start_cache),2)
+            single_agents[k].solve()
+            cold_agents[k].solve()
+            batch_sol = batch_agents[k].solution[0]
+            self.assertTrue(np.array_equal(batch_sol.cFunc(m_grid),single_agents[k].solution[0].cFunc(m_grid)))
+            self.assertTrue(np.allclose(batch_sol.cFunc(m_grid),cold_agents[k].solution[0].cFunc(m_grid),rtol=1e-4,atol=0.0))
+            self.assertTrue(np.allclose(batch_sol.hNrm,cold_agents[k].solution[0].hNrm,rtol=1e-4,atol=0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,526 @@
+"""
+This file implements unit tests for the interpolators in HARK/interpolation.py
+"""
+
+from HARK.interpolation import LinearInterp, BilinearInterp, TrilinearInterp, QuadlinearInterp, \
+                               LinearInterpOnInterp1D, BilinearInterpOnInterp1D, TrilinearInterpOnInterp1D, \
+                               LinearInterpOnInterp2D, BilinearInterpOnInterp2D, LowerEnvelope2D, \
+                               LowerEnvelope3D, VariableLowerBoundFunc2D, VariableLowerBoundFunc3D, \
+                               CubicInterp, KinkedLinearInterp, LowerEnvelope, InterpolatorBank, \
+                               makeLowerEnvelope, _findGridType, _findSegments, _groupByBracket, \
+                               _evalOnBrackets, _stackLinearInterps, Curvilinear2DInterp
+
+import unittest
+import numpy as np
+
+def smoothFunc(*args):
+    '''
+    A smooth function of two to four variables with interactions between them,
+    to be interpolated.
+    '''
+    out = np.exp(0.3*args[0])*np.log(1.0 + args[1]) + args[0]*args[1]**2
+    if len(args) > 2:
+        out = out + np.sqrt(args[2])*args[1] - 0.5*args[0]*args[2]
+    if len(args) > 3:
+        out = out + args[3]**2*args[0] + np.sin(args[3])*args[2]
+    return out
+
+def finiteDifference(func,args,k,h=1e-6):
+    '''
+    Central finite difference of func with respect to its k-th argument.
+    '''
+    up = list(args)
+    down = list(args)
+    up[k] = args[k] + h
+    down[k] = args[k] - h
+    return (func(*up) - func(*down))/(2.0*h)
+
+class InterpolatorTestCase(unittest.TestCase):
+    '''
+    Common setup and checks for interpolators of two to four variables.
+    '''
+    names = ['W','X','Y','Z']
+
+    def setUp(self):
+        self.grids = [np.array([0.0,0.3,0.7,1.2,2.0,3.0]),
+                      np.array([0.5,0.8,1.5,2.5,4.0]),
+                      np.array([1.0,1.5,2.2,3.0]),
+                      np.array([-1.0,-0.2,0.5,1.0])]
+        RNG = np.random.RandomState(0)
+        self.points = [RNG.uniform(grid[0],grid[-1],size=300) for grid in self.grids]
+
+    def getNames(self,d):
+        return self.names[-d:] if d == 4 else self.names[1:(d+1)]
+
+    def checkDerivatives(self,func,d):
+        # Each partial derivative matches a central finite difference
+        args = self.points[:d]
+        for k, name in enumerate(self.getNames(d)):
+            der = getattr(func,'derivative' + name)(*args)
+            self.assertTrue(np.allclose(der,finiteDifference(func,args,k),rtol=1e-5,atol=1e-5),
+                            msg='derivative' + name + ' of ' + func.__class__.__name__)
+
+    def checkGradient(self,func,d):
+        # eval_with_gradient gives the same as the separate calls
+        args = self.points[:d]
+        out = func.eval_with_gradient(*args)
+        self.assertEqual(len(out),d+1)
+        self.assertTrue(np.allclose(out[0],func(*args),rtol=1e-12,atol=1e-12))
+        for k, name in enumerate(self.getNames(d)):
+            self.assertTrue(np.allclose(out[k+1],getattr(func,'derivative' + name)(*args),rtol=1e-12,atol=1e-12),
+                            msg='eval_with_gradient of ' + func.__class__.__name__ + ' for ' + name)
+
+    def gridValues(self,d,shift=0.0):
+        mesh = np.meshgrid(*self.grids[:d],indexing='ij')
+        return smoothFunc(*mesh) + shift
+
+
+class testsForMultilinearInterp(InterpolatorTestCase):
+
+    def makeFuncs(self):
+        return [(BilinearInterp(self.gridValues(2),*self.grids[:2]),2),
+                (TrilinearInterp(self.gridValues(3),*self.grids[:3]),3),
+                (QuadlinearInterp(self.gridValues(4),*self.grids),4)]
+
+    def test_derivatives(self):
+        for func, d in self.makeFuncs():
+            self.checkDerivatives(func,d)
+
+    def test_eval_with_gradient(self):
+        for func, d in self.makeFuncs():
+            self.checkGradient(func,d)
+
+    def test_scalar_input(self):
+        func = BilinearInterp(self.gridValues(2),*self.grids[:2])
+        f, dfdx, dfdy = func.eval_with_gradient(1.0,2.0)
+        self.assertAlmostEqual(f,func(1.0,2.0))
+        self.assertAlmostEqual(dfdy,func.derivativeY(1.0,2.0))
+
+
+class testsForInterpOnInterp(InterpolatorTestCase):
+
+    def makeLinearOnInterp1D(self):
+        x, y = self.grids[:2]
+        return LinearInterpOnInterp1D([LinearInterp(x,smoothFunc(x,y_j*np.ones_like(x))) for y_j in y],y)
+
+    def makeBilinearOnInterp1D(self):
+        x, y, z = self.grids[:3]
+        interpolators = [[LinearInterp(x,smoothFunc(x,y_j*np.ones_like(x),z_k*np.ones_like(x))) for z_k in z]
+                         for y_j in y]
+        return BilinearInterpOnInterp1D(interpolators,y,z)
+
+    def makeTrilinearOnInterp1D(self):
+        w, x, y, z = self.grids
+        ones = np.ones_like(w)
+        interpolators = [[[LinearInterp(w,smoothFunc(w,x_i*ones,y_j*ones,z_k*ones)) for z_k in z]
+                          for y_j in y] for x_i in x]
+        return TrilinearInterpOnInterp1D(interpolators,x,y,z)
+
+    def makeLinearOnInterp2D(self):
+        x, y, z = self.grids[:3]
+        mesh = np.meshgrid(x,y,indexing='ij')
+        return LinearInterpOnInterp2D([BilinearInterp(smoothFunc(mesh[0],mesh[1],z_k*np.ones_like(mesh[0])),x,y)
+                                       for z_k in z],z)
+
+    def makeBilinearOnInterp2D(self):
+        w, x, y, z = self.grids
+        mesh = np.meshgrid(w,x,indexing='ij')
+        ones = np.ones_like(mesh[0])
+        interpolators = [[BilinearInterp(smoothFunc(mesh[0],mesh[1],y_j*ones,z_k*ones),w,x) for z_k in z]
+                         for y_j in y]
+        return BilinearInterpOnInterp2D(interpolators,y,z)
+
+    def test_derivatives(self):
+        self.checkDerivatives(self.makeLinearOnInterp1D(),2)
+        self.checkDerivatives(self.makeBilinearOnInterp1D(),3)
+        self.checkDerivatives(self.makeTrilinearOnInterp1D(),4)
+        self.checkDerivatives(self.makeLinearOnInterp2D(),3)
+        self.checkDerivatives(self.makeBilinearOnInterp2D(),4)
+
+    def test_eval_with_gradient(self):
+        self.checkGradient(self.makeLinearOnInterp1D(),2)
+        self.checkGradient(self.makeBilinearOnInterp1D(),3)
+
+
+class testsForLowerEnvelopes(InterpolatorTestCase):
+
+    def makeFuncs(self):
+        # Two functions that cross inside the grid
+        env2D = LowerEnvelope2D(BilinearInterp(self.gridValues(2),*self.grids[:2]),
+                                BilinearInterp(self.gridValues(2)[::-1,:] + 1.0,*self.grids[:2]))
+        env3D = LowerEnvelope3D(TrilinearInterp(self.gridValues(3),*self.grids[:3]),
+                                TrilinearInterp(self.gridValues(3)[:,::-1,:] - 1.0,*self.grids[:3]))
+        return [(env2D,2),(env3D,3)]
+
+    def test_derivatives(self):
+        for func, d in self.makeFuncs():
+            self.checkDerivatives(func,d)
+
+    def test_eval_with_gradient(self):
+        for func, d in self.makeFuncs():
+            self.checkGradient(func,d)
+
+
+class testsForVariableLowerBound(InterpolatorTestCase):
+
+    def setUp(self):
+        InterpolatorTestCase.setUp(self)
+        # Keep x above the lower bound, so that x minus the bound stays on the grid
+        y = self.grids[1]
+        self.lowerBound = LinearInterp(y,-0.2*y + 0.1*y**2 - 0.3)
+        self.points[0] = self.points[0] + self.lowerBound(self.points[1])
+
+    def makeFuncs(self):
+        func2D = VariableLowerBoundFunc2D(BilinearInterp(self.gridValues(2),*self.grids[:2]),self.lowerBound)
+        func3D = VariableLowerBoundFunc3D(TrilinearInterp(self.gridValues(3),*self.grids[:3]),self.lowerBound)
+        return [(func2D,2),(func3D,3)]
+
+    def test_derivatives(self):
+        for func, d in self.makeFuncs():
+            self.checkDerivatives(func,d)
+
+    def test_eval_with_gradient(self):
+        for func, d in self.makeFuncs():
+            self.checkGradient(func,d)
+
+
+class testsForBracketedInterpOnInterp(unittest.TestCase):
+
+    def setUp(self):
+        self.x_grid = np.array([0.0,0.3,0.7,1.2,2.0,3.0])
+        self.y_grid = np.array([0.5,0.8,1.5,2.5,4.0])
+        self.z_grid = np.array([1.0,1.5,2.2,3.0])
+        # Points off the grid in every direction, as well as on it
+        RNG = np.random.RandomState(0)
+        self.x = RNG.uniform(-0.5,4.0,size=300)
+        self.y = RNG.uniform(0.0,5.0,size=300)
+        self.z = RNG.uniform(0.5,4.0,size=300)
+
+    def makeInterp(self,y,z,shared):
+        # Each x interpolator is on its own grid unless shared
+        x = self.x_grid if shared else self.x_grid*(1.0 + 0.1*y + 0.03*z)
+        return LinearInterp(x,smoothFunc(x,y*np.ones_like(x),z*np.ones_like(x)))
+
+    def makeFuncs(self,shared):
+        func2D = LinearInterpOnInterp1D([self.makeInterp(y,1.0,shared) for y in self.y_grid],self.y_grid)
+        func3D = BilinearInterpOnInterp1D([[self.makeInterp(y,z,shared) for z in self.z_grid]
+                                           for y in self.y_grid],self.y_grid,self.z_grid)
+        return func2D, func3D
+
+    def checkSame(self,mine,theirs):
+        self.assertTrue(np.array_equal(np.isnan(mine),np.isnan(theirs)))
+        self.assertTrue(np.allclose(mine,theirs,rtol=1e-12,atol=1e-12,equal_nan=True))
+
+    def checkAgainstScalar(self,func,args,names):
+        # The vector paths give the same results as evaluating one point at a time
+        points = zip(*args)
+        self.checkSame(func(*args),np.array([func(*point) for point in points]))
+        gradient = func.eval_with_gradient(*args)
+        self.checkSame(gradient[0],func(*args))
+        for k, name in enumerate(names):
+            der = getattr(func,'derivative' + name)
+            self.checkSame(der(*args),np.array([der(*point) for point in points]))
+            self.checkSame(gradient[k+1],der(*args))
+
+    def test_stacked_and_unstacked(self):
+        for shared in [True,False]:
+            func2D, func3D = self.makeFuncs(shared)
+            self.assertEqual(func2D.x_stack is not None,shared)
+            self.assertEqual(func3D.x_stack is not None,shared)
+            self.checkAgainstScalar(func2D,[self.x,self.y],'XY')
+            self.checkAgainstScalar(func3D,[self.x,self.y,self.z],'XYZ')
+
+    def test_stacked_same_as_unstacked(self):
+        func2D, func3D = self.makeFuncs(True)
+        func2D_alone = LinearInterpOnInterp1D(func2D.xInterpolators,self.y_grid)
+        func2D_alone.x_stack = None
+        self.checkSame(func2D(self.x,self.y),func2D_alone(self.x,self.y))
+        self.checkSame(func2D.derivativeX(self.x,self.y),func2D_alone.derivativeX(self.x,self.y))
+        func3D_alone = BilinearInterpOnInterp1D(func3D.xInterpolators,self.y_grid,self.z_grid)
+        func3D_alone.x_stack = None
+        self.checkSame(func3D(self.x,self.y,self.z),func3D_alone(self.x,self.y,self.z))
+        self.checkSame(func3D.derivativeZ(self.x,self.y,self.z),func3D_alone.derivativeZ(self.x,self.y,self.z))
+
+    def test_empty_input(self):
+        empty = np.zeros(0)
+        for shared in [True,False]:
+            func2D, func3D = self.makeFuncs(shared)
+            self.assertEqual(func2D(empty,empty).size,0)
+            self.assertEqual(func3D.derivativeY(empty,empty,empty).size,0)
+            self.assertTrue(all(f.size == 0 for f in func2D.eval_with_gradient(empty,empty)))
+            self.assertTrue(all(f.size == 0 for f in func3D.eval_with_gradient(empty,empty,empty)))
+
+    def test_stack_requires_same_grid(self):
+        x = self.x_grid
+        self.assertTrue(_stackLinearInterps([LinearInterp(x,x),LinearInterp(x,2*x)]) is not None)
+        for other in [LinearInterp(x+0.1,x),LinearInterp(x,x,lower_extrap=True),
+                      LinearInterp(x,x,intercept_limit=0.0,slope_limit=1.0),CubicInterp(x,x,np.ones_like(x))]:
+            self.assertTrue(_stackLinearInterps([LinearInterp(x,x),other]) is None)
+
+    def test_groupByBracket(self):
+        pos = np.array([3,1,1,4,3,1])
+        order, bounds = _groupByBracket(pos,6)
+        self.assertTrue(np.array_equal(pos[order],np.sort(pos)))
+        self.assertTrue(np.array_equal(bounds,[0,0,3,3,5,6,6]))
+
+    def test_evalOnBrackets(self):
+        funcs = [self.makeInterp(y,1.0,False) for y in self.y_grid]
+        pos = np.maximum(np.minimum(np.searchsorted(self.y_grid,self.y),self.y_grid.size-1),1)
+        order, f_lo, f_hi, d_lo, d_hi = _evalOnBrackets(funcs,self.x,pos,with_der=True)
+        x, pos = self.x[order], pos[order]
+        for i in range(x.size):
+            self.assertTrue(np.allclose([f_lo[i],f_hi[i],d_lo[i],d_hi[i]],
+                                        [funcs[pos[i]-1](x[i]),funcs[pos[i]](x[i]),
+                                         funcs[pos[i]-1].derivative(x[i]),funcs[pos[i]].derivative(x[i])],
+                                        rtol=0.0,atol=0.0,equal_nan=True))
+
+
+class testsForCurvilinear2DInterp(unittest.TestCase):
+
+    def setUp(self):
+        # A smoothly warped grid, whose sectors don't overlap
+        u, v = np.meshgrid(np.linspace(0.0,1.0,12),np.linspace(0.0,1.0,9),indexing='ij')
+        self.x_values = 3.0*u + 0.4*v**2 + 0.2*u*v
+        self.y_values = 2.0*v + 0.3*np.sin(2.0*u) + 0.1*u*v
+        self.f_values = smoothFunc(self.x_values + 0.1,self.y_values + 0.5)
+        RNG = np.random.RandomState(0)
+        self.x = RNG.uniform(-0.5,4.0,size=2000)
+        self.y = RNG.uniform(-0.5,3.0,size=2000)
+
+    def findSectorFromMiddle(self,interp,x,y):
+        m = x.size
+        return interp.walkToSector(x,y,np.zeros(m,dtype=int) + interp.x_n//2,np.zeros(m,dtype=int) + interp.y_n//2)
+
+    def checkSameSectors(self,interp,x,y):
+        x_pos, y_pos = interp.findSector(x,y)
+        x_mid, y_mid = self.findSectorFromMiddle(interp,x,y)
+        self.assertTrue(np.array_equal(x_pos,x_mid))
+        self.assertTrue(np.array_equal(y_pos,y_mid))
+
+    def test_interior(self):
+        interp = Curvilinear2DInterp(self.f_values,self.x_values,self.y_values)
+        self.assertTrue(interp.index_x_step is not None)
+        x_pos, y_pos = self.findSectorFromMiddle(interp,self.x,self.y)
+        alpha, beta = interp.findCoords(self.x,self.y,x_pos,y_pos)
+        inside = (alpha >= 0.0) & (alpha <= 1.0) & (beta >= 0.0) & (beta <= 1.0)
+        self.assertTrue(np.sum(inside) > 500)
+        self.checkSameSectors(interp,self.x[inside],self.y[inside])
+
+    def test_off_grid(self):
+        interp = Curvilinear2DInterp(self.f_values,self.x_values,self.y_values)
+        x = np.concatenate((self.x,[-10.0,10.0,1.0,1.0,-10.0,10.0]))
+        y = np.concatenate((self.y,[1.0,1.0,-10.0,10.0,-10.0,10.0]))
+        self.checkSameSectors(interp,x,y)
+
+    def test_degenerate_grid(self):
+        # All gridpoints have the same y, so the index can't be made
+        interp = Curvilinear2DInterp(self.f_values,self.x_values,np.zeros_like(self.y_values))
+        self.assertTrue(interp.index_x_step is None)
+        self.checkSameSectors(interp,self.x,np.zeros_like(self.x))
+
+
+class testsForGridSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.grids = {'linear' : np.linspace(-2.0,10.0,40),
+                      'log1p' : np.expm1(np.linspace(0.0,np.log1p(20.0),40)),
+                      'log' : np.exp(np.linspace(np.log(0.1),np.log(20.0),40)),
+                      None : np.linspace(0.0,1.0,40)**2}
+
+    def makePoints(self,x_list):
+        # Gridpoints, the points just either side of them, random points and
+        # points off the grid
+        RNG = np.random.RandomState(0)
+        return np.concatenate((x_list,np.nextafter(x_list,-np.inf),np.nextafter(x_list,np.inf),
+                               RNG.uniform(x_list[0]-1.0,x_list[-1]+1.0,size=200),[-np.inf,np.inf]))
+
+    def test_grid_type(self):
+        for grid_type in self.grids:
+            self.assertEqual(_findGridType(self.grids[grid_type])[0],grid_type)
+        self.assertEqual(_findGridType(np.array([1.0,np.inf]))[0],None)
+
+    def test_same_as_search(self):
+        for grid_type, x_list in self.grids.items():
+            x = self.makePoints(x_list)
+            i = _findSegments(x_list,*(_findGridType(x_list) + (x,)))
+            self.assertTrue(np.array_equal(i,np.maximum(np.searchsorted(x_list[:-1],x),1)),msg=str(grid_type))
+
+    def test_eval_into(self):
+        for grid_type, x_list in self.grids.items():
+            func = LinearInterp(x_list,np.sqrt(x_list - x_list[0]),lower_extrap=True)
+            x = self.makePoints(x_list)[:-2]
+            y, dydx = np.zeros(x.size), np.zeros(x.size)
+            func.eval_into(x,y,dydx)
+            self.assertTrue(np.array_equal(y,func(x)))
+            self.assertTrue(np.array_equal(dydx,func.derivative(x)))
+
+
+class testsForKinkedLinearInterp(unittest.TestCase):
+
+    def setUp(self):
+        x = np.array([0.0,0.5,1.2,2.0,3.5,5.0])
+        # A concave function and a steeper line that starts above its first
+        # gridpoint and crosses it between gridpoints
+        self.func = LinearInterp(x,2.0*np.sqrt(x + 0.3) - 1.0)
+        self.func_decay = LinearInterp(x,2.0*np.sqrt(x + 0.3) - 1.0,intercept_limit=1.5,slope_limit=0.3)
+        self.lines = [LinearInterp(np.array([0.3,20.0]),np.array([0.0,19.7])),
+                      LinearInterp(np.array([0.0,20.0]),np.array([0.0,20.0])),
+                      LinearInterp(np.array([4.0,20.0]),np.array([3.7,4.5]))] # crosses above the top
+        RNG = np.random.RandomState(0)
+        self.x = np.concatenate((RNG.uniform(-0.5,15.0,size=500),x,np.nextafter(x,np.inf),
+                                 np.nextafter(x,-np.inf),[0.3,4.0,np.nextafter(0.3,-np.inf)]))
+
+    def checkSame(self,func,line):
+        kinked = makeLowerEnvelope(func,line)
+        self.assertTrue(isinstance(kinked,KinkedLinearInterp))
+        envelope = LowerEnvelope(func,line)
+        y, dydx = kinked.eval_with_derivative(self.x)
+        y_env, dydx_env = envelope.eval_with_derivative(self.x)
+        y_env[np.isinf(y_env)] = np.nan # where neither function is defined
+        for mine, theirs in [(kinked(self.x),envelope(self.x)),(y,y_env),(dydx,dydx_env),
+                             (kinked.derivative(self.x),dydx_env)]:
+            self.assertTrue(np.array_equal(np.isnan(mine),np.isnan(theirs)))
+            self.assertTrue(np.allclose(mine,theirs,rtol=1e-12,atol=1e-12,equal_nan=True))
+
+    def test_same_as_LowerEnvelope(self):
+        for line in self.lines:
+            self.checkSame(self.func,line)
+
+    def test_decay_extrapolation(self):
+        for line in self.lines:
+            self.checkSame(self.func_decay,line)
+
+    def test_fallback(self):
+        # Functions that can't be fused give a plain LowerEnvelope
+        line = self.lines[0]
+        others = [(LinearInterp(self.func.x_list,self.func.y_list,lower_extrap=True),line),
+                  (self.func,LinearInterp(np.array([0.3,1.0,20.0]),np.array([0.0,0.7,19.7]))),
+                  (self.func,LinearInterp(np.array([-1.0,20.0]),np.array([0.0,21.0]))),
+                  (self.func,line,line)]
+        for functions in others:
+            envelope = makeLowerEnvelope(*functions)
+            self.assertTrue(type(envelope) is LowerEnvelope)
+            self.assertTrue(np.allclose(envelope(self.x),LowerEnvelope(*functions)(self.x),
+                                        rtol=0.0,atol=0.0,equal_nan=True))
+
+
+def evalCubicByCoeffs(func,x):
+    '''
+    Evaluates a CubicInterp and its first and second derivatives from its
+    coefficients on segments mapped to [0,1], one point at a time.
+    '''
+    y, dydx, d2ydx2 = np.zeros(x.size), np.zeros(x.size), np.zeros(x.size)
+    for k in range(x.size):
+        pos = np.searchsorted(func.x_list,x[k])
+        c = func.coeffs[pos]
+        if pos == 0:
+            y[k], dydx[k], d2ydx2[k] = c[0] + c[1]*(x[k] - func.x_list[0]), c[1], 0.0*c[1]
+        elif pos < func.n:
+            span = func.x_list[pos] - func.x_list[pos-1]
+            alpha = (x[k] - func.x_list[pos-1])/span
+            y[k] = c[0] + alpha*(c[1] + alpha*(c[2] + alpha*c[3]))
+            dydx[k] = (c[1] + alpha*(2*c[2] + alpha*3*c[3]))/span
+            d2ydx2[k] = (2*c[2] + 6*c[3]*alpha)/span**2
+        else:
+            decay = np.exp((x[k] - func.x_list[-1])*c[3])
+            y[k] = c[0] + x[k]*c[1] - c[2]*decay
+            dydx[k] = c[1] - c[2]*c[3]*decay
+            d2ydx2[k] = -c[2]*c[3]**2*decay
+    return y, dydx, d2ydx2
+
+
+class testsForCubicInterp(unittest.TestCase):
+
+    def setUp(self):
+        x_uneven = np.array([0.1,0.4,1.0,1.8,3.0,5.0])
+        x_even = np.linspace(0.1,5.0,40) # segments found directly
+        self.funcs = []
+        for x in [x_uneven,x_even]:
+            y = np.log(x) + 0.2*x
+            dydx = 1.0/x + 0.2
+            self.funcs += [CubicInterp(x,y,dydx),
+                           CubicInterp(x,y,dydx,lower_extrap=True),
+                           CubicInterp(x,y,dydx,intercept_limit=0.5,slope_limit=0.2), # decays toward the limit
+                           CubicInterp(x,y,dydx,intercept_limit=0.5,slope_limit=0.5)] # slope above the last one
+        RNG = np.random.RandomState(0)
+        self.x = np.concatenate((RNG.uniform(-1.0,10.0,size=300),x_uneven,np.nextafter(x_uneven,np.inf),
+                                 np.nextafter(x_uneven,-np.inf),x_even,np.nextafter(x_even,np.inf)))
+
+    def checkSame(self,mine,theirs):
+        self.assertTrue(np.array_equal(np.isnan(mine),np.isnan(theirs)))
+        self.assertTrue(np.allclose(mine,theirs,rtol=1e-10,atol=1e-10,equal_nan=True))
+
+    def test_same_as_coeffs(self):
+        for func in self.funcs:
+            y, dydx, d2ydx2 = evalCubicByCoeffs(func,self.x)
+            self.checkSame(func(self.x),y)
+            self.checkSame(func.derivative(self.x),dydx)
+            for mine, theirs in zip(func.eval_with_derivative(self.x),[y,dydx]):
+                self.checkSame(mine,theirs)
+            for mine, theirs in zip(func.eval_with_derivatives(self.x),[y,dydx,d2ydx2]):
+                self.checkSame(mine,theirs)
+
+    def test_scalar_input(self):
+        for func in self.funcs:
+            for x in [-0.5,0.1,0.7,5.0,8.0]:
+                y, dydx, d2ydx2 = evalCubicByCoeffs(func,np.array([x]))
+                self.checkSame(np.array(func.eval_with_derivatives(x)),np.array([y[0],dydx[0],d2ydx2[0]]))
+
+    def test_lower_extrap(self):
+        below = np.array([-1.0,0.0,0.1])
+        self.assertTrue(np.all(np.isnan(self.funcs[0](below))))
+        self.assertTrue(np.allclose(self.funcs[1](below),self.funcs[1].y_list[0] + (below - 0.1)*self.funcs[1].dydx_list[0]))
+
+
+class testsForInterpolatorBank(unittest.TestCase):
+
+    def setUp(self):
+        x = np.array([0.0,0.4,1.0,2.5,4.0,7.0])
+        y = np.log(1.0 + x) + 0.3*x
+        line = LinearInterp(np.array([0.7,10.0]),np.array([0.0,9.3]))
+        self.functions = [LinearInterp(x,y),
+                          LinearInterp(x,y,lower_extrap=True),
+                          LinearInterp(x[:4],y[:4],intercept_limit=0.8,slope_limit=0.35), # decay extrapolation
+                          CubicInterp(x,y,1.0/(1.0 + x) + 0.3,intercept_limit=1.5,slope_limit=0.32),
+                          CubicInterp(x[1:],y[1:],1.0/(1.0 + x[1:]) + 0.3,lower_extrap=True),
+                          KinkedLinearInterp(LinearInterp(x,0.5*y),line),
+                          LowerEnvelope(LinearInterp(x,y),line)] # not packed, so called directly
+        # Points below, between, on and above every function's gridpoints
+        RNG = np.random.RandomState(0)
+        self.x = np.concatenate((RNG.uniform(-1.0,12.0,size=500),x,line.x_list,[-0.5,0.2,20.0]))
+
+    def checkSame(self,mine,theirs):
+        self.assertTrue(np.allclose(mine,theirs,rtol=1e-12,atol=1e-12,equal_nan=True))
+        self.assertTrue(np.array_equal(np.isnan(mine),np.isnan(theirs)))
+
+    def test_evalAll(self):
+        bank = InterpolatorBank(self.functions)
+        y = bank.evalAll(self.x)
+        y_again, dydx = bank.evalAll(self.x,with_der=True)
+        self.assertEqual(y.shape,(len(self.functions),self.x.size))
+        for k, func in enumerate(self.functions):
+            f, der = func.eval_with_derivative(self.x)
+            self.checkSame(y[k],func(self.x))
+            self.checkSame(y_again[k],f)
+            self.checkSame(dydx[k],der)
+
+    def test_evalByIndex(self):
+        bank = InterpolatorBank(self.functions)
+        k = np.random.RandomState(1).randint(0,len(self.functions),size=self.x.size)
+        y = bank.evalByIndex(k,self.x)
+        y_again, dydx = bank.evalByIndex(k,self.x,with_der=True)
+        for j, func in enumerate(self.functions):
+            these = k == j
+            f, der = func.eval_with_derivative(self.x[these])
+            self.checkSame(y[these],func(self.x[these]))
+            self.checkSame(y_again[these],f)
+            self.checkSame(dydx[these],der)
+
+    def test_one_function(self):
+        for func in self.functions:
+            bank = InterpolatorBank([func])
+            self.checkSame(bank.evalByIndex(np.zeros(self.x.size),self.x),func(self.x))
+
+
+if __name__ == '__main__':
+    unittest.main()
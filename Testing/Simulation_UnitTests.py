@@ -0,0 +1,216 @@
+"""
+This file implements unit tests for the random draw functions in HARK/simulation.py
+"""
+
+from HARK import AgentType
+from HARK.simulation import makeRNG, drawDiscrete, makeAliasTable, drawAlias, \
+                           makeCutoffTable, lookupCutoffTable, drawStratifiedUniform, makeMarkovPath, \
+                           makeIncShkTable
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import numpy as np
+
+def aliasProbabilities(prob,alias):
+    '''
+    Recovers the probability of each outcome implied by alias tables.
+    '''
+    n = prob.size
+    P = prob.copy()
+    for j in range(n):
+        P[alias[j]] += 1.0 - prob[j]
+    return P/n
+
+class testsForRNG(unittest.TestCase):
+
+    def test_makeRNG(self):
+        RNG = np.random.RandomState(5)
+        self.assertTrue(makeRNG(RNG) is RNG)
+        self.assertEqual(makeRNG(5).uniform(),np.random.RandomState(5).uniform())
+
+    def test_passed_generator_is_used(self):
+        # Draws from a passed generator continue its sequence of draws
+        RNG = np.random.RandomState(3)
+        first = drawDiscrete(100,P=np.array([0.3,0.7]),X=np.array([0,1]),seed=RNG)
+        second = drawDiscrete(100,P=np.array([0.3,0.7]),X=np.array([0,1]),seed=RNG)
+        RNG_again = np.random.RandomState(3)
+        base_draws = RNG_again.uniform(size=200)
+        self.assertTrue(np.array_equal(np.concatenate((first,second)),(base_draws > 0.3).astype(int)))
+
+    def test_named_streams(self):
+        agent = AgentType(seed=7)
+        self.assertTrue(agent.getRNGstream('A') is agent.getRNGstream('A'))
+        draws_A = agent.getRNGstream('A').uniform(size=5)
+        other = AgentType(seed=7)
+        other.getRNGstream('B').uniform(size=100) # draws from another stream don't matter
+        other.RNG.uniform(size=100)
+        self.assertTrue(np.array_equal(draws_A,other.getRNGstream('A').uniform(size=5)))
+        self.assertFalse(np.array_equal(draws_A,AgentType(seed=8).getRNGstream('A').uniform(size=5)))
+        agent.resetRNG()
+        self.assertTrue(np.array_equal(draws_A,agent.getRNGstream('A').uniform(size=5)))
+
+
+class testsForAliasSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.P = np.array([0.05,0.4,0.1,0.25,0.2])
+
+    def test_table(self):
+        prob, alias = makeAliasTable(self.P)
+        self.assertTrue(np.allclose(aliasProbabilities(prob,alias),self.P))
+
+    def test_frequencies(self):
+        prob, alias = makeAliasTable(self.P)
+        draws = drawAlias(200000,prob,alias,seed=0)
+        freq = np.bincount(draws,minlength=self.P.size)/200000.0
+        self.assertTrue(np.allclose(freq,self.P,rtol=0.0,atol=0.005))
+
+    def test_outcomes_and_out(self):
+        prob, alias = makeAliasTable(self.P)
+        X = np.array([1.0,2.0,3.0,4.0,5.0])
+        out = np.zeros(1000)
+        draws = drawAlias(1000,prob,alias,X=X,seed=0,out=out)
+        self.assertTrue(draws is out)
+        self.assertTrue(np.array_equal(out,X[drawAlias(1000,prob,alias,seed=0)]))
+
+    def test_rows(self):
+        # A table with one (zero padded) distribution per row
+        P = np.array([[0.5,0.5,0.0],[0.1,0.2,0.7]])
+        prob, alias = makeAliasTable(P)
+        for i in range(2):
+            self.assertTrue(np.allclose(aliasProbabilities(prob[i],alias[i]),P[i]))
+        rows = np.repeat([0,1],100000)
+        draws = drawAlias(rows.size,prob,alias,rows=rows,seed=0)
+        self.assertFalse(np.any(draws[rows == 0] == 2))
+        freq = np.bincount(draws[rows == 1],minlength=3)/100000.0
+        self.assertTrue(np.allclose(freq,P[1],rtol=0.0,atol=0.005))
+
+
+class testsForCutoffTable(unittest.TestCase):
+
+    def test_same_as_searchsorted(self):
+        P = [np.array([0.2,0.3,0.5]),np.array([1.0]),np.array([0.25,0.25,0.25,0.25])]
+        table = makeCutoffTable(P)
+        RNG = np.random.RandomState(0)
+        rows = RNG.randint(0,len(P),size=10000)
+        draws = RNG.uniform(size=10000)
+        draws[:4] = [0.0,0.2,0.5,0.75] # exactly on cutoffs
+        outcomes = lookupCutoffTable(table,rows,draws)
+        for i in range(draws.size):
+            self.assertEqual(outcomes[i],np.searchsorted(np.cumsum(P[rows[i]]),draws[i]))
+
+    def test_probabilities_short_of_one(self):
+        table = makeCutoffTable([np.array([0.5,0.4999999])])
+        self.assertEqual(lookupCutoffTable(table,np.array([0]),np.array([0.9999999999]))[0],1)
+
+    def test_stratified_counts(self):
+        # Each group gets the same event counts as drawDiscrete with exact_match
+        P = np.array([0.1,0.6,0.3])
+        rows = np.repeat([0,1,2],[10,37,200])
+        np.random.RandomState(0).shuffle(rows)
+        draws = drawStratifiedUniform(rows,seed=0)
+        self.assertTrue(np.all((draws > 0.0) & (draws < 1.0)))
+        outcomes = np.searchsorted(np.cumsum(P),draws)
+        for j in range(3):
+            N = np.sum(rows == j)
+            exact = drawDiscrete(N,P=P,X=np.arange(3),exact_match=True,seed=0)
+            self.assertTrue(np.array_equal(np.bincount(outcomes[rows == j],minlength=3),np.bincount(exact,minlength=3)))
+
+
+class testsForIncShkTable(unittest.TestCase):
+
+    def setUp(self):
+        self.DstnA = [np.array([0.2,0.8]),np.array([0.9,1.1]),np.array([0.3,1.0])]
+        self.DstnB = [np.array([0.1,0.3,0.6]),np.array([0.8,1.0,1.2]),np.array([1.0,1.0,1.0])]
+        self.IncomeDstns = [[self.DstnA,self.DstnB],[self.DstnB]]
+        self.PermGroFacs = [np.array([1.01,1.02]),1.03]
+
+    def checkRow(self,table,row,Dstn,PermGroFac):
+        n = Dstn[0].size
+        if table['flat']:
+            first = table['cutoffs'][1][row]
+            self.assertEqual(table['cutoffs'][2][row],n)
+            events = slice(first,first+n)
+            PermShk, TranShk = table['PermShk'][events], table['TranShk'][events]
+            self.assertTrue(np.allclose(np.diff(np.concatenate(([0.0],table['cutoffs'][0][events].imag))),Dstn[0]))
+        else:
+            PermShk, TranShk = table['PermShk'][row,:n], table['TranShk'][row,:n]
+            self.assertTrue(np.allclose(aliasProbabilities(table['prob'][row],table['alias'][row])[:n],Dstn[0]))
+        self.assertTrue(np.allclose(PermShk,Dstn[1]*PermGroFac))
+        self.assertTrue(np.array_equal(TranShk,Dstn[2]))
+
+    def test_rows(self):
+        for flat in [False,True]:
+            table = makeIncShkTable(self.IncomeDstns,self.PermGroFacs,flat=flat)
+            self.assertEqual(table['StateCount'],2)
+            self.checkRow(table,0,self.DstnA,1.01)
+            self.checkRow(table,1,self.DstnB,1.02)
+            self.checkRow(table,2,self.DstnB,1.03)
+            self.checkRow(table,3,[np.ones(1),np.ones(1),np.ones(1)],1.0) # no second state in period 1
+
+    def test_reused_until_changed(self):
+        table = makeIncShkTable(self.IncomeDstns,self.PermGroFacs)
+        same = makeIncShkTable([list(Dstns) for Dstns in self.IncomeDstns],list(self.PermGroFacs),table=table)
+        self.assertTrue(same is table)
+        self.assertFalse(makeIncShkTable(self.IncomeDstns,self.PermGroFacs,flat=True,table=table) is table)
+        self.PermGroFacs[0][1] = 1.05 # changed in place
+        changed = makeIncShkTable(self.IncomeDstns,self.PermGroFacs,table=table)
+        self.assertFalse(changed is table)
+        self.checkRow(changed,1,self.DstnB,1.05)
+        DstnC = [np.array([1.0]),np.array([1.0]),np.array([0.5])]
+        self.IncomeDstns[1] = [DstnC]
+        self.assertFalse(makeIncShkTable(self.IncomeDstns,self.PermGroFacs,table=changed) is changed)
+
+    def test_IndShock_frequencies(self):
+        # Each period's events are drawn with the probabilities of IncomeDstn[t-1],
+        # with PermGroFac[t-1] folded into the permanent shocks
+        agent = IndShockConsumerType(**Params.init_lifecycle)
+        periods = [1,5,9]
+        agent.AgentCount = 60000
+        agent.t_cycle = np.repeat(periods,20000)
+        agent.t_age = np.ones(agent.AgentCount,dtype=int)
+        agent.getShocks()
+        for t in periods:
+            these = agent.t_cycle == t
+            IncomeDstn = agent.IncomeDstn[t-1]
+            PermShk = IncomeDstn[1]*agent.PermGroFac[t-1]
+            for k in range(IncomeDstn[0].size):
+                freq = np.mean((agent.PermShkNow[these] == PermShk[k]) & (agent.TranShkNow[these] == IncomeDstn[2][k]))
+                self.assertTrue(abs(freq - IncomeDstn[0][k]) < 0.01)
+        newborns = agent.IncShkTable['source'][0][-1][0]
+        self.assertTrue(newborns is agent.IncomeDstn[0])
+
+
+class testsForMarkovPath(unittest.TestCase):
+
+    def setUp(self):
+        self.MrkvArray = np.array([[0.90,0.08,0.02],
+                                   [0.30,0.60,0.10],
+                                   [0.05,0.15,0.80]])
+
+    def makePathByLoop(self,MrkvInit,draws):
+        path = [MrkvInit]
+        MrkvNow = MrkvInit
+        for t in range(draws.size):
+            MrkvNow = np.searchsorted(np.cumsum(self.MrkvArray[MrkvNow,:]),draws[t])
+            path.append(MrkvNow)
+        return np.array(path)
+
+    def test_same_as_loop(self):
+        RNG = np.random.RandomState(0)
+        for T in [1,2,10,97,1000]:
+            draws = RNG.uniform(size=T)
+            for MrkvInit in range(3):
+                path = self.makePathByLoop(MrkvInit,draws)
+                self.assertTrue(np.array_equal(makeMarkovPath(self.MrkvArray,MrkvInit,draws),path))
+                for block_size in [1,3,T]:
+                    self.assertTrue(np.array_equal(makeMarkovPath(self.MrkvArray,MrkvInit,draws,block_size),path))
+
+    def test_no_draws(self):
+        path = makeMarkovPath(self.MrkvArray,2,np.zeros(0))
+        self.assertTrue(np.array_equal(path,[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
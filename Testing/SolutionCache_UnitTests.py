@@ -0,0 +1,97 @@
+"""
+This file implements unit tests for the on-disk solution cache in
+HARK/solutioncache.py
+"""
+
+from HARK.solutioncache import SolutionCache
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType, solveIndShockBatch
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+class CountingCache(SolutionCache):
+    '''
+    A SolutionCache that counts how many solutions it has found.
+    '''
+    hits = 0
+
+    def load(self,key):
+        solution = SolutionCache.load(self,key)
+        if solution is not None:
+            self.hits += 1
+        return solution
+
+class testsForSolutionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.m_grid = np.linspace(0.0,20.0,41)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeAgent(self):
+        agent = IndShockConsumerType(**Params.init_lifecycle)
+        agent.solution_cache = CountingCache(self.directory)
+        return agent
+
+    def test_hit_equals_fresh_solve(self):
+        first = self.makeAgent()
+        first.solve()
+        self.assertEqual(first.solution_cache.hits,0)
+
+        second = self.makeAgent()
+        second.solve()
+        self.assertEqual(second.solution_cache.hits,1)
+
+        fresh = IndShockConsumerType(**Params.init_lifecycle)
+        fresh.solve()
+        self.assertEqual(len(second.solution),len(fresh.solution))
+        for t in range(len(fresh.solution)):
+            self.assertTrue(np.array_equal(second.solution[t].cFunc(self.m_grid),fresh.solution[t].cFunc(self.m_grid)))
+
+    def test_hit_after_unpackcFunc(self):
+        # Unpacking the consumption functions adds cFunc to time_vary, but it is
+        # an output of the last solve rather than an input to the next one
+        agent = self.makeAgent()
+        agent.solve()
+        agent.unpackcFunc()
+        agent.solve()
+        self.assertEqual(agent.solution_cache.hits,1)
+
+    def test_miss_after_change(self):
+        agent = self.makeAgent()
+        agent.solve()
+        agent.DiscFac = agent.DiscFac - 0.01
+        agent.solve()
+        self.assertEqual(agent.solution_cache.hits,0)
+
+    def test_batch_solve(self):
+        # Batched solves (as in cstwMPC) load from and store in the cache too
+        def makeBatch():
+            agents = []
+            for DiscFac in [0.94,0.95,0.96]:
+                agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+                agent.cycles = 0
+                agent.DiscFac = DiscFac
+                agent.solution_cache = CountingCache(self.directory)
+                agents.append(agent)
+            return agents
+        first = makeBatch()
+        solveIndShockBatch(first)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.sol')]),3)
+        second = makeBatch()
+        second[1].DiscFac = 0.955
+        solveIndShockBatch(second)
+        self.assertEqual([agent.solution_cache.hits for agent in second],[1,0,1])
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.sol')]),4)
+        for k in [0,2]:
+            self.assertTrue(np.array_equal(second[k].solution[0].cFunc(self.m_grid),first[k].solution[0].cFunc(self.m_grid)))
+
+
+if __name__ == '__main__':
+    unittest.main()
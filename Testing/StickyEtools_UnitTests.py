@@ -0,0 +1,155 @@
+"""
+This file implements unit tests for the data tools in
+HARK/cAndCwithStickyE/StickyEtools.py
+"""
+
+import HARK
+from HARK.utilities import CRRAutility
+from HARK.history import makeDiskArray
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# StickyEparams reads the calibration from paths relative to the project's directory
+working_dir = os.getcwd()
+os.chdir(os.path.join(os.path.dirname(HARK.__file__),'cAndCwithStickyE'))
+try:
+    import HARK.cAndCwithStickyE.StickyEtools as StickyEtools
+except ImportError: # StickyEtools needs pandas and statsmodels
+    StickyEtools = None
+finally:
+    os.chdir(working_dir)
+
+def calcValueAtBirthByAgent(cLvlHist,BirthBool,PlvlHist,MrkvHist,DiscFac,CRRA):
+    '''
+    Calculates the expected value of being born in each Markov state by looping
+    over every agent who lived and died in each agent index, as calcValueAtBirth
+    used to before it read the histories a block of periods at a time.
+    '''
+    J = np.max(MrkvHist) + 1
+    T = MrkvHist.size
+    DiscVec = DiscFac**np.arange(T)
+    vLists = [[] for j in range(J)]
+    for i in range(cLvlHist.shape[1]):
+        birth_t = np.where(BirthBool[:,i])[0]
+        for k in range(birth_t.size-1): # Last birth event has no death, so ignore
+            t0 = birth_t[k]
+            t1 = birth_t[k+1]
+            uVec = CRRAutility(cLvlHist[t0:t1,i]/PlvlHist[t0],gam=CRRA)
+            vLists[MrkvHist[t0]].append(np.dot(DiscVec[:(t1-t0)],uVec))
+    return np.array([np.mean(vList) for vList in vLists])
+
+def makeAgeHistory(RNG,T,N):
+    '''
+    Makes a history of ages for N agent indices, each of whom dies with
+    probability 0.1 each period and is replaced by a newborn of age 1.
+    '''
+    t_age = np.zeros((T,N),dtype=int)
+    t_age[0] = RNG.randint(1,20,size=N)
+    for t in range(1,T):
+        t_age[t] = np.where(RNG.uniform(size=N) < 0.1,1,t_age[t-1] + 1)
+    return t_age
+
+
+class FakeType(object):
+    '''
+    An AgentType with nothing but the simulated histories used by makeStickyEdataFile.
+    '''
+    pass
+
+
+@unittest.skipIf(StickyEtools is None,'StickyEtools needs pandas and statsmodels')
+class testsForValueAtBirth(unittest.TestCase):
+
+    def setUp(self):
+        RNG = np.random.RandomState(0)
+        self.T = 60
+        self.t_age_hists = [makeAgeHistory(RNG,self.T,N) for N in [30,17]]
+        self.cLvl_hists = [RNG.lognormal(0.0,0.3,size=(self.T,N)) for N in [30,17]]
+        self.PlvlHist = np.cumprod(RNG.lognormal(0.0,0.01,size=self.T))
+        self.MrkvHist = RNG.randint(0,3,size=self.T)
+
+    def test_same_as_by_agent(self):
+        cLvlHist = np.concatenate(self.cLvl_hists,axis=1)
+        t_age = np.concatenate(self.t_age_hists,axis=1)
+        vBase = calcValueAtBirthByAgent(cLvlHist,t_age == 1,self.PlvlHist,self.MrkvHist,0.96,2.0)
+        vBirth = StickyEtools.calcValueAtBirth(cLvlHist,t_age == 1,self.PlvlHist,self.MrkvHist,0.96,2.0)
+        self.assertTrue(np.allclose(vBirth,vBase,rtol=1e-12,atol=0.0))
+
+        # The same from a list of types' histories of ages, read in blocks of periods
+        for block_size in [1,7,1000]:
+            vBlocks = StickyEtools.calcValueAtBirth(self.cLvl_hists,self.t_age_hists,self.PlvlHist,self.MrkvHist,
+                                                    0.96,2.0,birth_age=1,block_size=block_size)
+            self.assertTrue(np.allclose(vBlocks,vBase,rtol=1e-12,atol=0.0))
+
+
+@unittest.skipIf(StickyEtools is None,'StickyEtools needs pandas and statsmodels')
+class testsForStickyEdataFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.results_dir = StickyEtools.results_dir
+        StickyEtools.results_dir = self.directory + os.sep
+
+    def tearDown(self):
+        StickyEtools.results_dir = self.results_dir
+        shutil.rmtree(self.directory)
+
+    def makeEconomy(self,disk_dir=None):
+        RNG = np.random.RandomState(0)
+        T = 60
+        Economy = FakeType()
+        Economy.agents = []
+        for N in [30,17]:
+            agent = FakeType()
+            agent.T_sim = T
+            agent.DiscFac = 0.96
+            agent.CRRA = 2.0
+            agent.t_age_hist = makeAgeHistory(RNG,T,N)
+            for name in ['pLvlTrue_hist','aLvlNow_hist','cLvlNow_hist','yLvlNow_hist']:
+                history = RNG.lognormal(0.0,0.3,size=(T,N))
+                if disk_dir is not None:
+                    on_disk = makeDiskArray(history.shape,history.dtype,disk_dir,name)
+                    on_disk[:] = history
+                    history = on_disk
+                setattr(agent,name,history)
+            Economy.agents.append(agent)
+        Economy.PermShkAggHist = RNG.lognormal(0.0,0.01,size=T)
+        Economy.TranShkAggHist = RNG.lognormal(0.0,0.01,size=T)
+        Economy.MrkvNow = 0
+        Economy.MrkvNow_hist = RNG.randint(0,2,size=T)
+        Economy.PermGroFacAgg = np.array([1.01,0.99])
+        Economy.Rfunc = lambda k : 1.0 + 0.1*k
+        return Economy
+
+    def readResults(self,name):
+        with open(os.path.join(self.directory,name + 'Results.csv')) as f:
+            results = np.array([float(x) for x in f.read().split(',')])
+        with open(os.path.join(self.directory,name + 'BirthValue.csv')) as f:
+            vBirth = np.array([float(x) for x in f.read().strip().split(',')])
+        return results, vBirth
+
+    def test_blocks_and_disk(self):
+        # The statistics don't depend on how the histories are read, or where they are
+        Economy = self.makeEconomy()
+        StickyEtools.makeStickyEdataFile(Economy,20,filename='whole')
+        StickyEtools.makeStickyEdataFile(Economy,20,filename='blocks',hist_block_size=7)
+        StickyEtools.makeStickyEdataFile(self.makeEconomy(os.path.join(self.directory,'hist')),20,
+                                         filename='disk',hist_block_size=7)
+        results, vBirth = self.readResults('whole')
+        for name in ['blocks','disk']:
+            other_results, other_vBirth = self.readResults(name)
+            self.assertTrue(np.allclose(other_results,results,rtol=1e-12,atol=0.0))
+            self.assertTrue(np.allclose(other_vBirth,vBirth,rtol=1e-12,atol=0.0))
+
+        # The first statistic is the mean of normalized aggregate assets
+        AlvlAgg = np.mean(np.concatenate([agent.aLvlNow_hist for agent in Economy.agents],axis=1),axis=1)
+        PlvlAgg = np.cumprod(np.concatenate(([1.0],Economy.PermShkAggHist[:-1])))
+        self.assertAlmostEqual(results[0],np.mean((AlvlAgg/PlvlAgg)[20:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
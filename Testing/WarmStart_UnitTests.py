@@ -0,0 +1,71 @@
+"""
+This file implements unit tests for warm started infinite horizon solves
+(AgentType.solve with warm_start=True).
+"""
+
+from HARK.ConsumptionSaving.ConsIndShockModel import IndShockConsumerType
+import HARK.ConsumptionSaving.ConsumerParameters as Params
+
+import unittest
+import numpy as np
+
+class testsForWarmStart(unittest.TestCase):
+
+    def setUp(self):
+        self.m_grid = np.array([0.5,2.0,5.0,20.0,50.0,200.0,2000.0]) # includes points above the grid
+
+    def makeAgent(self):
+        agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        agent.cycles = 0
+        agent.warm_start = True
+        return agent
+
+    def compareWarmAndCold(self,name,value_before,value_after):
+        """
+        Solves one agent at value_before and then (warm started) at value_after,
+        and another agent only at value_after, and checks that the solutions match.
+        """
+        warm = self.makeAgent()
+        setattr(warm,name,value_before)
+        warm.solve()
+        setattr(warm,name,value_after)
+        warm.solve()
+        self.assertEqual(len(warm.warm_start_cache),2)
+
+        cold = self.makeAgent()
+        setattr(cold,name,value_after)
+        cold.solve()
+
+        warm_sol = warm.solution[0]
+        cold_sol = cold.solution[0]
+        for attr in ['hNrm','MPCmin','MPCmax']:
+            self.assertTrue(np.allclose(getattr(warm_sol,attr),getattr(cold_sol,attr),rtol=1e-4,atol=0.0))
+        self.assertTrue(np.allclose(warm_sol.cFunc(self.m_grid),cold_sol.cFunc(self.m_grid),rtol=1e-4,atol=0.0))
+
+    def test_Rfree(self):
+        self.compareWarmAndCold('Rfree',1.01,1.03)
+
+    def test_PermGroFac(self):
+        self.compareWarmAndCold('PermGroFac',[1.00],[1.02])
+
+    def test_DiscFac(self):
+        self.compareWarmAndCold('DiscFac',0.96,0.965)
+
+    def test_solution_init(self):
+        # An explicit warm start is used even without a cache
+        base = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        base.cycles = 0
+        base.solve()
+        agent = IndShockConsumerType(**Params.init_idiosyncratic_shocks)
+        agent.cycles = 0
+        agent.DiscFac = base.DiscFac - 0.005
+        agent.solve(solution_init=base.solution[0])
+        self.assertEqual(agent.warm_start_cache,[])
+
+        cold = self.makeAgent()
+        cold.DiscFac = agent.DiscFac
+        cold.solve()
+        self.assertTrue(np.allclose(agent.solution[0].cFunc(self.m_grid),cold.solution[0].cFunc(self.m_grid),rtol=1e-4,atol=0.0))
+
+if __name__ == '__main__':
+    unittest.main()